@@ -1,18 +1,20 @@
-import argparse
 import logging
-import unittest
+import sys
 from . import arguments
 
 
 parser = arguments.test_parser()
 args = parser.parse_args()
 
-if args.verbose:
+if args.verbose > 1:
+    logging.basicConfig(level=logging.DEBUG)
+elif args.verbose:
     logging.basicConfig(level=logging.INFO)
 else:
     logging.basicConfig()
 
 if args.test:
+    import unittest
     from . import tests
     if args.test is not True:
         tests = unittest.defaultTestLoader.loadTestsFromName(args.test, tests)
@@ -20,3 +22,33 @@ if args.test:
         tests = unittest.defaultTestLoader.loadTestsFromModule(tests)
 
     unittest.TextTestRunner(verbosity=args.verbose+1).run(tests)
+
+if args.benchmark:
+    from . import benchmarks
+    if args.update_baseline and args.baseline is None:
+        parser.error('--update-baseline needs --baseline')
+    report, regressions = benchmarks.run(
+        args.benchmark, args.baseline, args.update_baseline, args.threshold)
+    print(report)
+    if regressions:
+        sys.exit(1)
+
+if args.command == 'run':
+    from . import runner
+    if args.matrix and args.watch:
+        parser.error('--matrix cannot be used with --watch')
+    sys.exit(runner.main(args))
+
+if args.command == 'report':
+    from . import store
+    if args.recent < 1 or args.window < 1:
+        parser.error('--recent and --window must be positive')
+    sys.exit(store.main(args))
+
+if args.command == 'serve':
+    from . import server
+    sys.exit(server.main(args))
+
+if args.command == 'check':
+    from . import inprocess
+    sys.exit(inprocess.main(args))
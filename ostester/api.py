@@ -0,0 +1,74 @@
+"""
+Generates test suites in memory, for tools embedding the generator.
+
+render takes a spec and returns the files of its suite as a mapping from
+file name to text, the same files testgen writes for it, without
+touching the disk. The Jinja environment and compiled templates are
+kept between calls, so only the first call pays for them.
+"""
+
+from itertools import chain
+
+from . import ast, ccodegen, incremental, types, utils, yamlreader
+
+
+def render(spec, split=False, options=ccodegen.Options()):
+    """
+    Returns the files of the suite for spec, the text of a YAML spec or a
+    spec file open for reading, as a dict from file name to contents.
+    split and options are as for batch.generate. Relative !file paths
+    are relative to the directory of the file, or to the current
+    directory for text.
+    >>> files = render('''
+    ... - header: inc.h
+    ... - function: inc
+    ...   type: int -> int
+    ...   tests:
+    ...     - args: [1]
+    ...       equals: 2
+    ... ''')
+    >>> sorted(files)
+    ['test_inc.c', 'test_inc.h']
+    >>> 'inc(_id_1)' in files['test_inc.c']
+    True
+    """
+    items = yamlreader.iter_parse(spec)
+    metadata = next(items)
+    header = metadata['header']
+    hsh_name = 'test_' + header
+    hs_name = hsh_name.replace('.h', '.c')
+    files = {hsh_name: ccodegen.render_header_suite_header(header)}
+    if not split:
+        context = utils.GenerationContext()
+        tree = ast.stream(chain([metadata], items), context)
+        files[hs_name] = ccodegen.render_header_suite(
+            header, hsh_name, tree.tests, context, options)
+        return _files(files)
+
+    structs = types.define_structs(metadata.get('structs', {}))
+    functions = []
+    base = 0
+    for fragment in items:
+        context = utils.GenerationContext(structs)
+        function = ast.function_test(fragment, context)
+        files[incremental.function_file_name(hs_name, function.name)] = (
+            ccodegen.render_function_test(header, function, context,
+                                          options))
+        functions.append({'name': function.name, 'base': base,
+                          'benchmark': function.benchmark is not None})
+        base += len(function.test_cases)
+    files[hs_name] = ccodegen.render_split_header_suite(
+        header, hsh_name, functions, options)
+    return _files(files)
+
+
+def _files(files):
+    # Files are written with a final newline, see utils.write_if_changed
+    return {name: text + '\n' for name, text in files.items()}
+
+
+def render_main(headers, options=ccodegen.Options()):
+    """
+    Returns the text of the main.c calling the suites of headers
+    """
+    return ccodegen.render_main(headers, options) + '\n'
@@ -1,16 +1,63 @@
 import argparse
+import os
+import shlex
 
 
 def parser():
     parser = argparse.ArgumentParser(
-        description="Generates C code to perform tests specified by a YAML"
-            "file",
+        description="Generates C code to perform tests specified by YAML"
+            "files",
     )
-    parser.add_argument('yaml_file', help='the yaml file containing the tests')
+    parser.add_argument('yaml_files', nargs='+', metavar='yaml_file',
+                        help='a yaml file containing tests, or a directory '
+                             'of them')
     parser.add_argument('output_dir', help='create the files in output_dir')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='number of worker processes (default: one per '
+                             'core)')
+    parser.add_argument('--split', action='store_true',
+                        help='generate one file per tested function and '
+                             'only rewrite the files whose tests changed')
+    parser.add_argument('--table', action='store_true',
+                        help='emit the test cases of functions taking and '
+                             'returning scalars as tables instead of '
+                             'unrolled code')
+    parser.add_argument('--report', choices=('tap', 'json'),
+                        help='make the suites run every test case and print '
+                             'its verdict and duration in this format')
+    add_guard_argument(parser)
+    parser.add_argument('--profile', action='store_true',
+                        help='print the time spent in every phase of '
+                             'generation and what it produced to stderr')
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help='like --profile, and write a cProfile dump to '
+                             'FILE (implies --jobs 1)')
+    add_watch_arguments(parser)
     return parser
 
 
+def add_guard_argument(parser):
+    parser.add_argument('--guard', action='store_const', const='after',
+                        help='map the buffer of every pointer argument flush '
+                             'against an inaccessible page, so that the '
+                             'suites fault at once on reads and writes past '
+                             'its end')
+    parser.add_argument('--guard-before', dest='guard', action='store_const',
+                        const='before',
+                        help='like --guard, but flush against an '
+                             'inaccessible page before the buffer, with '
+                             'another one after its last page')
+
+
+def add_watch_arguments(parser):
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running, regenerating whenever a yaml '
+                             'file or template changes')
+    parser.add_argument('--interval', type=float, default=0.2,
+                        help='seconds between checks for changes with '
+                             '--watch (default: %(default)s)')
+
+
 def test_parser():
     parser = argparse.ArgumentParser(
         description="Generates C code to perform tests specified by a YAML"
@@ -20,4 +67,114 @@ def test_parser():
     parser.add_argument('--test', '-t', action='store', nargs='?',
                         const=True, default=False,
                         help="Run the test suite")
+    parser.add_argument('--benchmark', '-b', action='store',
+                        help="Run the named benchmark of the generator")
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='compare the benchmark with the results stored '
+                             'in FILE, failing on regressions')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='store the benchmark results in the baseline '
+                             'file instead')
+    parser.add_argument('--threshold', type=float, default=1.2,
+                        help='ratio to the baseline above which a '
+                             'measurement is a regression (default: '
+                             '%(default)s)')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser(subparsers.add_parser(
+        'run', help='generate, build and run test suites in parallel'))
+    report_parser(subparsers.add_parser(
+        'report', help='find the cases that got slower or flaky over the '
+                       'recorded runs'))
+    serve_parser(subparsers.add_parser(
+        'serve', help='serve testgen-client requests from a long-lived '
+                      'process'))
+    check_parser(subparsers.add_parser(
+        'check', help='run the test cases in this process against a shared '
+                      'library of the sources'))
+    return parser
+
+
+def run_parser(parser):
+    parser.add_argument('yaml_files', nargs='+', metavar='yaml_file',
+                        help='a yaml file containing tests, or a directory '
+                             'of them')
+    parser.add_argument('--build-dir', '-o', default='ostester-build',
+                        help='build the suites in build_dir (default: '
+                             '%(default)s)')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='number of suites built and run at once '
+                             '(default: one per core)')
+    parser.add_argument('--cc', default=os.environ.get('CC', 'gcc'),
+                        help='the C compiler (default: $CC or gcc)')
+    parser.add_argument('--cflags', type=shlex.split, default=[],
+                        help='flags passed to the C compiler')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='seconds a suite may run before it is killed')
+    parser.add_argument('--split', action='store_true',
+                        help='generate one file per tested function')
+    parser.add_argument('--table', action='store_true',
+                        help='emit scalar test cases as tables')
+    parser.add_argument('--report', choices=('tap', 'json'),
+                        help='run every test case and report each one')
+    add_guard_argument(parser)
+    parser.add_argument('--matrix', action='store_true',
+                        help='build and run every suite at every '
+                             'optimization level of --levels, with and '
+                             'without sanitizers, and print a grid of the '
+                             'verdicts of the cases (implies --report tap)')
+    parser.add_argument('--levels', type=lambda levels: levels.split(','),
+                        default=['0', '2', '3'],
+                        help='comma separated optimization levels of '
+                             '--matrix (default: 0,2,3)')
+    parser.add_argument('--sanitize', default='address,undefined',
+                        help='the -fsanitize argument of the sanitized '
+                             'configurations of --matrix, or empty for '
+                             'none (default: %(default)s)')
+    parser.add_argument('--changed-since', metavar='REV',
+                        help='only build and run the suites built from files '
+                             'changed since the git revision REV, or never '
+                             'built')
+    add_watch_arguments(parser)
+    return parser
+
+
+def report_parser(parser):
+    parser.add_argument('--build-dir', '-o', default='ostester-build',
+                        help='the build_dir of the runs (default: '
+                             '%(default)s)')
+    parser.add_argument('--recent', type=int, default=3,
+                        help='number of latest runs compared with the ones '
+                             'before (default: %(default)s)')
+    parser.add_argument('--window', type=int, default=20,
+                        help='number of earlier runs they are compared with '
+                             '(default: %(default)s)')
+    parser.add_argument('--alpha', type=float, default=0.01,
+                        help='significance level of the test for slowdowns '
+                             '(default: %(default)s)')
+    parser.add_argument('--slowdown', type=float, default=1.1,
+                        help='ratio of the median times below which a '
+                             'significant slowdown is ignored (default: '
+                             '%(default)s)')
+    return parser
+
+
+def serve_parser(parser):
+    parser.add_argument('--socket', metavar='PATH',
+                        help='listen on the Unix socket PATH (default: '
+                             '$OSTESTER_SOCKET, or ostester.sock in '
+                             '$XDG_RUNTIME_DIR)')
+    return parser
+
+
+def check_parser(parser):
+    parser.add_argument('yaml_files', nargs='+', metavar='yaml_file',
+                        help='a yaml file containing tests, or a directory '
+                             'of them')
+    parser.add_argument('--function', '-f', action='append',
+                        help='only run the test cases of this function '
+                             '(may be repeated)')
+    parser.add_argument('--cc', default=os.environ.get('CC', 'gcc'),
+                        help='the C compiler (default: $CC or gcc)')
+    parser.add_argument('--cflags', type=shlex.split, default=[],
+                        help='flags passed to the C compiler')
     return parser
@@ -1,5 +1,6 @@
 from collections import namedtuple
 from functools import partial
+import operator
 
 from .values import Declaration
 from . import yamlreader as yr
@@ -7,57 +8,211 @@ from . import types
 from . import utils
 
 
-def transform(parsetree):
+def transform(parsetree, context=None):
     """
-    Takes in a parse tree and processes it to return an AST
+    Takes in a parse tree and processes it to return an AST, allocating
+    names and test numbers from context, by default a fresh one
     """
-    return root(parsetree)
+    return root(parsetree, context)
 
 
-def root(test_list):
-    metadata, *tests = test_list
-    return {'header': metadata['header'],
-            'tests': list(map(function_test, tests))}
+class Root(namedtuple('Root', ('header', 'tests'))):
+    """
+    The tests of every function declared in a header
+    """
+    __slots__ = ()
+
+
+class FunctionTest(namedtuple('FunctionTest',
+                              ('name', 'type', 'test_cases', 'benchmark'),
+                              defaults=(None,))):
+    """
+    The test cases of a single function, and its Benchmark if it has one
+    """
+    __slots__ = ()
+
+
+class TestCase(namedtuple('TestCase', ('declarations', 'arguments',
+                                       'result', 'comparison', 'number'))):
+    """
+    A single call of a function under test and the check of its result,
+    which is stored in the variable named result. If any arguments are
+    generators, the test case checks every combination of their values.
+    """
+    __slots__ = ()
+
+    @property
+    def generators(self):
+        """
+        The arguments taking every value of a yamlreader.Range or Random
+        """
+        return [argument for argument in self.arguments
+                if isinstance(argument.value, yr.GENERATORS)]
+
+    def argument_index(self, declaration):
+        """
+        Returns the position of declaration among the arguments, or None
+        if it isn't one
+        """
+        for index, argument in enumerate(self.arguments):
+            if argument is declaration:
+                return index
+        return None
+
+
+class Benchmark(namedtuple('Benchmark', ('iterations', 'warmup', 'batch',
+                                         'inputs'))):
+    """
+    A micro-benchmark of a function: for each of inputs, warmup untimed
+    calls, then iterations samples each timing batch calls
+    """
+    __slots__ = ()
+
+
+class BenchmarkInput(namedtuple('BenchmarkInput', ('declarations',
+                                                   'arguments', 'result'))):
+    """
+    The arguments a function is benchmarked with
+    """
+    __slots__ = ()
+
+
+def stream(items, context=None):
+    """
+    Transforms the items of a parse tree like transform, but lazily: the
+    tests of the Root returned are an iterator transforming each function
+    entry of items as it is reached, so they can only be iterated once
+    """
+    if context is None:
+        context = utils.GenerationContext()
+    items = iter(items)
+    metadata = next(items)
+    context.structs = types.define_structs(metadata.get('structs', {}))
+    return Root(metadata['header'],
+                (function_test(test, context) for test in items))
+
 
+def root(test_list, context=None):
+    ast = stream(test_list, context)
+    return ast._replace(tests=list(ast.tests))
 
-def function_test(test):
-    function_type = test['type']
-    return {'name': test['function'],
-            'type': function_type,
-            'test_cases': [test_case(test, function_type)
-                for test in test['tests']]}
 
+def check_function_entry(test):
+    """
+    Raises ValueError unless test, an item of a spec after the first, is a
+    function entry
+    """
+    if not isinstance(test, dict) or 'function' not in test:
+        raise ValueError('not a function entry: {!r}'.format(test))
 
-test_number = 0
-def test_case(test_case, function_type):
-    global test_number
+
+def function_test(test, context=None):
+    check_function_entry(test)
+    if context is None:
+        context = utils.GenerationContext()
+    function_type = test['type'].resolve(context.structs)
+    test_cases = [test_case(case, function_type, context)
+                  for case in test.get('tests', [])]
+    if 'benchmark' not in test:
+        return FunctionTest(test['function'], function_type, test_cases)
+    return FunctionTest(test['function'], function_type, test_cases,
+                        benchmark(test['benchmark'] or {}, function_type,
+                                  test_cases, context))
+
+
+def benchmark(benchmark, function_type, test_cases, context):
+    """
+    Returns the Benchmark of a function. Without explicit inputs, the
+    function is benchmarked with the arguments of each of its test cases
+    that has no generated arguments.
+    """
+    if 'inputs' in benchmark:
+        inputs = []
+        for benchmark_input in benchmark['inputs']:
+            declarations, args = new_declarations(
+                benchmark_input.get('data', {}), benchmark_input['args'],
+                function_type.inputs, context)
+            if any(isinstance(arg.value, yr.GENERATORS) for arg in args):
+                raise ValueError('benchmark inputs cannot be generated')
+            inputs.append(BenchmarkInput(declarations, args,
+                                         context.new_name()))
+    else:
+        inputs = [case for case in test_cases if not case.generators]
+    iterations, warmup, batch = (int(benchmark.get(key, default))
+                                 for key, default in (('iterations', 1000),
+                                                      ('warmup', 100),
+                                                      ('batch', 1)))
+    if iterations < 1 or warmup < 0 or batch < 1:
+        raise ValueError('invalid benchmark of {} iterations, {} warmup, '
+                         'batch {}'.format(iterations, warmup, batch))
+    return Benchmark(iterations, warmup, batch, inputs)
+
+
+def test_case(test_case, function_type, context):
     # Pointer in args
     # Literals in args
     declarations, args = new_declarations(test_case.get('data', {}),
                                           test_case['args'],
-                                          function_type.inputs)
+                                          function_type.inputs,
+                                          context)
     comparison, = test_case.keys() & comparisons
-    test_number += 1
-    return {'declarations': declarations,
-            'arguments': args,
-            'comparison': comparisons[comparison](test_case[comparison]),
-            'number': test_number}
+    if comparison in BUFFER_COMPARISONS:
+        check = comparisons[comparison](test_case[comparison], function_type,
+                                        args, context)
+    else:
+        check = comparisons[comparison](test_case[comparison])
+    return TestCase(declarations, args, context.new_name(), check,
+                    context.next_test_number())
 
 
-def new_declarations(explicit_declarations, args, function_inputs):
+def new_declarations(explicit_declarations, args, function_inputs,
+                     context=None):
+    if context is None:
+        context = utils.GenerationContext()
     new_declarations = []
     arg_values = []
     for arg, type in zip(args, function_inputs):
         if isinstance(arg, yr.Pointer) or isinstance(arg, yr.Declaration):
             d, a = recursive_declarations(explicit_declarations,
-                                          arg, utils.new_name(), type)
+                                          arg, context.new_name(), type)
             new_declarations.extend(d)
             arg_values.extend(a)
         else:
-            d = Declaration(arg, type)
+            if isinstance(arg, yr.GENERATORS):
+                arg = generator(arg, type)
+            d = Declaration(arg, type, context.new_name())
             new_declarations.append(d)
             arg_values.append(d)
-    return (new_declarations, arg_values)
+    return (tuple(new_declarations), tuple(arg_values))
+
+
+def generator(generator, type):
+    """
+    Returns a copy of a yamlreader.Range or Random generating values of
+    type, a scalar type, with its bounds as numbers
+    >>> generator(yr.Range('a', 'c'), types.c_type('char'))
+    Range(97, 99, 1)
+    """
+    scalar = type.unqualified
+    if not isinstance(scalar, (types.Int, types.Char)):
+        raise ValueError('{} only generates ints and chars, not {}'.format(
+            generator.yaml_tag, type))
+
+    def number(value):
+        if isinstance(scalar, types.Char) and isinstance(value, str):
+            return ord(scalar.coerce(value))
+        return int(value)
+    if isinstance(generator, yr.Range):
+        step = int(generator.step)
+        if step == 0:
+            raise ValueError('!range step must not be 0')
+        return yr.Range(number(generator.first), number(generator.last),
+                        step)
+    low, high = number(generator.min), number(generator.max)
+    count = int(generator.count)
+    if count < 0 or low > high:
+        raise ValueError('invalid {!r}'.format(generator))
+    return yr.Random(count, low, high, int(generator.seed) & 0xffffffff)
 
 
 def recursive_declarations(declarations, arg, name, type):
@@ -77,11 +232,154 @@ def recursive_declarations(declarations, arg, name, type):
 
 class BinOp(namedtuple('BinOp', ('f', 'arg'))):
     __slots__ = ()
+    declarations = ()
+    helper = None
+
     def compare_with(self, arg):
         return '{} {} {}'.format(arg, self.f, self.arg)
 
+    def evaluate(self, result):
+        """
+        Returns whether the check passes for result, the value of the
+        result as a number
+        >>> BinOp('<', 0).evaluate(-1), BinOp('==', 2).evaluate(3)
+        (True, False)
+        """
+        return _OPERATORS[self.f](result, self.arg)
+
+
+_OPERATORS = {'==': operator.eq, '<': operator.lt, '>': operator.gt}
+
+
+class BufferComparison(namedtuple('BufferComparison', (
+        'kind', 'target', 'expected', 'length', 'tolerance'))):
+    """
+    A check of the first length elements of the buffer pointed to by the
+    result, or by the argument named target if it isn't None, against the
+    array declared by expected. Every kind but within is a single memcmp;
+    within calls a loop defined once per translation unit by helper.
+    """
+    __slots__ = ()
+
+    @property
+    def declarations(self):
+        return (self.expected,)
+
+    @property
+    def helper(self):
+        """
+        The name and definition of the function the check calls, or None
+        """
+        if self.kind != 'within':
+            return None
+        element_type = self.expected.type.inner_type.unqualified
+        name = 'ostester_within_{}'.format(element_type.base_type)
+        return name, _WITHIN.format(name=name, type=element_type)
+
+    def compare_with(self, arg):
+        buffer = arg if self.target is None else self.target
+        if self.kind == 'within':
+            check = '{}({}, {}, {}, {})'.format(
+                self.helper[0], buffer, self.expected.name, self.length,
+                self.tolerance)
+        else:
+            check = 'memcmp({}, {}, {} * sizeof *{}) == 0'.format(
+                buffer, self.expected.name, self.length, self.expected.name)
+        if self.target is None:
+            return check
+        # The result goes unused when an argument is checked
+        return '((void){}, {})'.format(arg, check)
+
+    def evaluate(self, actual, expected):
+        """
+        Returns whether the check passes for actual and expected, the first
+        length elements of the checked buffer and of the expected array as
+        numbers
+        >>> check = BufferComparison('within', None, None, 2, 1)
+        >>> check.evaluate([10, 21], [11, 20]), check.evaluate([9], [11])
+        (True, False)
+        """
+        if self.kind == 'within':
+            return all(abs(a - e) <= self.tolerance
+                       for a, e in zip(actual, expected))
+        return list(actual) == list(expected)
+
+
+_WITHIN = """static int {name}(const {type} *actual, const {type} *expected, \
+size_t length, long long tolerance)
+{{
+    for (size_t i = 0; i < length; i++)
+    {{
+        long long difference = (long long)actual[i] - expected[i];
+        if (difference < -tolerance || difference > tolerance)
+        {{
+            return 0;
+        }}
+    }}
+    return 1;
+}}"""
+
+
+def buffer_comparison(kind, check, function_type, arguments, context):
+    """
+    Returns the BufferComparison of kind bytes_equal, prefix, all_zero or
+    within described by check in a spec. check is the expected data, or
+    the element count for all_zero, or a mapping of them as value or
+    count to the index of the pointer argument to check as arg, which
+    defaults to the result, and to the tolerance of within.
+    bytes_equal includes the terminating NUL of a string, prefix doesn't.
+    """
+    if not (isinstance(check, dict) and check.keys() & {'value', 'count'}):
+        check = {'count' if kind == 'all_zero' else 'value': check}
+    if 'arg' in check:
+        index = int(check['arg'])
+        if not 0 <= index < len(arguments):
+            raise ValueError('{} checks argument {} of {}'.format(
+                kind, index, len(arguments)))
+        target, type = arguments[index].name, arguments[index].type
+    else:
+        target, type = None, function_type.output
+    if not isinstance(type, types.Pointer):
+        raise ValueError('{} needs a pointer, not {}'.format(kind, type))
+    element_type = type.inner_type.unqualified
+    if not element_type.scalar:
+        raise ValueError('{} compares scalars, not {}'.format(
+            kind, element_type))
+
+    tolerance = None
+    if kind == 'all_zero':
+        length = int(check['count'])
+        if length < 0:
+            raise ValueError('all_zero of {} elements'.format(length))
+        value = yr.Zeroed(length)
+    else:
+        value = check['value']
+        if isinstance(value, (yr.Bytes, yr.File)):
+            length = len(value)
+        elif isinstance(element_type, types.Char):
+            value = ''.join(map(str, value))
+            length = len(value) + (kind == 'bytes_equal')
+        else:
+            value = [element_type.coerce(v) for v in value]
+            length = len(value)
+    if kind == 'within':
+        if 'tolerance' not in check:
+            raise ValueError('within needs a tolerance')
+        tolerance = int(check['tolerance'])
+        if tolerance < 0:
+            raise ValueError('negative tolerance {}'.format(tolerance))
+    expected = Declaration(value, types.Pointer(types.Const(element_type)),
+                           context.new_name())
+    return BufferComparison(kind, target, expected, length, tolerance)
+
 
 comparisons = {"equals": partial(BinOp, '=='),
                "less_than": partial(BinOp, '<'),
                "greater_than": partial(BinOp, '>'),
+               "bytes_equal": partial(buffer_comparison, 'bytes_equal'),
+               "prefix": partial(buffer_comparison, 'prefix'),
+               "all_zero": partial(buffer_comparison, 'all_zero'),
+               "within": partial(buffer_comparison, 'within'),
               }
+BUFFER_COMPARISONS = frozenset(('bytes_equal', 'prefix', 'all_zero',
+                                'within'))
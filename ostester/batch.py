@@ -0,0 +1,177 @@
+"""
+Generates the test suites for many YAML files in a single run
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from pathlib import Path
+
+import yaml
+
+from . import yamlreader, ast, ccodegen, incremental, profiling, utils
+
+
+SPEC_SUFFIXES = ('.yaml', '.yml')
+
+
+def spec_errors():
+    """
+    Returns the exception types that generating a bad spec raises, for
+    long-lived processes which report a bad spec and carry on. Any other
+    exception is a bug of the generator.
+    """
+    from jinja2 import TemplateError
+    return (yaml.YAMLError, ValueError, TypeError, KeyError, OSError,
+            TemplateError)
+
+
+def find_specs(paths):
+    """
+    Yields the YAML files named by paths, expanding directories into the
+    YAML files they contain
+    """
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob('*')
+                              if p.suffix in SPEC_SUFFIXES and p.is_file())
+        else:
+            yield path
+
+
+def generate_suite(spec, gen_dir, split=False, options=ccodegen.Options()):
+    """
+    Parses, transforms and renders the header suite for a single YAML
+    file with the given ccodegen options, returning the name of the tested
+    header. If split is true each function gets its own file, see
+    incremental.
+    """
+    with profiling.phase('spec {}'.format(spec), total=True):
+        with Path(spec).open('r') as f:
+            items = _profiled_parse(yamlreader.iter_parse(f))
+            metadata = next(items)
+            generate_tree(chain([metadata], items), gen_dir, split, options)
+    return metadata['header']
+
+
+def generate_tree(parsetree, gen_dir, split=False, options=ccodegen.Options()):
+    """
+    Renders the header suite for a parsed YAML file like generate_suite,
+    returning the paths of the C files written. parsetree may be an
+    iterator over the items of the file, see yamlreader.iter_parse; each
+    function is then transformed, rendered and written before the next
+    one is parsed.
+    """
+    if split:
+        return incremental.generate_header_files(parsetree, gen_dir, options)
+    context = utils.GenerationContext()
+    ast_ = ast.stream(parsetree, context)
+    ast_ = ast_._replace(tests=_profiled_transform(ast_.tests))
+    sources = ccodegen.generate_header_files(ast_, gen_dir, context, options)
+    profiling.count('identifiers', context.names)
+    return sources
+
+
+# Ends the iteration of _profiled_parse and _profiled_transform, as None
+# can be an item of a spec
+_END = object()
+
+
+def _profiled_parse(items):
+    while True:
+        with profiling.phase('parse'):
+            item = next(items, _END)
+        if item is _END:
+            return
+        yield item
+
+
+def _profiled_transform(functions):
+    while True:
+        with profiling.phase('transform'):
+            function = next(functions, _END)
+        if function is _END:
+            return
+        profiling.count('test cases', len(function.test_cases))
+        yield function
+
+
+def _generate_suite(spec, gen_dir, split, options, profile):
+    """
+    Runs generate_suite in a worker process, returning the header and, if
+    profile is true, the profiling.Profile of the run
+    """
+    if not profile:
+        return generate_suite(spec, gen_dir, split, options), None
+    with profiling.activate(profiling.Profile()) as worker_profile:
+        return generate_suite(spec, gen_dir, split, options), worker_profile
+
+
+def generate(paths, gen_dir, jobs=None, split=False,
+             options=ccodegen.Options()):
+    """
+    Generates a header suite for every YAML file in paths, spreading the
+    work over a pool of jobs processes, then writes one main.c which calls
+    every header suite. split and options are passed on to
+    generate_suite. The workers' measurements are added to the active
+    profiling.Profile, if any. Returns the tested headers in the order of
+    paths.
+    """
+    specs = list(find_specs(paths))
+    if not specs:
+        raise ValueError('no YAML files found in: {}'.format(
+            ', '.join(map(str, paths))))
+    # The suites of a header tested twice would overwrite each other
+    check_headers(specs)
+    if jobs == 1 or len(specs) == 1:
+        headers = [generate_suite(spec, gen_dir, split, options)
+                   for spec in specs]
+    else:
+        profile = profiling.active()
+        with ProcessPoolExecutor(jobs) as pool:
+            generated = list(pool.map(
+                _generate_suite, specs, repeat(gen_dir), repeat(split),
+                repeat(options), repeat(profile is not None)))
+        headers = [header for header, _ in generated]
+        if profile is not None:
+            for _, worker_profile in generated:
+                profile.merge(worker_profile)
+    generate_main(headers, gen_dir, options)
+    return headers
+
+
+def generate_main(headers, gen_dir, options=ccodegen.Options()):
+    """
+    Writes the main.c calling the suites of headers into gen_dir, raising
+    ValueError if a header is tested by more than one file
+    """
+    _check_duplicates(headers)
+    ccodegen.generate_main(headers, gen_dir, options)
+
+
+def read_header(spec):
+    """
+    Returns the header tested by spec, parsing only its first item
+    """
+    with Path(spec).open('r') as f:
+        items = yamlreader.iter_parse(f)
+        try:
+            return next(items)['header']
+        finally:
+            items.close()
+
+
+def check_headers(specs):
+    """
+    Returns the headers tested by specs, raising ValueError if a header is
+    tested by more than one of them
+    """
+    headers = [read_header(spec) for spec in specs]
+    _check_duplicates(headers)
+    return headers
+
+
+def _check_duplicates(headers):
+    duplicates = {h for h in headers if headers.count(h) > 1}
+    if duplicates:
+        raise ValueError('header tested by more than one file: {}'.format(
+            ', '.join(sorted(duplicates))))
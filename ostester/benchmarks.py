@@ -0,0 +1,317 @@
+"""
+Benchmarks of the generator itself, run with
+python3 -m ostester --benchmark NAME
+
+With --baseline FILE, the results are compared with the ones stored in
+FILE by an earlier run with --update-baseline, and the run fails if any
+measurement grew by more than --threshold times.
+"""
+
+import gc
+import json
+import math
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import time
+import tracemalloc
+
+import ostester
+from . import synthetic
+
+
+SPEC = os.path.join(ostester.__path__[0], 'tests', 'test-compare.yaml')
+
+_STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+from ostester import ccodegen
+imported = time.perf_counter()
+from ostester import yamlreader, ast
+with open(sys.argv[1]) as f:
+    ast_ = ast.transform(yamlreader.parse(f))
+ccodegen.render_main([ast_.header])
+ccodegen.render_header_suite(ast_.header, 'test_' + ast_.header, ast_.tests)
+rendered = time.perf_counter()
+print(json.dumps([imported - start, rendered - start]))
+'''
+
+
+def _startup_times(cache_dir):
+    env = dict(os.environ, OSTESTER_CACHE_DIR=cache_dir)
+    root = os.path.dirname(ostester.__path__[0])
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [root, env.get('PYTHONPATH')]))
+    output = subprocess.check_output(
+        [sys.executable, '-c', _STARTUP_SCRIPT, SPEC], env=env)
+    return json.loads(output.decode())
+
+
+def startup(runs=5):
+    """
+    Measures, in fresh interpreters, the time taken to import ccodegen and
+    the time until the suite for the test spec is first rendered, with no
+    template cache, a cold one and a warm one. Returns a list of
+    (measurement, median seconds) pairs.
+    """
+    samples = {}
+    with TemporaryDirectory() as warm_dir:
+        _startup_times(warm_dir)
+        for _ in range(runs):
+            with TemporaryDirectory() as cold_dir:
+                runs_by_cache = {'no cache': _startup_times(''),
+                                 'cold cache': _startup_times(cold_dir),
+                                 'warm cache': _startup_times(warm_dir)}
+            for cache, (imported, rendered) in runs_by_cache.items():
+                samples.setdefault('import ccodegen', []).append(imported)
+                samples.setdefault(
+                    'first render, ' + cache, []).append(rendered)
+    return [(name, statistics.median(times))
+            for name, times in samples.items()]
+
+
+def memory(functions=10, cases=2500):
+    """
+    Measures the memory held by the AST of a synthetic spec. Returns a
+    list of (measurement, bytes) pairs.
+    """
+    from . import yamlreader, ast
+    parse_tree = yamlreader.parse(synthetic.spec(
+        functions, cases, arguments=3, zeroed_size=7))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        ast_ = ast.transform(parse_tree)
+        gc.collect()
+        size, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    test_cases = sum(len(function.test_cases) for function in ast_.tests)
+    return [('AST bytes per test case', size / test_cases),
+            ('peak transform bytes per test case', peak / test_cases)]
+
+
+def streaming(functions=5, cases=200, scale=16):
+    """
+    Measures the peak memory of generating the suite for synthetic specs
+    with functions and scale times as many functions, which should be
+    about the same since functions are generated one at a time. Returns a
+    list of (measurement, bytes) pairs.
+    """
+    from . import batch
+    results = []
+    with TemporaryDirectory() as temp_dir:
+        spec = os.path.join(temp_dir, 'synthetic.yaml')
+        for count in (functions, functions * scale):
+            with open(spec, 'w') as f:
+                f.write(synthetic.spec(count, cases, arguments=3,
+                                       zeroed_size=8))
+            # The first run loads and compiles the templates
+            batch.generate_suite(spec, Path(temp_dir))
+            gc.collect()
+            tracemalloc.start()
+            try:
+                batch.generate_suite(spec, Path(temp_dir))
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            results.append(('peak bytes, {} functions'.format(count), peak))
+    return results
+
+
+def _compile(source, cflags):
+    start = time.perf_counter()
+    subprocess.check_call(['gcc'] + cflags + ['-c', source, '-o',
+                                              source + '.o'])
+    return time.perf_counter() - start, os.path.getsize(source + '.o')
+
+
+def table(functions=4, cases=2000, cflags=('-O2',)):
+    """
+    Compiles the suite for a spec of scalar functions once with unrolled
+    test cases and once with tables, measuring gcc's time and the object
+    size. Returns a list of (measurement, value) pairs.
+    """
+    from . import yamlreader, ast, ccodegen, utils
+    parse_tree = yamlreader.parse(
+        synthetic.spec(functions, cases, pointer_depth=0))
+    results = []
+    with TemporaryDirectory() as temp_dir:
+        with open(os.path.join(temp_dir, 'synthetic.h'), 'w') as header:
+            for function in range(functions):
+                print('int f{}(int, char);'.format(function), file=header)
+        for mode, table in (('unrolled', False), ('table', True)):
+            context = utils.GenerationContext()
+            ast_ = ast.transform(parse_tree, context)
+            source = os.path.join(temp_dir, mode + '.c')
+            with open(source, 'w') as suite:
+                print(ccodegen.render_header_suite(
+                    ast_.header, 'synthetic.h', ast_.tests, context,
+                    ccodegen.Options(table=table)), file=suite)
+            seconds, size = _compile(source, list(cflags))
+            results += [(mode + ' gcc seconds', seconds),
+                        (mode + ' object bytes', size)]
+    return results
+
+
+def pool(functions=4, cases=1000, strings=5, length=512,
+         cflags=('-O2',)):
+    """
+    Generates and compiles the suite for a spec of functions passing one
+    of strings strings of length characters to every test case, once
+    through char* and once through const char*, measuring the source size
+    and gcc's time. Returns a list of (measurement, value) pairs.
+    """
+    from . import yamlreader, ast, ccodegen, utils
+    results = []
+    with TemporaryDirectory() as temp_dir:
+        for parameter in ('char*', 'const char*'):
+            lines = ['- header: pool.h']
+            for function in range(functions):
+                lines += ['- function: f{}'.format(function),
+                          '  type: {} -> int'.format(parameter),
+                          '  tests:']
+                lines += ['    - args: [{}]\n      equals: 0'.format(
+                    chr(ord('a') + case % strings) * length)
+                    for case in range(cases)]
+            with open(os.path.join(temp_dir, 'pool.h'), 'w') as header:
+                for function in range(functions):
+                    print('int f{}({});'.format(function, parameter),
+                          file=header)
+            context = utils.GenerationContext()
+            ast_ = ast.transform(yamlreader.parse('\n'.join(lines)),
+                                 context)
+            source = os.path.join(temp_dir, 'suite.c')
+            with open(source, 'w') as suite:
+                print(ccodegen.render_header_suite(
+                    ast_.header, 'pool.h', ast_.tests, context), file=suite)
+            seconds, _ = _compile(source, list(cflags))
+            results += [(parameter + ' source bytes',
+                         os.path.getsize(source)),
+                        (parameter + ' gcc seconds', seconds)]
+    return results
+
+
+def _phases(text, context):
+    """
+    Yields the name of every phase of generating the suites for the spec
+    text, after running the phase
+    """
+    from . import yamlreader, ast, ccodegen
+    parse_tree = yamlreader.parse(text)
+    yield 'parse'
+    ast_ = ast.transform(parse_tree, context)
+    yield 'transform'
+    ccodegen.render_main([ast_.header])
+    yield 'render_main'
+    ccodegen.render_header_suite_header(ast_.header)
+    yield 'render_header_suite_header'
+    hs_header = 'test_' + ast_.header
+    ccodegen.render_header_suite(ast_.header, hs_header, ast_.tests, context)
+    yield 'render_header_suite'
+    ccodegen.render_header_suite(ast_.header, hs_header, ast_.tests, context,
+                                 ccodegen.Options(table=True))
+    yield 'render_header_suite, table'
+    for function in ast_.tests:
+        ccodegen.render_function_test(ast_.header, function, context,
+                                      ccodegen.Options())
+    yield 'render_function_test'
+
+
+def pipeline(functions=20, cases=200, arguments=3, pointer_depth=1,
+             zeroed_size=16, repeat=3):
+    """
+    Runs every phase of the generator on a synthetic spec with the given
+    parameters, see synthetic.spec, measuring the fastest of repeat runs
+    and, in a separate run, the peak memory each phase allocated on top of
+    what earlier phases still hold.
+    Returns a list of (measurement, value) pairs.
+    """
+    from . import utils
+    text = synthetic.spec(functions, cases, arguments, pointer_depth,
+                          zeroed_size)
+    seconds = {}
+    for _ in range(repeat):
+        phases = _phases(text, utils.GenerationContext())
+        start = time.perf_counter()
+        for phase in phases:
+            end = time.perf_counter()
+            seconds[phase] = min(seconds.get(phase, math.inf), end - start)
+            start = time.perf_counter()
+    peaks = {}
+    gc.collect()
+    tracemalloc.start()
+    try:
+        start = 0
+        for phase in _phases(text, utils.GenerationContext()):
+            peaks[phase] = tracemalloc.get_traced_memory()[1] - start
+            tracemalloc.reset_peak()
+            start = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return ([(phase + ' seconds', value) for phase, value in seconds.items()]
+            + [(phase + ' peak bytes', value)
+               for phase, value in peaks.items()])
+
+
+BENCHMARKS = {
+    'startup': (startup, '{:9.2f} ms', 1000),
+    'memory': (memory, '{:9.0f} B', 1),
+    'streaming': (streaming, '{:9.0f} B', 1),
+    'table': (table, '{:12.2f}', 1),
+    'pool': (pool, '{:12.2f}', 1),
+    'pipeline': (pipeline, '{:12.4g}', 1),
+}
+
+
+def compare(results, baseline, threshold=1.2):
+    """
+    Returns the (measurement, value, baseline value) triples of results,
+    a list of (measurement, value) pairs, that are more than threshold
+    times their value in baseline, a dictionary. Every measurement is
+    better when lower.
+    >>> compare([('a', 1.0), ('b', 3.0), ('c', 5.0)], {'a': 1.0, 'b': 2.0})
+    [('b', 3.0, 2.0)]
+    """
+    return [(measurement, value, baseline[measurement])
+            for measurement, value in results
+            if measurement in baseline
+            and value > baseline[measurement] * threshold]
+
+
+def run(name, baseline=None, update_baseline=False, threshold=1.2,
+        **options):
+    """
+    Runs the named benchmark with options, returning its results as a table
+    and the regressions against the results stored for it in the JSON file
+    baseline, see compare. With update_baseline, the results are stored in
+    baseline instead.
+    """
+    if name not in BENCHMARKS:
+        raise ValueError('unknown benchmark {!r}, expected one of: {}'.format(
+            name, ', '.join(sorted(BENCHMARKS))))
+    benchmark, value_format, scale = BENCHMARKS[name]
+    results = benchmark(**options)
+    baselines = {}
+    if baseline is not None and os.path.exists(baseline):
+        with open(baseline) as f:
+            baselines = json.load(f)
+    regressions = []
+    if update_baseline:
+        baselines[name] = dict(results)
+        with open(baseline, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+    elif baseline is not None:
+        regressions = compare(results, baselines.get(name, {}), threshold)
+    width = max(len(measurement) for measurement, _ in results)
+    lines = ['{:<{}}  {}'.format(measurement, width,
+                                 value_format.format(value * scale))
+             for measurement, value in results]
+    for measurement, value, previous in regressions:
+        lines.append('regression: {} {} against {}'.format(
+            measurement, value_format.format(value * scale).strip(),
+            value_format.format(previous * scale).strip()))
+    return '\n'.join(lines), regressions
@@ -1,64 +1,249 @@
+from collections import namedtuple
+import functools
 import logging
-import shutil
+import os
 import os.path
 
-from jinja2 import Environment, PackageLoader
-
-from . import utils
+from . import profiling, utils, values
+from .ast import BinOp
+from .yamlreader import GENERATORS
 import ostester
 
-env = Environment(loader=PackageLoader('ostester', 'templates'),
-                  trim_blocks=True,
-                  lstrip_blocks=True)
-env.filters['header_to_function_name'] = utils.header_to_function_name
-env.filters['function_test_case_name'] = utils.function_test_case_name
-env.globals['new_name'] = utils.new_name
+
+TEMPLATE_DIR = os.path.join(ostester.__path__[0], 'templates')
+
+
+REPORT_FORMATS = ('tap', 'json')
+GUARDS = ('after', 'before')
+
+
+class Options(namedtuple('Options', ('table', 'report', 'guard'),
+                         defaults=(False, None, None))):
+    """
+    Options changing the generated code:
+    table -- emit the test cases of functions with only scalar arguments
+             and results as a static table walked by a loop, instead of
+             unrolling every case
+    report -- one of REPORT_FORMATS to run every test case, timing it, and
+              print one line per case in that format, or None to stop at
+              the first failure and return its number. Benchmarks are only
+              run, and reported in the same format, when this is set.
+    guard -- one of GUARDS to map the data of every pointer argument of a
+             test case on its own, flush against an inaccessible page
+             after it, or before it with another inaccessible page after
+             its last page, so that an access out of its bounds faults at
+             once and the suite prints the case and argument; or None to
+             use plain arrays
+    """
+    __slots__ = ()
+
+
+def table_eligible(function):
+    """
+    Returns whether the test cases of function can be emitted as a table
+    """
+    return (bool(function.test_cases) and function.type.output.scalar and
+            all(type.scalar for type in function.type.inputs) and
+            all(isinstance(test.comparison, BinOp) and
+                len(test.declarations) == len(test.arguments) and
+                not test.generators
+                for test in function.test_cases))
+
+
+def cache_dir():
+    """
+    Returns the directory holding the compiled templates: $OSTESTER_CACHE_DIR
+    if it is set, otherwise ostester/jinja2 in the user's cache directory.
+    An empty $OSTESTER_CACHE_DIR disables the cache.
+    """
+    directory = os.environ.get('OSTESTER_CACHE_DIR')
+    if directory is not None:
+        return directory or None
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'ostester', 'jinja2')
+
+
+def create_env(bytecode_dir=None):
+    """
+    Returns a new Jinja environment for the templates. If bytecode_dir is
+    given, compiled templates are stored there and reused by later
+    processes for as long as the template source is unchanged.
+    """
+    from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+    bytecode_cache = None
+    if bytecode_dir is not None:
+        try:
+            os.makedirs(bytecode_dir, exist_ok=True)
+            bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+        except OSError:
+            logging.getLogger('tests').warning(
+                "can't use template cache %s", bytecode_dir)
+    env = Environment(loader=FileSystemLoader(TEMPLATE_DIR),
+                      bytecode_cache=bytecode_cache,
+                      trim_blocks=True,
+                      lstrip_blocks=True)
+    env.filters['header_to_function_name'] = utils.header_to_function_name
+    env.filters['function_test_case_name'] = utils.function_test_case_name
+    env.filters['function_benchmark_name'] = utils.function_benchmark_name
+    env.tests['table_eligible'] = table_eligible
+    env.tests['generated'] = lambda value: isinstance(value, GENERATORS)
+    env.globals['options'] = Options()
+    return env
+
+
+@functools.lru_cache(maxsize=None)
+def get_env():
+    """
+    Returns the Jinja environment shared by the render functions, creating
+    it on first use so that importing this module doesn't import jinja2
+    """
+    return create_env(cache_dir())
+
+
+def __getattr__(name):
+    if name == 'env':
+        return get_env()
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def generate_files(ast, gen_dir, context=None, options=Options()):
+    generate_main([ast.header], gen_dir, options)
+    generate_header_files(ast, gen_dir, context, options)
+
+
+def generate_main(tested_headers, gen_dir, options=Options()):
+    """
+    Writes main.c, which calls the suite of every header in
+    tested_headers, test_main.h and ostester_runtime.h into gen_dir
+    """
+    logger = logging.getLogger('tests')
+    main_text = render_main(tested_headers, options)
+    logger.info("main.c")
+    logger.debug(main_text)
+    utils.write_if_changed(gen_dir / 'main.c', main_text)
+    for header in ('test_main.h', 'ostester_runtime.h'):
+        utils.write_if_changed(gen_dir / header,
+                               template_source(header).rstrip('\n'))
 
 
-def generate_files(ast, gen_dir):
+def generate_header_files(ast, gen_dir, context=None, options=Options()):
+    """
+    Writes the suite testing a single header into gen_dir, returning the
+    paths of the C files written. context should be the GenerationContext
+    the AST was transformed in. The tests of ast may be an iterator, see
+    ast.stream, and are rendered as they are transformed.
+    """
     logger = logging.getLogger('tests')
-    with (gen_dir / 'main.c').open('w') as main:
-        main_text = render_main([ast['header']])
-        logger.info("main.c")
-        logger.info(main_text)
-        print(main_text, file=main)
-    hsh_name = 'test_'+ast['header']
-    with (gen_dir / hsh_name).open('w') as hsh:
-        compare_text = render_header_suite_header(ast['header'])
-        logger.info(hsh_name)
-        logger.info(compare_text)
-        print(compare_text, file=hsh)
+    hsh_name = 'test_'+ast.header
+    compare_text = render_header_suite_header(ast.header)
+    logger.info(hsh_name)
+    logger.debug(compare_text)
+    utils.write_if_changed(gen_dir / hsh_name, compare_text)
     hs_name = hsh_name.replace('.h', '.c')
-    with (gen_dir / hs_name).open('w') as header_suite:
-        compare_text = render_header_suite(
-            ast['header'], hsh_name, ast['tests'])
-        logger.info(hs_name)
-        logger.info(compare_text)
-        print(compare_text, file=header_suite)
-    shutil.copyfile(
-        os.path.join(ostester.__path__[0], 'templates/test_main.h'),
-        str(gen_dir/'test_main.h'),
-    )
+    logger.info(hs_name)
+    stream_header_suite(gen_dir / hs_name, ast.header, hsh_name, ast.tests,
+                        context, options)
+    return [gen_dir / hs_name]
+
+
+def _context(context):
+    return context if context is not None else utils.GenerationContext()
+
+
+def template_source(name):
+    """
+    Returns the source text of the template called name, without loading
+    jinja2
+    """
+    with open(os.path.join(TEMPLATE_DIR, name)) as template:
+        return template.read()
+
+
+def _render(name, **variables):
+    with profiling.phase('render ' + name):
+        return get_env().get_template(name).render(**variables)
 
 
-def render_main(tested_headers):
+def _stream(path, name, **variables):
+    with profiling.phase('render ' + name):
+        return utils.stream_if_changed(
+            path, get_env().get_template(name).generate(**variables))
+
+
+def render_main(tested_headers, options=Options()):
     """
     Returns a string containing the entry point for the generated tests
     """
-    template = env.get_template('main.jinja2.c')
-    return template.render(test_headers=tested_headers)
+    return _render('main.jinja2.c', test_headers=tested_headers,
+                   options=options)
 
 
 def render_header_suite_header(header):
-    template = env.get_template('header_suite_header.jinja2.c')
-    return template.render(function=header)
+    return _render('header_suite_header.jinja2.c', function=header)
 
 
-def render_header_suite(test_header, hs_header, functions):
+def render_header_suite(test_header, hs_header, functions, context=None,
+                        options=Options()):
     """
-    Returns a string containing the entry point for the generated tests
+    Returns a string containing the entry point for the generated tests.
+    Names are allocated from context, which should be the one the
+    functions were transformed in, by default a fresh one.
+    """
+    return _render('header_suite.jinja2.c', test_header_name=test_header,
+                   header_suite_header_name=hs_header, functions=functions,
+                   new_name=_context(context).new_name,
+                   data_pool=values.DataPool(), options=options)
+
+
+def stream_header_suite(path, test_header, hs_header, functions,
+                        context=None, options=Options()):
+    """
+    Writes what render_header_suite returns to path if it changed, see
+    utils.stream_if_changed, rendering and writing it piece by piece.
+    functions may be an iterator. Returns whether path was written.
+    """
+    return _stream(path, 'header_suite.jinja2.c',
+                   test_header_name=test_header,
+                   header_suite_header_name=hs_header, functions=functions,
+                   new_name=_context(context).new_name,
+                   data_pool=values.DataPool(), options=options)
+
+
+def render_function_test(test_header, function, context=None,
+                         options=Options()):
+    """
+    Returns a string containing a translation unit which runs the test
+    cases of a single function, allocating names from context like
+    render_header_suite
+    """
+    return _render('function_test.jinja2.c', test_header_name=test_header,
+                   function=function, new_name=_context(context).new_name,
+                   data_pool=values.DataPool(), options=options)
+
+
+def stream_function_test(path, test_header, function, context=None,
+                         options=Options()):
+    """
+    Writes what render_function_test returns to path if it changed, like
+    stream_header_suite
+    """
+    return _stream(path, 'function_test.jinja2.c',
+                   test_header_name=test_header, function=function,
+                   new_name=_context(context).new_name,
+                   data_pool=values.DataPool(), options=options)
+
+
+def render_split_header_suite(test_header, hs_header, functions,
+                              options=Options()):
+    """
+    Returns a string containing the entry point for a header suite whose
+    functions are tested in separate translation units. Each function is
+    a mapping with the function's name and base, the number of test cases
+    preceding it in the suite.
     """
-    template = env.get_template('header_suite.jinja2.c')
-    return template.render(test_header_name=test_header,
-                           header_suite_header_name=hs_header,
-                           functions=functions)
+    return _render('split_header_suite.jinja2.c',
+                   test_header_name=test_header,
+                   header_suite_header_name=hs_header, functions=functions,
+                   options=options)
@@ -0,0 +1,74 @@
+"""
+The thin client of the generation server, see server. It takes the same
+arguments as testgen and forwards them to the server, so a build calling
+it once per spec only pays for starting Python, not for importing yaml
+and jinja2 and compiling the templates. Without a server it runs testgen
+instead.
+
+A request is the directory the client runs in followed by its
+arguments, each terminated by a NUL byte. The answer is the exit status
+on a line followed by what testgen printed. Only os, socket and sys are
+imported here, to keep the client cheap.
+"""
+
+import os
+import socket
+import sys
+
+
+def default_socket():
+    """
+    Returns the path of the server's socket: $OSTESTER_SOCKET if it is
+    set, otherwise ostester.sock in $XDG_RUNTIME_DIR or a per-user name
+    in the temporary directory
+    """
+    path = os.environ.get('OSTESTER_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'ostester.sock')
+    return os.path.join(os.environ.get('TMPDIR', '/tmp'),
+                        'ostester-{}.sock'.format(os.getuid()))
+
+
+def request(argv, socket_path=None, cwd=None):
+    """
+    Has the server at socket_path run testgen with the arguments argv,
+    relative to cwd, returning its exit status and output. Raises OSError
+    if there is no server. A server that closes the connection without
+    answering gives status 1.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path or default_socket())
+        connection.sendall(encode([cwd or os.getcwd()] + list(argv)))
+        connection.shutdown(socket.SHUT_WR)
+        with connection.makefile('rb') as reply:
+            status = reply.readline()
+            if not status:
+                return 1, ('testgen-client: error: the server closed the '
+                           'connection without answering\n')
+            output = reply.read().decode()
+    return int(status), output
+
+
+def encode(strings):
+    return b''.join(os.fsencode(string) + b'\0' for string in strings)
+
+
+def decode(data):
+    return [os.fsdecode(string) for string in data.split(b'\0')[:-1]]
+
+
+def main(argv):
+    """
+    Entry point of testgen-client, returning the exit status
+    """
+    try:
+        status, output = request(argv)
+    except (FileNotFoundError, ConnectionRefusedError):
+        testgen = os.path.join(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))), 'testgen')
+        os.execv(sys.executable, [sys.executable, testgen] + argv)
+    (sys.stdout if status == 0 else sys.stderr).write(output)
+    return status
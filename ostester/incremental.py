@@ -0,0 +1,104 @@
+"""
+Generates header suites with one translation unit per tested function.
+
+Every function's file is keyed by a hash of its part of the spec, the
+templates it is rendered from and the generator version. Files whose key
+is unchanged are neither regenerated nor rewritten, so their mtimes only
+move when their content does.
+"""
+
+import hashlib
+import json
+import logging
+
+import ostester
+from . import ast, ccodegen, profiling, types, utils
+
+
+FUNCTION_TEMPLATES = ('function_test.jinja2.c', 'test_case.jinja2.c',
+                      'sweep_test_case.jinja2.c', 'table_test_case.jinja2.c',
+                      'benchmark.jinja2.c')
+
+
+def function_file_name(hs_name, function_name):
+    """
+    Returns the name of the file testing function_name in the header suite
+    called hs_name
+    >>> function_file_name('test_compare.c', 'compare')
+    'test_compare-compare.c'
+    """
+    return '{}-{}.c'.format(hs_name[:-len('.c')], function_name)
+
+
+def fragment_key(header, fragment, options, structs=None):
+    """
+    Returns the key of the file generated from fragment, a function entry
+    of the spec for header defining structs, with the given ccodegen
+    options
+    """
+    digest = hashlib.sha256()
+    digest.update(ostester.__version__.encode())
+    for name in FUNCTION_TEMPLATES:
+        digest.update(ccodegen.template_source(name).encode())
+    digest.update(repr(options).encode())
+    digest.update(header.encode())
+    digest.update(repr(fragment).encode())
+    digest.update(repr(structs).encode())
+    return digest.hexdigest()
+
+
+def generate_header_files(parsetree, gen_dir, options=ccodegen.Options()):
+    """
+    Writes the suite testing the header of parsetree, which may be an
+    iterator, into gen_dir, with each function in its own file, returning
+    the paths of the C files
+    """
+    logger = logging.getLogger('tests')
+    fragments = iter(parsetree)
+    metadata = next(fragments)
+    header = metadata['header']
+    structs = types.define_structs(metadata.get('structs', {}))
+    hsh_name = 'test_'+header
+    hs_name = hsh_name.replace('.h', '.c')
+    manifest_path = gen_dir / '.{}.manifest.json'.format(hs_name)
+    try:
+        old_manifest = json.loads(manifest_path.read_text())
+    except (OSError, ValueError):
+        old_manifest = {}
+
+    manifest = {}
+    functions = []
+    sources = [gen_dir / hs_name]
+    base = 0
+    for fragment in fragments:
+        ast.check_function_entry(fragment)
+        name = function_file_name(hs_name, fragment['function'])
+        key = fragment_key(header, fragment, options,
+                           metadata.get('structs'))
+        if old_manifest.get(name) != key or not (gen_dir / name).exists():
+            logger.info(name)
+            context = utils.GenerationContext(structs)
+            with profiling.phase('transform'):
+                function = ast.function_test(fragment, context)
+            profiling.count('test cases', len(function.test_cases))
+            ccodegen.stream_function_test(gen_dir / name, header, function,
+                                          context, options)
+            profiling.count('identifiers', context.names)
+        manifest[name] = key
+        functions.append({'name': fragment['function'], 'base': base,
+                          'benchmark': 'benchmark' in fragment})
+        base += len(fragment.get('tests', []))
+        sources.append(gen_dir / name)
+
+    for stale in old_manifest.keys() - manifest.keys():
+        stale_path = gen_dir / stale
+        if stale_path.exists():
+            stale_path.unlink()
+    utils.write_if_changed(gen_dir / hsh_name,
+                           ccodegen.render_header_suite_header(header))
+    utils.write_if_changed(gen_dir / hs_name,
+                           ccodegen.render_split_header_suite(
+                               header, hsh_name, functions, options))
+    utils.write_if_changed(manifest_path,
+                           json.dumps(manifest, indent=2, sort_keys=True))
+    return sources
@@ -0,0 +1,333 @@
+"""
+Runs the test cases of specs in this process, for quick iteration on the
+code under test.
+
+The sources listed in the header entry of a spec are compiled once into a
+shared object, which is loaded with ctypes. Every test case then builds
+its arguments from its declarations, calls the function directly and
+applies the check of its comparison in Python, so after a change to the
+sources checking a spec costs one compile and a few microseconds per
+case, instead of generating, building and running a suite.
+
+Generated suites stay the reference: a function that crashes takes this
+process down with it, and what the C compiler would reject in a
+generated suite, such as an int passed for a pointer, isn't diagnosed
+here. Results can only be compared with numbers, character constants and
+NULL, not with other C expressions. Benchmarks are only run by generated
+suites.
+"""
+
+import ctypes
+from itertools import product
+from pathlib import Path
+import subprocess
+from tempfile import TemporaryDirectory
+import time
+
+from . import ast, batch, ccodegen, runner, types
+from .results import CaseResult
+from .yamlreader import GENERATORS, Bytes, File, Zeroed, parse
+
+
+# Defines the test_main called by the main of the sources, which isn't
+# part of the library
+_TEST_MAIN_STUB = '__attribute__((weak)) int test_main(void) { return 0; }\n'
+
+
+def load_library(sources, include_dirs=(),
+                 configuration=runner.DEFAULT_CONFIGURATION):
+    """
+    Compiles sources into a new shared object and loads it, returning the
+    ctypes.CDLL. Raises subprocess.CalledProcessError with the compiler's
+    output if the build fails.
+    """
+    with TemporaryDirectory() as temp_dir:
+        stub = Path(temp_dir) / 'ostester_test_main.c'
+        stub.write_text(_TEST_MAIN_STUB)
+        # Every build gets a new path: loading a path again would give
+        # the library already loaded from it
+        library = Path(temp_dir) / 'code.so'
+        command = [configuration.cc] + list(configuration.cflags) + [
+            '-shared', '-fPIC', '-I', ccodegen.TEMPLATE_DIR]
+        for include in include_dirs:
+            command += ['-I', str(include)]
+        runner._compile(command + ['-o', str(library)] +
+                        [str(source) for source in sources] + [str(stub)])
+        return ctypes.CDLL(str(library))
+
+
+def ctype(type):
+    """
+    Returns the ctypes type holding values of type. Pointers are
+    c_void_p and chars are c_byte, so that they are numbers like in C.
+    >>> array = ctype(types.c_type('const char[4]'))
+    >>> array._type_, array._length_
+    (<class 'ctypes.c_byte'>, 4)
+    """
+    type = type.unqualified
+    if isinstance(type, types.Int):
+        return ctypes.c_int
+    if isinstance(type, types.Char):
+        return ctypes.c_byte
+    if isinstance(type, types.Pointer):
+        return ctypes.c_void_p
+    if isinstance(type, types.Array):
+        return ctype(type.element_type) * type.length
+    return _structure(type)
+
+
+_structures = {}
+
+
+def _structure(struct):
+    if struct.fields is None:
+        raise ValueError('{} has no definition'.format(struct))
+    if struct not in _structures:
+        _structures[struct] = type(struct.name, (ctypes.Structure,), {
+            '_fields_': [(name, ctype(field_type))
+                         for name, field_type in struct.fields]})
+    return _structures[struct]
+
+
+def _value(type, value):
+    # The value of type as ctypes takes it: a number for scalars
+    type = type.unqualified
+    if isinstance(type, types.Char):
+        return ord(type.coerce(value))
+    if type.scalar:
+        return type.coerce(value)
+    if isinstance(type, types.Array):
+        if len(value) > type.length:
+            raise ValueError('{} values given for {}'.format(len(value),
+                                                             type))
+        return ctype(type)(*(_value(type.element_type, v) for v in value))
+    if isinstance(type, types.Struct):
+        structure = ctype(type)
+        if isinstance(value, dict):
+            field_types = dict(type.fields)
+            unknown = value.keys() - field_types.keys()
+            if unknown:
+                raise ValueError('{} has no field {}'.format(
+                    type, ', '.join(sorted(unknown))))
+            return structure(**{field: _value(field_types[field], v)
+                                for field, v in value.items()})
+        if len(value) > len(type.fields):
+            raise ValueError('{} values given for {}'.format(len(value),
+                                                             type))
+        return structure(*(_value(field_type, v) for (_, field_type), v
+                           in zip(type.fields, value)))
+    raise ValueError("can't pass a {} in process".format(type))
+
+
+def marshal(declaration, objects=None):
+    """
+    Returns a ctypes object holding the value of declaration like the
+    generated code initializes it. The data pointed to by a pointer is a
+    new array, so the function under test may write to it. A pointer
+    initialized with the name of a declaration in objects, a dict from
+    names to the objects already marshalled, points to that object.
+    >>> from .values import Declaration
+    >>> list(marshal(Declaration('ab', types.c_type('const char*'))))
+    [97, 98, 0]
+    >>> list(marshal(Declaration(Zeroed(2), types.c_type('int*'))))
+    [0, 0]
+    """
+    type, value = declaration.type, declaration.value
+    if not isinstance(type, types.Pointer):
+        if type.scalar:
+            return ctype(type)(_value(type, value))
+        return _value(type, value)
+    element_type = type.inner_type.unqualified
+    if isinstance(value, Zeroed):
+        return (ctype(element_type) * max(len(value), 1))()
+    if isinstance(value, (Bytes, File)):
+        if not isinstance(element_type, types.Char):
+            raise ValueError('{} needs a char pointer, not {}'.format(
+                value.yaml_tag, type))
+        data = (value.data if isinstance(value, Bytes) else
+                Path(value.path).read_bytes()) + b'\0'
+        return (ctypes.c_byte * len(data)).from_buffer_copy(data)
+    if isinstance(value, str) and objects and value in objects:
+        return ctypes.c_void_p(_address(objects[value]))
+    if isinstance(element_type, types.Char):
+        data = ''.join(map(str, value)).encode() + b'\0'
+        return (ctypes.c_byte * len(data)).from_buffer_copy(data)
+    if isinstance(value, str) or not value:
+        raise ValueError("can't pass {!r} as a {} in process".format(value,
+                                                                     type))
+    return (ctype(element_type) * len(value))(
+        *(_value(element_type, v) for v in value))
+
+
+def operand(type, expression):
+    """
+    Returns the number the C expression a result of type is compared with
+    stands for, as ctypes returns such a result. Only numbers, character
+    constants and NULL can be evaluated here.
+    >>> operand(types.c_type('char'), "'A'"), operand(types.Int(), '0x10')
+    (65, 16)
+    >>> operand(types.c_type('char'), 200)
+    -56
+    """
+    type = type.unqualified
+    if isinstance(expression, int) and not isinstance(expression, bool):
+        number = expression
+    else:
+        text = str(expression).strip()
+        number = None
+        if len(text) > 2 and text[0] == text[-1] == "'":
+            character = text[1:-1].encode().decode('unicode_escape')
+            if len(character) == 1:
+                number = ord(character)
+        elif text == 'NULL':
+            number = 0
+        else:
+            try:
+                number = int(text, 0)
+            except ValueError:
+                pass
+        if number is None:
+            raise ValueError("can't evaluate {} in process".format(text))
+    if isinstance(type, types.Pointer):
+        return number
+    return ctype(type)(number).value
+
+
+def _address(object):
+    if isinstance(object, ctypes.c_void_p):
+        return object.value
+    return ctypes.addressof(object)
+
+
+class Function:
+    """
+    A function of a library under test and the test cases it is checked
+    with, ready to be called with the arguments of each case
+    """
+
+    def __init__(self, library, function):
+        try:
+            self.call = getattr(library, function.name)
+        except AttributeError:
+            raise ValueError('{} is not defined by the sources'.format(
+                function.name))
+        self.call.restype = ctype(function.type.output)
+        # Arrays are passed as pointers to their first element, like in C
+        self.call.argtypes = [
+            ctypes.c_void_p if isinstance(type.unqualified, types.Array)
+            else ctype(type) for type in function.type.inputs]
+        self.output = function.type.output
+        self.expected = {}
+
+    def check(self, test):
+        """
+        Runs test, a test case of the function, returning whether it
+        passed. A test case with generated arguments passes if every
+        combination of their values does.
+        """
+        generated = [argument.name for argument in test.generators]
+        return all(
+            self.check_once(test, dict(zip(generated, values)))
+            for values in product(*(argument.value.values()
+                                    for argument in test.generators)))
+
+    def check_once(self, test, generated):
+        """
+        Runs test with the values of its generated arguments in generated,
+        a dict from their names to numbers
+        """
+        objects = {}
+        for declaration in test.declarations:
+            if isinstance(declaration.value, GENERATORS):
+                objects[declaration.name] = ctype(declaration.type)(
+                    generated[declaration.name])
+            else:
+                objects[declaration.name] = marshal(declaration, objects)
+        result = self.call(*(objects[argument.name]
+                             for argument in test.arguments))
+        if result is None:
+            # A null pointer
+            result = 0
+        comparison = test.comparison
+        if not isinstance(comparison, ast.BufferComparison):
+            if test.number not in self.expected:
+                self.expected[test.number] = comparison._replace(
+                    arg=operand(self.output, comparison.arg))
+            return self.expected[test.number].evaluate(result)
+        if test.number not in self.expected:
+            self.expected[test.number] = list(
+                marshal(comparison.expected))[:comparison.length]
+        address = (result if comparison.target is None else
+                   _address(objects[comparison.target]))
+        if not comparison.length:
+            actual = []
+        elif not address:
+            return False
+        else:
+            actual = list((ctype(comparison.expected.type.inner_type) *
+                           comparison.length).from_address(address))
+        return comparison.evaluate(actual, self.expected[test.number])
+
+
+def check(spec, configuration=runner.DEFAULT_CONFIGURATION, functions=None):
+    """
+    Builds the sources of spec and runs its test cases in this process,
+    returning the results.CaseResults and the seconds spent building. If
+    functions is given, only the test cases of the functions it names are
+    run.
+    """
+    spec = Path(spec)
+    with spec.open('r') as f:
+        parsetree = parse(f)
+    metadata = parsetree[0]
+    tree = ast.stream(parsetree)
+    tests = [function for function in tree.tests
+             if functions is None or function.name in functions]
+    start = time.perf_counter()
+    library = load_library(
+        [spec.parent / source for source in metadata.get('sources', [])],
+        [spec.parent / include for include in metadata.get('include', ['.'])],
+        configuration)
+    build_seconds = time.perf_counter() - start
+    results = []
+    for function in tests:
+        tested = Function(library, function)
+        for test in function.test_cases:
+            start = time.perf_counter_ns()
+            passed = tested.check(test)
+            results.append(CaseResult(tree.header, function.name,
+                                      test.number, passed,
+                                      time.perf_counter_ns() - start))
+    return results, build_seconds
+
+
+def main(args):
+    """
+    Entry point of ostester check, returning the exit status
+    """
+    configuration = runner.DEFAULT_CONFIGURATION._replace(
+        cc=args.cc, cflags=tuple(args.cflags))
+    failed = False
+    for spec in batch.find_specs(args.yaml_files):
+        try:
+            results, build_seconds = check(spec, configuration,
+                                           args.function)
+        except subprocess.CalledProcessError as error:
+            print('{}: build failed'.format(spec))
+            print(error.output)
+            failed = True
+            continue
+        except ValueError as error:
+            print('{}: {}'.format(spec, error))
+            failed = True
+            continue
+        failures = [result for result in results if not result.passed]
+        print('{}: {} ({:.2f}s build, {:.2f}ms run)'.format(
+            spec, '{} of {} cases failed'.format(len(failures), len(results))
+            if failures else 'ok, {} cases'.format(len(results)),
+            build_seconds, sum(result.ns for result in results) / 1e6))
+        for result in failures:
+            print('    {} case {} failed'.format(result.function,
+                                                 result.case))
+        failed = failed or bool(failures)
+    return 1 if failed else 0
@@ -0,0 +1,153 @@
+"""
+Measures where generation spends its time, for testgen --profile.
+
+Generation code marks its phases with phase(name) and its counters with
+count(name, n). Both do nothing unless a Profile has been activated in
+the process, so the instrumentation costs next to nothing by default.
+
+Phases nest, as rendering pulls the functions it renders out of
+transform, which pulls them out of parse. The time of a phase leaves out
+the phases run within it, so every phase shows what it costs itself.
+"""
+
+from contextlib import contextmanager
+import time
+
+
+class Profile:
+    """
+    The wall time spent in every phase of generation itself and its number
+    of runs, and the totals of every counter
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self.counters = {}
+
+    def add_time(self, phase, seconds):
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def count(self, counter, n=1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+
+    def merge(self, other):
+        """
+        Adds the measurements of other, e.g. made in a worker process, to
+        this profile
+        """
+        for phase, seconds in other.seconds.items():
+            self.seconds[phase] = self.seconds.get(phase, 0.0) + seconds
+            self.calls[phase] = (self.calls.get(phase, 0) +
+                                 other.calls[phase])
+        for counter, n in other.counters.items():
+            self.count(counter, n)
+
+    def report(self):
+        """
+        Returns the measurements as a table, slowest phase first
+        >>> profile = Profile()
+        >>> profile.add_time('parse', 0.5)
+        >>> profile.count('test cases', 3)
+        >>> print(profile.report())
+        phase       calls   seconds
+        parse           1     0.500
+        <BLANKLINE>
+        test cases      3
+        """
+        width = max(map(len, ['phase'] + list(self.seconds) +
+                        list(self.counters)))
+        lines = ['{:<{}}  {:>5}  {:>8}'.format('phase', width, 'calls',
+                                               'seconds')]
+        for phase in sorted(self.seconds, key=self.seconds.get,
+                            reverse=True):
+            lines.append('{:<{}}  {:>5}  {:8.3f}'.format(
+                phase, width, self.calls[phase], self.seconds[phase]))
+        lines.append('')
+        for counter in sorted(self.counters):
+            lines.append('{:<{}}  {:>5}'.format(counter, width,
+                                                self.counters[counter]))
+        return '\n'.join(lines)
+
+
+_active = None
+# The time spent in the phases run within each phase being run, innermost
+# last
+_nested = []
+
+
+@contextmanager
+def activate(profile):
+    """
+    Records the phases and counters of the process in profile for the
+    duration of the with block
+    """
+    global _active
+    previous, _active = _active, profile
+    try:
+        yield profile
+    finally:
+        _active = previous
+
+
+def active():
+    """
+    Returns the active Profile, or None if the process isn't profiled
+    """
+    return _active
+
+
+@contextmanager
+def phase(name, total=False):
+    """
+    Adds the time spent in the with block to the phase called name of the
+    active profile, less the time spent in the phases run within it unless
+    total is true
+    >>> with activate(Profile()) as profile:
+    ...     with phase('total', total=True), phase('render'):
+    ...         with phase('parse'):
+    ...             time.sleep(0.01)
+    >>> profile.seconds['render'] < 0.01 <= profile.seconds['parse']
+    True
+    >>> profile.seconds['total'] >= 0.01
+    True
+    """
+    if _active is None:
+        yield
+        return
+    profile = _active
+    start = time.perf_counter()
+    if total:
+        try:
+            yield
+        finally:
+            profile.add_time(name, time.perf_counter() - start)
+        return
+    _nested.append(0.0)
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        profile.add_time(name, seconds - _nested.pop())
+        if _nested:
+            _nested[-1] += seconds
+
+
+def add_time(name, seconds):
+    """
+    Adds seconds, measured by the caller, to the phase called name of the
+    active profile, as a phase run within the current one
+    """
+    if _active is not None:
+        _active.add_time(name, seconds)
+        if _nested:
+            _nested[-1] += seconds
+
+
+def count(counter, n=1):
+    """
+    Adds n to the counter of the active profile
+    """
+    if _active is not None:
+        _active.count(counter, n)
@@ -0,0 +1,113 @@
+"""
+Reads the per test case results and benchmark statistics printed by
+suites generated with a report format, and the guard page faults printed
+by suites generated with a guard, see ccodegen.Options
+"""
+
+from collections import namedtuple
+import json
+import re
+
+
+class CaseResult(namedtuple('CaseResult', ('header', 'function', 'case',
+                                           'passed', 'ns'))):
+    """
+    The verdict and duration in nanoseconds of a single test case
+    """
+    __slots__ = ()
+
+
+class BenchmarkResult(namedtuple('BenchmarkResult', (
+        'header', 'function', 'input', 'iterations', 'min_ns', 'median_ns',
+        'p99_ns'))):
+    """
+    The statistics of benchmarking a function with one of its inputs, in
+    nanoseconds per call
+    """
+    __slots__ = ()
+
+
+class GuardFault(namedtuple('GuardFault', ('header', 'function', 'case',
+                                           'argument', 'overrun'))):
+    """
+    An access of a test case past the end of the buffer of one of its
+    arguments, an overrun, or before its start, which killed the suite
+    """
+    __slots__ = ()
+
+
+_TAP_LINE = re.compile(
+    r'(not )?ok \d+ - (\S+) (\S+) (\d+) # (\d+) ns')
+_TAP_BENCHMARK = re.compile(
+    r'# benchmark (\S+) (\S+) (\d+): (\d+) iterations, min ([\d.]+) ns, '
+    r'median ([\d.]+) ns, p99 ([\d.]+) ns')
+_GUARD_FAULT = re.compile(
+    r'# guard page hit: (\S+) (\S+) case (\d+) argument (\d+) '
+    r'(past the end|before the start)')
+
+
+def parse_line(line):
+    """
+    Returns the CaseResult, BenchmarkResult or GuardFault printed on line
+    in either report format, or None if line isn't a result
+    >>> parse_line('not ok 4 - compare.h compare 2 # 130 ns')
+    ... # doctest: +NORMALIZE_WHITESPACE
+    CaseResult(header='compare.h', function='compare', case=2,
+               passed=False, ns=130)
+    >>> parse_line('{"header": "compare.h", "function": "compare", '
+    ...            '"case": 2, "verdict": "pass", "ns": 95}')
+    ... # doctest: +NORMALIZE_WHITESPACE
+    CaseResult(header='compare.h', function='compare', case=2,
+               passed=True, ns=95)
+    >>> parse_line('# benchmark compare.h compare 0: 100 iterations, '
+    ...            'min 3.0 ns, median 3.5 ns, p99 9.0 ns')
+    ... # doctest: +NORMALIZE_WHITESPACE
+    BenchmarkResult(header='compare.h', function='compare', input=0,
+                    iterations=100, min_ns=3.0, median_ns=3.5, p99_ns=9.0)
+    >>> parse_line('# guard page hit: compare.h compare case 3 argument 1 '
+    ...            'past the end')
+    ... # doctest: +NORMALIZE_WHITESPACE
+    GuardFault(header='compare.h', function='compare', case=3, argument=1,
+               overrun=True)
+    >>> parse_line('1..4') is None
+    True
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            result = json.loads(line)
+            if 'benchmark' in result:
+                return BenchmarkResult(
+                    result['header'], result['function'],
+                    result['benchmark'], result['iterations'],
+                    result['min_ns'], result['median_ns'], result['p99_ns'])
+            return CaseResult(result['header'], result['function'],
+                              result['case'], result['verdict'] == 'pass',
+                              result['ns'])
+        except (ValueError, KeyError, TypeError):
+            return None
+    match = _TAP_LINE.fullmatch(line)
+    if match is not None:
+        failed, header, function, case, ns = match.groups()
+        return CaseResult(header, function, int(case), failed is None,
+                          int(ns))
+    match = _TAP_BENCHMARK.fullmatch(line)
+    if match is not None:
+        header, function, input, iterations, *stats = match.groups()
+        return BenchmarkResult(header, function, int(input), int(iterations),
+                               *map(float, stats))
+    match = _GUARD_FAULT.fullmatch(line)
+    if match is not None:
+        header, function, case, argument, where = match.groups()
+        return GuardFault(header, function, int(case), int(argument),
+                          where == 'past the end')
+    return None
+
+
+def parse(lines):
+    """
+    Returns the CaseResults, BenchmarkResults and GuardFaults in lines,
+    skipping anything else the suites printed
+    """
+    return [result for result in map(parse_line, lines)
+            if result is not None]
@@ -0,0 +1,536 @@
+"""
+Builds and runs the test suites of many YAML files in parallel.
+
+Every header suite is generated into its own directory under the build
+directory, together with a main.c calling only that suite, then compiled
+with the sources listed in the header entry of its spec:
+
+- header: compare.h
+  sources: [compare.c]
+  include: [.]
+
+Paths are relative to the spec and include defaults to the spec's
+directory. The wall time of every suite is kept in timings.json in the
+build directory, and later runs start the slowest suites first.
+
+Every source is compiled to its own object with a dependency file, and
+the files each object of a suite was built from are kept in
+dependencies.json, so that a run can be limited to the suites affected
+by the files changed since a git revision. The results of every run are
+added to results.sqlite, see store.
+
+A run can build every suite with a matrix of configurations, such as
+every optimization level with and without sanitizers. The suites are
+generated once, and every configuration builds its objects in its own
+directory of the suite's, in parallel with the others.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import chain, repeat
+import json
+import math
+import os
+from pathlib import Path
+import re
+import subprocess
+import time
+
+from . import (batch, ccodegen, results as results_, store, utils,
+               yamlreader)
+
+
+class Suite(namedtuple('Suite', ('name', 'header', 'build_dir', 'sources',
+                                 'include_dirs', 'spec', 'fixtures'),
+                       defaults=(None, ()))):
+    """
+    A generated header suite, everything needed to build it, the spec it
+    was generated from and the !file fixtures the spec embeds
+    """
+    __slots__ = ()
+
+
+class Configuration(namedtuple('Configuration', ('name', 'cc', 'cflags'))):
+    """
+    A compiler and the flags to build suites with
+    """
+    __slots__ = ()
+
+
+DEFAULT_CONFIGURATION = Configuration('default',
+                                      os.environ.get('CC', 'gcc'), ())
+SANITIZERS = 'address,undefined'
+
+
+def matrix(cc=DEFAULT_CONFIGURATION.cc, cflags=(), levels=('0', '2', '3'),
+           sanitizers=SANITIZERS):
+    """
+    Returns the Configurations building with cflags at every optimization
+    level in levels, without and then with sanitizers, the -fsanitize
+    argument, unless it is empty
+    >>> [c.name for c in matrix(levels=('0', '2'))]
+    ['O0', 'O0-sanitize', 'O2', 'O2-sanitize']
+    >>> matrix(levels=('s',), sanitizers='')
+    [Configuration(name='Os', cc='gcc', cflags=('-Os',))]
+    """
+    configurations = []
+    for level in levels:
+        flags = tuple(cflags) + ('-O' + level,)
+        configurations.append(Configuration('O' + level, cc, flags))
+        if sanitizers:
+            # A sanitizer finding makes the suite fail, not just print
+            configurations.append(Configuration(
+                'O{}-sanitize'.format(level), cc,
+                flags + ('-fsanitize=' + sanitizers,
+                         '-fno-sanitize-recover=all',
+                         '-fno-omit-frame-pointer')))
+    return configurations
+
+
+class SuiteResult(namedtuple('SuiteResult', ('suite', 'returncode',
+                                             'build_seconds', 'run_seconds',
+                                             'output', 'cases',
+                                             'benchmarks', 'faults',
+                                             'configuration'),
+                             defaults=((), (), (), DEFAULT_CONFIGURATION))):
+    """
+    The outcome of building a suite with configuration and running it.
+    returncode is None when the suite didn't build, and output then holds
+    the compiler's output. cases and benchmarks hold the
+    results.CaseResults and results.BenchmarkResults the suite reported,
+    if it was generated with a report format, and faults the
+    results.GuardFault that killed it, if it was generated with a guard.
+    """
+    __slots__ = ()
+
+    @property
+    def passed(self):
+        return self.returncode == 0
+
+    @property
+    def seconds(self):
+        return self.build_seconds + self.run_seconds
+
+    @property
+    def sanitizer_error(self):
+        """
+        Whether a sanitizer reported an error in the output of the suite
+        """
+        return (self.returncode is not None and
+                _SANITIZER_ERROR.search(self.output) is not None)
+
+    def describe(self):
+        """
+        Returns a line summarising the result
+        """
+        failed = sum(not case.passed for case in self.cases)
+        if self.returncode is None:
+            verdict = 'build failed'
+        elif self.returncode != 0 and self.sanitizer_error:
+            verdict = 'sanitizer error'
+        elif self.returncode > 0 and failed:
+            verdict = '{} of {} cases failed'.format(failed, len(self.cases))
+        elif self.returncode == 0 and self.cases:
+            verdict = 'ok, {} cases'.format(len(self.cases))
+        elif self.returncode == 0:
+            verdict = 'ok'
+        elif self.returncode < 0 and self.faults:
+            fault = self.faults[0]
+            verdict = '{} case {} accessed argument {} {}'.format(
+                fault.function, fault.case, fault.argument,
+                'past its end' if fault.overrun else 'before its start')
+        elif self.returncode < 0:
+            verdict = 'killed by signal {}'.format(-self.returncode)
+        else:
+            verdict = 'failed test {}'.format(self.returncode)
+        header = self.suite.header
+        if self.configuration.name != DEFAULT_CONFIGURATION.name:
+            header += ' [{}]'.format(self.configuration.name)
+        return '{}: {} ({:.2f}s build, {:.2f}s run)'.format(
+            header, verdict, self.build_seconds, self.run_seconds)
+
+
+_SANITIZER_ERROR = re.compile(r'ERROR: \w+Sanitizer|: runtime error: ')
+
+
+class History:
+    """
+    The wall times of the suites in earlier runs
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.times = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.times = {}
+
+    def schedule(self, suites):
+        """
+        Returns suites ordered longest first, starting with the suites
+        that have never run
+        """
+        return sorted(suites,
+                      key=lambda suite: -self.times.get(suite.name, math.inf))
+
+    def record(self, results):
+        """
+        Stores the time of every suite of results, the sum over the
+        configurations it was built with
+        """
+        times = {}
+        for result in results:
+            times[result.suite.name] = (times.get(result.suite.name, 0) +
+                                        result.seconds)
+        self.times.update(times)
+
+    def save(self):
+        self.path.write_text(json.dumps(self.times, indent=2,
+                                        sort_keys=True))
+
+
+class Dependencies:
+    """
+    The files every object of the suites was built from in their last
+    build, as listed by the compiler's dependency files
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.files = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            self.files = {}
+
+    def record(self, suite, configuration=DEFAULT_CONFIGURATION):
+        """
+        Reads the dependency files of the last build of suite
+        """
+        objects = {}
+        for depfile in sorted(object_dir(suite, configuration).glob('*.d')):
+            objects[depfile.stem] = sorted(
+                str(path) for path in read_depfile(depfile))
+        if suite.spec is not None:
+            # The assembler reads !file fixtures in, so the compiler's
+            # dependency files don't list them
+            objects['spec'] = sorted(
+                [str(Path(suite.spec).resolve())] +
+                [str(Path(fixture).resolve()) for fixture in suite.fixtures])
+        self.files[suite.name] = objects
+
+    def affected(self, suite, changed):
+        """
+        Returns whether any file suite was built from is in changed, a set
+        of resolved paths, or if suite hasn't been built yet
+        """
+        if suite.name not in self.files:
+            return True
+        return any(Path(path) in changed
+                   for paths in self.files[suite.name].values()
+                   for path in paths)
+
+    def save(self):
+        self.path.write_text(json.dumps(self.files, indent=2,
+                                        sort_keys=True))
+
+
+def read_depfile(path):
+    """
+    Returns the resolved paths of the prerequisites in a make dependency
+    file written by the compiler
+    """
+    text = Path(path).read_text().replace('\\\n', ' ')
+    _, _, prerequisites = text.partition(': ')
+    return [Path(name.replace('\\ ', ' ')).resolve()
+            for name in re.split(r'(?<!\\)\s+', prerequisites) if name]
+
+
+def changed_files(revision):
+    """
+    Returns the resolved paths of the files of the git repository in the
+    current directory that differ from revision, including uncommitted
+    changes
+    """
+    try:
+        top = subprocess.run(
+            ['git', 'rev-parse', '--show-toplevel'], check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True).stdout.strip()
+        names = subprocess.run(
+            ['git', 'diff', '--name-only', revision, '--'], check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            universal_newlines=True).stdout.splitlines()
+    except subprocess.CalledProcessError as error:
+        raise ValueError('cannot diff against {}: {}'.format(
+            revision, error.stderr.strip()))
+    return {(Path(top) / name).resolve() for name in names}
+
+
+def prepare(spec, build_root, split=False, options=ccodegen.Options()):
+    """
+    Generates the suite for spec in its own directory of build_root,
+    returning the Suite
+    """
+    with Path(spec).open('r') as f:
+        return prepare_tree(spec, yamlreader.iter_parse(f), build_root,
+                            split, options)
+
+
+def prepare_tree(spec, parsetree, build_root, split=False,
+                 options=ccodegen.Options()):
+    """
+    Generates the suite for spec like prepare, from its parse tree, which
+    may be an iterator over its items
+    """
+    spec = Path(spec)
+    items = iter(parsetree)
+    metadata = next(items)
+    name = utils.header_to_function_name(metadata['header'])
+    build_dir = Path(build_root) / name
+    gen_dir = build_dir / 'gen'
+    gen_dir.mkdir(parents=True, exist_ok=True)
+    fixtures = set()
+    sources = batch.generate_tree(
+        _finding_files(chain([metadata], items), fixtures), gen_dir, split,
+        options)
+    ccodegen.generate_main([metadata['header']], gen_dir, options)
+    return Suite(
+        name, metadata['header'], build_dir,
+        [gen_dir / 'main.c'] + sources +
+        [spec.parent / source for source in metadata.get('sources', [])],
+        [gen_dir] + [spec.parent / include
+                     for include in metadata.get('include', ['.'])],
+        spec, sorted(file.path for file in fixtures))
+
+
+def _finding_files(items, files):
+    """
+    Yields items, adding the yamlreader.Files they use to the set files
+    """
+    for item in items:
+        files.update(yamlreader.find_files(item))
+        yield item
+
+
+def object_dir(suite, configuration=DEFAULT_CONFIGURATION):
+    """
+    Returns the directory holding the objects and dependency files of
+    suite built with configuration
+    """
+    return suite.build_dir / configuration.name
+
+
+def build(suite, configuration=DEFAULT_CONFIGURATION):
+    """
+    Compiles every source of suite to an object, writing its dependency
+    file alongside, and links them, returning the path of the binary.
+    Raises subprocess.CalledProcessError with the compiler's output if the
+    build fails.
+    """
+    objects = object_dir(suite, configuration)
+    objects.mkdir(parents=True, exist_ok=True)
+    for stale in objects.glob('*.d'):
+        stale.unlink()
+    flags = [configuration.cc] + list(configuration.cflags)
+    for include in suite.include_dirs:
+        flags += ['-I', str(include)]
+    object_files = []
+    for index, source in enumerate(suite.sources):
+        object_file = objects / '{}_{}.o'.format(index, Path(source).stem)
+        _compile(flags + ['-MMD', '-MF', str(object_file.with_suffix('.d')),
+                          '-c', '-o', str(object_file), str(source)])
+        object_files.append(object_file)
+    binary = suite.build_dir / '{}.out'.format(configuration.name)
+    _compile([configuration.cc] + list(configuration.cflags) +
+             ['-o', str(binary)] + list(map(str, object_files)))
+    return binary
+
+
+def _compile(command):
+    subprocess.run(command, check=True, stdout=subprocess.PIPE,
+                   stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+def build_and_run(suite, configuration=DEFAULT_CONFIGURATION, timeout=None):
+    """
+    Builds and runs suite, returning a SuiteResult
+    """
+    start = time.perf_counter()
+    try:
+        binary = build(suite, configuration)
+    except subprocess.CalledProcessError as error:
+        return SuiteResult(suite, None, time.perf_counter() - start, 0.0,
+                           error.output, configuration=configuration)
+    built = time.perf_counter()
+    try:
+        process = subprocess.run([str(binary)], stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT,
+                                 universal_newlines=True, timeout=timeout)
+        returncode, output = process.returncode, process.stdout
+    except subprocess.TimeoutExpired as error:
+        # The output of an expired process isn't decoded
+        returncode = -9
+        output = (error.output or b'').decode(errors='replace')
+    reported = results_.parse(output.splitlines())
+    return SuiteResult(
+        suite, returncode, built - start, time.perf_counter() - built,
+        output,
+        tuple(r for r in reported if isinstance(r, results_.CaseResult)),
+        tuple(r for r in reported if isinstance(r, results_.BenchmarkResult)),
+        tuple(r for r in reported if isinstance(r, results_.GuardFault)),
+        configuration)
+
+
+def run(paths, build_root, jobs=None, split=False,
+        options=ccodegen.Options(), configuration=DEFAULT_CONFIGURATION,
+        timeout=None, changed_since=None, configurations=None):
+    """
+    Generates, builds and runs the suites for every YAML file in paths on
+    a pool of jobs workers, returning the SuiteResults in the order the
+    suites were started. If changed_since is a git revision, only the
+    suites built from files changed since then, or never built, are built
+    and run. If configurations is given, every suite is built and run
+    with each of them, see matrix, instead of with configuration.
+    """
+    configurations = list(configurations or [configuration])
+    specs = list(batch.find_specs(paths))
+    # Suites of the same header would share their build directory
+    batch.check_headers(specs)
+    build_root = Path(build_root)
+    build_root.mkdir(parents=True, exist_ok=True)
+    if jobs == 1 or len(specs) == 1:
+        suites = [prepare(spec, build_root, split, options)
+                  for spec in specs]
+    else:
+        with ProcessPoolExecutor(jobs) as pool:
+            suites = list(pool.map(prepare, specs, repeat(build_root),
+                                   repeat(split), repeat(options)))
+
+    dependencies = Dependencies(build_root / 'dependencies.json')
+    if changed_since is not None:
+        changed = changed_files(changed_since)
+        suites = [suite for suite in suites
+                  if dependencies.affected(suite, changed)]
+
+    history = History(build_root / 'timings.json')
+    with ThreadPoolExecutor(jobs or os.cpu_count()) as pool:
+        builds = [pool.submit(build_and_run, suite, configuration, timeout)
+                  for suite in history.schedule(suites)
+                  for configuration in configurations]
+        results = [build.result() for build in builds]
+    history.record(results)
+    history.save()
+    for result in results:
+        if result.returncode is not None:
+            dependencies.record(result.suite, result.configuration)
+    dependencies.save()
+    revision = store.revision()
+    with store.Store(build_root / 'results.sqlite') as results_store:
+        for configuration in configurations:
+            results_store.record(
+                [result for result in results
+                 if result.configuration == configuration],
+                configuration, revision)
+    return results
+
+
+def grid(results):
+    """
+    Returns the lines of a table of the verdicts of results, SuiteResults
+    of a run with several configurations: a column for every
+    configuration, and a row for every suite followed by a row for every
+    case it reported. A case that didn't run in a configuration is -.
+    """
+    columns = []
+    suites = {}
+    for result in results:
+        name = result.configuration.name
+        if name not in columns:
+            columns.append(name)
+        rows = suites.setdefault(result.suite.header, {None: {}})
+        rows[None][name] = _verdict(result)
+        for case in result.cases:
+            rows.setdefault((case.function, case.case), {})[name] = (
+                'ok' if case.passed else 'FAIL')
+    table = [[''] + columns]
+    for header, rows in suites.items():
+        for key, cells in rows.items():
+            table.append([header if key is None else '  {} {}'.format(*key)]
+                         + [cells.get(name, '-') for name in columns])
+    widths = [max(map(len, column)) for column in zip(*table)]
+    return ['  '.join(cell.ljust(width)
+                      for cell, width in zip(row, widths)).rstrip()
+            for row in table]
+
+
+def _verdict(result):
+    if result.returncode is None:
+        return 'build failed'
+    if result.passed:
+        return 'ok'
+    if result.sanitizer_error:
+        return 'sanitizer'
+    if result.faults:
+        return 'guard page'
+    if result.returncode < 0:
+        return 'signal {}'.format(-result.returncode)
+    return 'failed'
+
+
+def main(args):
+    """
+    Entry point of ostester run, returning the exit status
+    """
+    configuration = DEFAULT_CONFIGURATION._replace(
+        cc=args.cc, cflags=tuple(args.cflags))
+    options = ccodegen.Options(table=args.table, report=args.report,
+                               guard=args.guard)
+    configurations = None
+    if args.matrix:
+        configurations = matrix(args.cc, args.cflags, args.levels,
+                                args.sanitize)
+        # The grid needs the verdict of every case
+        options = options._replace(report=options.report or 'tap')
+    if args.watch:
+        from . import watch
+        watch.RunWatcher(args.yaml_files, args.build_dir, args.split,
+                         options, configuration,
+                         args.timeout).watch(args.interval)
+        return 0
+    results = run(args.yaml_files, args.build_dir, jobs=args.jobs,
+                  split=args.split, options=options,
+                  configuration=configuration, timeout=args.timeout,
+                  changed_since=args.changed_since,
+                  configurations=configurations)
+    if args.changed_since is not None and not results:
+        print('no suites affected by changes since {}'.format(
+            args.changed_since))
+    if configurations is not None:
+        for line in grid(results):
+            print(line)
+        for result in results:
+            if not result.passed:
+                print(result.describe())
+                if result.returncode is None:
+                    print(result.output)
+                elif result.sanitizer_error:
+                    # The first line of each report says what went wrong
+                    for line in result.output.splitlines():
+                        if _SANITIZER_ERROR.search(line):
+                            print('    ' + line.strip())
+        return 0 if all(result.passed for result in results) else 1
+    for result in results:
+        print(result.describe())
+        if result.returncode is None:
+            print(result.output)
+        for case in result.cases:
+            if not case.passed:
+                print('    {} case {} failed'.format(case.function,
+                                                     case.case))
+        for benchmark in result.benchmarks:
+            print('    {} input {}: min {:.1f} ns, median {:.1f} ns, '
+                  'p99 {:.1f} ns'.format(benchmark.function, benchmark.input,
+                                         benchmark.min_ns,
+                                         benchmark.median_ns,
+                                         benchmark.p99_ns))
+    return 0 if all(result.passed for result in results) else 1
@@ -0,0 +1,154 @@
+"""
+A long-lived generation server, for build systems running testgen once
+per spec.
+
+The server listens on a Unix socket for the requests of the client, see
+client, each holding the arguments of a testgen run and the directory it
+was made from, and answers with the exit status and output. It keeps the
+Jinja environment, the compiled templates and the parse trees of the
+specs between requests, so a request only costs the work on the specs
+that changed. Requests are served one at a time: generation is CPU
+bound, so threads wouldn't run them any faster.
+"""
+
+from contextlib import redirect_stderr, redirect_stdout
+import io
+import logging
+import os
+from pathlib import Path
+import socket
+import socketserver
+
+from . import arguments, batch, ccodegen, client, yamlreader
+
+
+class Generator:
+    """
+    Generates suites like batch.generate in this process, keeping the
+    parse tree of every spec until the spec changes
+    """
+
+    def __init__(self):
+        self.trees = {}
+        self.parses = 0
+
+    def parse(self, spec):
+        """
+        Returns the parse tree of spec, parsing it only if it changed
+        since the last call
+        """
+        stat = spec.stat()
+        key = stat.st_mtime_ns, stat.st_size
+        cached = self.trees.get(spec)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        with spec.open('r') as f:
+            tree = yamlreader.parse(f)
+        self.parses += 1
+        self.trees[spec] = key, tree
+        return tree
+
+    def generate(self, paths, gen_dir, split=False,
+                 options=ccodegen.Options()):
+        """
+        Generates a header suite for every YAML file in paths, and their
+        main.c, returning the tested headers
+        """
+        specs = [spec.resolve() for spec in batch.find_specs(paths)]
+        if not specs:
+            raise ValueError('no YAML files found in: {}'.format(
+                ', '.join(map(str, paths))))
+        headers = []
+        for spec in specs:
+            tree = self.parse(spec)
+            batch.generate_tree(tree, gen_dir, split, options)
+            headers.append(tree[0]['header'])
+        batch.generate_main(headers, gen_dir, options)
+        return headers
+
+    def run(self, argv, cwd):
+        """
+        Runs testgen with the arguments argv, relative to the directory
+        cwd, returning the exit status and what it printed
+        """
+        output = io.StringIO()
+        with redirect_stdout(output), redirect_stderr(output):
+            try:
+                parser = arguments.parser()
+                parser.prog = 'testgen'
+                namespace = parser.parse_args(argv)
+                if (namespace.watch or namespace.profile
+                        or namespace.profile_output):
+                    print('testgen: error: --watch and --profile are not '
+                          'supported by the server')
+                    return 2, output.getvalue()
+                self.generate(
+                    [Path(cwd, path) for path in namespace.yaml_files],
+                    Path(cwd, namespace.output_dir), namespace.split,
+                    ccodegen.Options(table=namespace.table,
+                                     report=namespace.report,
+                                     guard=namespace.guard))
+            except SystemExit as exit:
+                return exit.code or 0, output.getvalue()
+            except batch.spec_errors() as error:
+                print('testgen: error: {}'.format(error))
+                return 1, output.getvalue()
+        return 0, output.getvalue()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        cwd, *argv = client.decode(self.rfile.read())
+        status, output = self.server.generator.run(argv, cwd)
+        self.wfile.write('{}\n{}'.format(status, output).encode())
+
+
+class Server(socketserver.UnixStreamServer):
+    """
+    Serves the requests of clients on the Unix socket at path with a
+    Generator
+    """
+
+    def __init__(self, path):
+        self.generator = Generator()
+        super().__init__(str(path), _Handler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+def warm_up():
+    """
+    Creates the Jinja environment and compiles every template
+    """
+    env = ccodegen.get_env()
+    for name in os.listdir(ccodegen.TEMPLATE_DIR):
+        env.get_template(name)
+
+
+def main(args):
+    """
+    Entry point of ostester serve, returning the exit status
+    """
+    path = args.socket or client.default_socket()
+    if os.path.exists(path):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(path)
+            except OSError:
+                os.unlink(path)
+            else:
+                print('a server is already listening on {}'.format(path))
+                return 1
+    warm_up()
+    with Server(path) as server:
+        logging.getLogger('tests').info('serving on %s', path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    return 0
@@ -0,0 +1,252 @@
+"""
+Keeps the results of every ostester run in an SQLite database in the
+build directory, and finds the test cases and benchmarks that got slower
+or flaky across runs, for ostester report.
+
+Every run is recorded with the git revision it was run at and the
+compiler and flags it was built with, and every suite with a hash of its
+spec. Runs are only compared with runs built the same way, and cases
+only with the same cases of the same spec.
+"""
+
+from collections import namedtuple
+import hashlib
+import math
+from pathlib import Path
+import sqlite3
+import statistics
+import subprocess
+import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, started REAL, revision TEXT, cc TEXT,
+    cflags TEXT);
+CREATE TABLE IF NOT EXISTS suites (
+    run INTEGER, suite TEXT, header TEXT, spec_hash TEXT,
+    returncode INTEGER, build_seconds REAL, run_seconds REAL);
+CREATE TABLE IF NOT EXISTS cases (
+    run INTEGER, suite TEXT, function TEXT, number INTEGER,
+    passed INTEGER, ns INTEGER);
+CREATE TABLE IF NOT EXISTS benchmarks (
+    run INTEGER, suite TEXT, function TEXT, input INTEGER,
+    iterations INTEGER, min_ns REAL, median_ns REAL, p99_ns REAL);
+CREATE INDEX IF NOT EXISTS cases_run ON cases (run);
+CREATE INDEX IF NOT EXISTS benchmarks_run ON benchmarks (run);
+'''
+
+
+class Finding(namedtuple('Finding', ('kind', 'header', 'function',
+                                     'subject', 'detail'))):
+    """
+    A case or benchmark input, the subject, of a function that became
+    slower or is flaky, the kind
+    """
+    __slots__ = ()
+
+    def describe(self):
+        return '{}: {} {} {}: {}'.format(self.kind, self.header,
+                                         self.function, self.subject,
+                                         self.detail)
+
+
+def revision():
+    """
+    Returns the git revision of the current directory, suffixed with
+    -dirty if it has uncommitted changes, or None outside a repository
+    """
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty', '--abbrev=40'],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spec_hash(spec):
+    """
+    Returns the SHA-256 of the spec file, or None if there is none
+    """
+    if spec is None:
+        return None
+    try:
+        return hashlib.sha256(Path(spec).read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+class Store:
+    """
+    The results of the runs recorded in the database at path
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(str(path))
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def record(self, results, configuration, revision=None, started=None):
+        """
+        Stores the runner.SuiteResults of a run of suites built with
+        configuration, returning the id of the run
+        """
+        with self.connection:
+            run = self.connection.execute(
+                'INSERT INTO runs (started, revision, cc, cflags) '
+                'VALUES (?, ?, ?, ?)',
+                (time.time() if started is None else started, revision,
+                 configuration.cc, ' '.join(configuration.cflags))
+            ).lastrowid
+            for result in results:
+                suite = result.suite
+                self.connection.execute(
+                    'INSERT INTO suites VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (run, suite.name, suite.header, spec_hash(suite.spec),
+                     result.returncode, result.build_seconds,
+                     result.run_seconds))
+                self.connection.executemany(
+                    'INSERT INTO cases VALUES (?, ?, ?, ?, ?, ?)',
+                    [(run, suite.name, case.function, case.case,
+                      case.passed, case.ns) for case in result.cases])
+                self.connection.executemany(
+                    'INSERT INTO benchmarks VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(run, suite.name, benchmark.function, benchmark.input,
+                      benchmark.iterations, benchmark.min_ns,
+                      benchmark.median_ns, benchmark.p99_ns)
+                     for benchmark in result.benchmarks])
+        return run
+
+    def runs(self, count):
+        """
+        Returns the (id, revision) of the last count runs built like the
+        last run, newest first
+        """
+        last = self.connection.execute(
+            'SELECT cc, cflags FROM runs ORDER BY id DESC LIMIT 1').fetchone()
+        if last is None:
+            return []
+        return self.connection.execute(
+            'SELECT id, revision FROM runs WHERE cc = ? AND cflags = ? '
+            'ORDER BY id DESC LIMIT ?', last + (count,)).fetchall()
+
+    def samples(self, runs):
+        """
+        Yields a (run, key, passed, ns) row for every case of runs, and a
+        (run, key, None, median ns) row for every benchmark input, where
+        key tells the same case of the same spec apart from the others
+        """
+        marks = ', '.join('?' * len(runs))
+        yield from self.connection.execute(
+            'SELECT c.run, s.header, s.spec_hash, c.function, '
+            "'case ' || c.number, c.passed, c.ns FROM cases c JOIN suites s "
+            'ON s.run = c.run AND s.suite = c.suite '
+            'WHERE c.run IN ({})'.format(marks), runs)
+        yield from self.connection.execute(
+            'SELECT b.run, s.header, s.spec_hash, b.function, '
+            "'benchmark input ' || b.input, NULL, b.median_ns "
+            'FROM benchmarks b JOIN suites s '
+            'ON s.run = b.run AND s.suite = b.suite '
+            'WHERE b.run IN ({})'.format(marks), runs)
+
+
+def mann_whitney(baseline, recent):
+    """
+    Returns the p-value of the one-sided Mann-Whitney U test that recent
+    tends to be larger than baseline, using the normal approximation with
+    continuity and tie corrections
+    >>> round(mann_whitney([10, 11, 12, 13] * 5, [20, 21, 22]), 4)
+    0.003
+    >>> round(mann_whitney([10, 11, 12, 13] * 5, [11, 12, 13]), 2)
+    0.25
+    """
+    n1, n2 = len(recent), len(baseline)
+    n = n1 + n2
+    values = sorted([(value, True) for value in recent] +
+                    [(value, False) for value in baseline])
+    recent_ranks, ties, start = 0.0, 0, 0
+    while start < n:
+        end = start
+        while end < n and values[end][0] == values[start][0]:
+            end += 1
+        rank = (start + end + 1) / 2
+        recent_ranks += rank * sum(is_recent for _, is_recent
+                                   in values[start:end])
+        ties += (end - start) ** 3 - (end - start)
+        start = end
+    u = recent_ranks - n1 * (n1 + 1) / 2
+    variance = n1 * n2 / 12 * (n + 1 - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - n1 * n2 / 2 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
+
+
+def report(store, recent=3, window=20, alpha=0.01, slowdown=1.1):
+    """
+    Compares the last recent runs with the window runs before them,
+    returning the Findings: the cases and benchmark inputs whose time
+    grew by slowdown times or more with significance alpha, and the
+    cases that both passed and failed at the same clean revision
+    """
+    runs = store.runs(recent + window)
+    recent_runs = {run for run, _ in runs[:recent]}
+    revisions = dict(runs)
+    series = {}
+    for run, *key, passed, ns in store.samples([run for run, _ in runs]):
+        series.setdefault(tuple(key), []).append((run, passed, ns))
+
+    findings = []
+    for (header, _, function, subject), samples in series.items():
+        new = [ns for run, _, ns in samples if run in recent_runs]
+        old = [ns for run, _, ns in samples if run not in recent_runs]
+        if new and len(old) >= 2:
+            before, after = statistics.median(old), statistics.median(new)
+            p = mann_whitney(old, new)
+            if p < alpha and after >= slowdown * before:
+                findings.append(Finding(
+                    'slower', header, function, subject,
+                    'median {:.0f} ns -> {:.0f} ns ({:.2f}x, p={:.4f})'.format(
+                        before, after, after / (before or 1), p)))
+        verdicts = {}
+        for run, passed, _ in samples:
+            revision = revisions[run]
+            if (passed is not None and revision is not None and
+                    not revision.endswith('-dirty')):
+                verdicts.setdefault(revision, []).append(bool(passed))
+        for revision, passes in sorted(verdicts.items()):
+            if len(set(passes)) > 1:
+                findings.append(Finding(
+                    'flaky', header, function, subject,
+                    '{} passed, {} failed at {}'.format(
+                        passes.count(True), passes.count(False),
+                        revision[:12])))
+    return findings
+
+
+def main(args):
+    """
+    Entry point of ostester report, returning the exit status: 1 if any
+    case got slower or is flaky
+    """
+    path = Path(args.build_dir) / 'results.sqlite'
+    if not path.exists():
+        print('no results recorded in {}'.format(args.build_dir))
+        return 0
+    with Store(path) as store:
+        findings = report(store, args.recent, args.window, args.alpha,
+                          args.slowdown)
+    for finding in findings:
+        print(finding.describe())
+    if not findings:
+        print('no regressions or flaky cases')
+    return 1 if findings else 0
@@ -0,0 +1,77 @@
+"""
+Generates synthetic specs, used to benchmark the generator
+"""
+
+
+COMPARISONS = ('equals', 'less_than', 'greater_than')
+
+
+def spec(functions=10, cases=100, arguments=2, pointer_depth=1,
+         zeroed_size=0, header='synthetic.h'):
+    """
+    Returns the text of a spec for header with the given number of
+    functions, each with cases test cases. Every function takes an int
+    followed by arguments - 1 arguments of type char with pointer_depth
+    stars. Pointer arguments cycle through inline lists, !decl'd data and,
+    if zeroed_size isn't 0, !zeroed regions of that size; deeper pointers
+    point at chains of !ptr data.
+    >>> print(spec(functions=1, cases=1, arguments=2, pointer_depth=2))
+    - header: synthetic.h
+    <BLANKLINE>
+    - function: f0
+      type: int, char** -> int
+      tests:
+        - data:
+            c0_a1_0: [a, b, '0']
+          args: [0, !ptr c0_a1_0]
+          equals: 0
+    <BLANKLINE>
+    """
+    if arguments < 1 or pointer_depth < 0 or zeroed_size < 0:
+        raise ValueError('invalid synthetic spec parameters')
+    argument_types = ['int'] + ['char' + '*' * pointer_depth] * (arguments-1)
+    lines = ['- header: {}'.format(header), '']
+    for function in range(functions):
+        lines += ['- function: f{}'.format(function),
+                  '  type: {} -> int'.format(', '.join(argument_types)),
+                  '  tests:']
+        for case in range(cases):
+            data, args = [], [str(case)]
+            for argument in range(1, arguments):
+                args.append(_argument(case, argument, pointer_depth,
+                                      zeroed_size, data))
+            if data:
+                lines.append('    - data:')
+                lines += ['        {}: {}'.format(name, value)
+                          for name, value in data]
+                lines.append('      args: [{}]'.format(', '.join(args)))
+            else:
+                lines.append('    - args: [{}]'.format(', '.join(args)))
+            lines.append('      {}: {}'.format(
+                COMPARISONS[case % len(COMPARISONS)], case))
+    return '\n'.join(lines) + '\n'
+
+
+def _argument(case, argument, pointer_depth, zeroed_size, data):
+    """
+    Returns the text of one char argument of a test case, appending the
+    (name, value) pairs it needs to data
+    """
+    if pointer_depth == 0:
+        return chr(ord('a') + (case + argument) % 26)
+    variant = (case + argument) % 3
+    if variant == 1 and zeroed_size:
+        value = '!zeroed {}'.format(zeroed_size)
+    else:
+        value = "[a, b, '{}']".format(case % 10)
+    name = 'c{}_a{}'.format(case, argument)
+    if pointer_depth == 1:
+        if variant == 2:
+            data.append((name, value))
+            return '!decl ' + name
+        return value
+    data.append(('{}_0'.format(name), value))
+    for level in range(1, pointer_depth - 1):
+        data.append(('{}_{}'.format(name, level),
+                     '!ptr {}_{}'.format(name, level - 1)))
+    return '!ptr {}_{}'.format(name, pointer_depth - 2)
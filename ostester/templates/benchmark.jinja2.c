@@ -0,0 +1,32 @@
+{% macro benchmark(fn) %}
+{% set bench = fn.benchmark %}
+uint32_t {{ fn.name|function_benchmark_name }}(void)
+{
+    static uint64_t samples[{{ bench.iterations }}];
+    {% for input in bench.inputs %}
+    {
+        {% for declaration in input.declarations %}
+        {{ data_pool.initialize(declaration) }};
+        {% endfor %}
+        {{ fn.type.output.declare(input.result) }};
+        for (uint32_t i = 0; i < {{ bench.warmup }}; i++)
+        {
+            {{ input.result }} = {{ fn.name }}({{ input.arguments|map(attribute='name')|join(', ') }});
+            OSTESTER_BARRIER({{ input.result }});
+        }
+        for (uint32_t i = 0; i < {{ bench.iterations }}; i++)
+        {
+            uint64_t start = ostester_now_ns();
+            for (uint32_t j = 0; j < {{ bench.batch }}; j++)
+            {
+                {{ input.result }} = {{ fn.name }}({{ input.arguments|map(attribute='name')|join(', ') }});
+                OSTESTER_BARRIER({{ input.result }});
+            }
+            samples[i] = ostester_now_ns() - start;
+        }
+        ostester_benchmark_{{ options.report }}("{{ test_header_name }}", "{{ fn.name }}", {{ loop.index0 }}, samples, {{ bench.iterations }}, {{ bench.batch }});
+    }
+    {% endfor %}
+    return 0;
+}
+{% endmacro %}
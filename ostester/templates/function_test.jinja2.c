@@ -0,0 +1,34 @@
+{% from 'test_case.jinja2.c' import test_case with context %}
+{% from 'table_test_case.jinja2.c' import table_test_case with context %}
+{% from 'benchmark.jinja2.c' import benchmark with context %}
+{% if options.report or options.guard %}
+#include "ostester_runtime.h"
+{% endif %}
+#include <stdint.h>
+#include <string.h>
+#include "{{ test_header_name }}"
+
+{% for definition in data_pool.add_function(function, options.report, options.guard) %}
+{{ definition }}
+{% if loop.last %}
+
+{% endif %}
+{% endfor %}
+uint32_t {{ function.name|function_test_case_name }}(void)
+{
+    {% if options.report %}
+    uint32_t failures = 0;
+    {% endif %}
+    {% if options.table and function is table_eligible %}
+    {{ table_test_case(function) }}
+    {% else %}
+    {% for test in function.test_cases %}
+    {{ test_case(function, test) }}
+    {% endfor %}
+    {% endif %}
+    return {{ 'failures' if options.report else 0 }};
+}
+{% if options.report and function.benchmark %}
+
+{{ benchmark(function) }}
+{% endif %}
@@ -1,18 +1,45 @@
-{% from 'test_case.jinja2.c' import test_case %}
+{% from 'test_case.jinja2.c' import test_case with context %}
+{% from 'table_test_case.jinja2.c' import table_test_case with context %}
 {% from 'suite.jinja2.c' import suite %}
+{% from 'benchmark.jinja2.c' import benchmark with context %}
+{% if options.report or options.guard %}
+#include "ostester_runtime.h"
+{% endif %}
 #include <stdint.h>
+#include <string.h>
 #include "{{ header_suite_header_name }}"
 #include "{{ test_header_name }}"
 
+{# functions may be an iterator, so it is only walked once #}
+{% set names = namespace(tests=[], benchmarks=[]) %}
 {% for function in functions %}
+{% set names.tests = names.tests + [function.name|function_test_case_name] %}
+{% for definition in data_pool.add_function(function, options.report, options.guard) %}
+{{ definition }}
+{% if loop.last %}
+
+{% endif %}
+{% endfor %}
 uint32_t {{ function.name|function_test_case_name }}()
 {
+    {% if options.report %}
+    uint32_t failures = 0;
+    {% endif %}
+    {% if options.table and function is table_eligible %}
+    {{ table_test_case(function) }}
+    {% else %}
     {% for test in function.test_cases %}
     {{ test_case(function, test) }}
     {% endfor %}
-    return 0;
+    {% endif %}
+    return {{ 'failures' if options.report else 0 }};
 }
+{% if options.report and function.benchmark %}
+{% set names.benchmarks = names.benchmarks + [function.name|function_benchmark_name] %}
+
+{{ benchmark(function) }}
+{% endif %}
 {% endfor %}
 
 {{ suite(test_header_name|header_to_function_name,
-         functions|map(attribute='name')|map('function_test_case_name')) }}
+         names.tests + names.benchmarks, options.report) }}
@@ -1,7 +1,27 @@
 {% from 'suite.jinja2.c' import suite %}
+{% if options.report or options.guard %}
+#include "ostester_runtime.h"
+{% endif %}
 #include <stdint.h>
 {% for test_header in test_headers %}
 #include "{{ 'test_' + test_header }}"
 {% endfor %}
+{% if options.guard %}
 
+struct ostester_guard_state ostester_guard;
+{% endif %}
+
+{% if options.report %}
+uint32_t ostester_cases_reported = 0;
+
+{{ suite('ostester_all_suites', test_headers|map('header_to_function_name'), True) }}
+
+uint32_t test_main(void)
+{
+    uint32_t failures = ostester_all_suites();
+    ostester_report_end_{{ options.report }}();
+    return failures != 0;
+}
+{% else %}
 {{ suite('test_main', test_headers|map('header_to_function_name')) }}
+{% endif %}
@@ -0,0 +1,303 @@
+#ifndef OSTESTER_RUNTIME_H
+#define OSTESTER_RUNTIME_H
+
+#ifndef _POSIX_C_SOURCE
+#define _POSIX_C_SOURCE 200809L
+#endif
+/* For MAP_ANONYMOUS */
+#ifndef _DEFAULT_SOURCE
+#define _DEFAULT_SOURCE
+#endif
+#include <signal.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <time.h>
+#include <unistd.h>
+
+/* Defined in the generated main.c when the suites report their results */
+extern uint32_t ostester_cases_reported;
+
+/* Keeps the compiler from optimizing away the computation of value */
+#if defined(__GNUC__)
+#define OSTESTER_BARRIER(value) __asm__ __volatile__("" : : "g"(value) : "memory")
+#else
+#define OSTESTER_BARRIER(value) ((void)(value))
+#endif
+
+static inline uint64_t ostester_now_ns(void)
+{
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (uint64_t)now.tv_sec * 1000000000u + (uint64_t)now.tv_nsec;
+}
+
+/* Each report function prints the result of one test case and returns 1
+   if it failed, 0 otherwise */
+static inline uint32_t ostester_report_tap(const char *header,
+                                           const char *function,
+                                           uint32_t number, int passed,
+                                           uint64_t ns)
+{
+    printf("%sok %lu - %s %s %lu # %llu ns\n", passed ? "" : "not ",
+           (unsigned long)++ostester_cases_reported, header, function,
+           (unsigned long)number, (unsigned long long)ns);
+    /* Keeps the lines of the cases run so far if a later one aborts */
+    fflush(stdout);
+    return !passed;
+}
+
+static inline uint32_t ostester_report_json(const char *header,
+                                            const char *function,
+                                            uint32_t number, int passed,
+                                            uint64_t ns)
+{
+    ++ostester_cases_reported;
+    printf("{\"header\": \"%s\", \"function\": \"%s\", \"case\": %lu, "
+           "\"verdict\": \"%s\", \"ns\": %llu}\n",
+           header, function, (unsigned long)number,
+           passed ? "pass" : "fail", (unsigned long long)ns);
+    fflush(stdout);
+    return !passed;
+}
+
+static int ostester_compare_samples(const void *a, const void *b)
+{
+    uint64_t x = *(const uint64_t *)a, y = *(const uint64_t *)b;
+    return (x > y) - (x < y);
+}
+
+/* Sorts the count samples, each timing batch calls, and stores the
+   minimum, median and 99th percentile time of a single call in stats */
+static inline void ostester_benchmark_stats(uint64_t *samples,
+                                            uint32_t count, uint32_t batch,
+                                            double stats[3])
+{
+    qsort(samples, count, sizeof *samples, ostester_compare_samples);
+    stats[0] = (double)samples[0] / batch;
+    stats[1] = (double)samples[count / 2] / batch;
+    stats[2] = (double)samples[(count * 99 + 99) / 100 - 1] / batch;
+}
+
+/* Each benchmark function prints the statistics of one benchmarked input
+   and returns 0 */
+static inline uint32_t ostester_benchmark_tap(const char *header,
+                                              const char *function,
+                                              uint32_t input,
+                                              uint64_t *samples,
+                                              uint32_t count, uint32_t batch)
+{
+    double stats[3];
+    ostester_benchmark_stats(samples, count, batch, stats);
+    printf("# benchmark %s %s %lu: %lu iterations, min %.1f ns, "
+           "median %.1f ns, p99 %.1f ns\n", header, function,
+           (unsigned long)input, (unsigned long)count,
+           stats[0], stats[1], stats[2]);
+    return 0;
+}
+
+static inline uint32_t ostester_benchmark_json(const char *header,
+                                               const char *function,
+                                               uint32_t input,
+                                               uint64_t *samples,
+                                               uint32_t count, uint32_t batch)
+{
+    double stats[3];
+    ostester_benchmark_stats(samples, count, batch, stats);
+    printf("{\"header\": \"%s\", \"function\": \"%s\", \"benchmark\": %lu, "
+           "\"iterations\": %lu, \"min_ns\": %.1f, \"median_ns\": %.1f, "
+           "\"p99_ns\": %.1f}\n", header, function, (unsigned long)input,
+           (unsigned long)count, stats[0], stats[1], stats[2]);
+    return 0;
+}
+
+static inline void ostester_report_end_tap(void)
+{
+    printf("1..%lu\n", (unsigned long)ostester_cases_reported);
+}
+
+static inline void ostester_report_end_json(void)
+{
+}
+
+/* With a guard (see ccodegen.Options) the buffer of every pointer argument
+   of a test case is mapped on its own, flush against a PROT_NONE page
+   after it, or before it with another guard page after its last page, so
+   an access out of its bounds faults at once. The fault handler prints
+   the case and argument and lets the signal kill the suite. */
+#define OSTESTER_GUARD_MAX_BUFFERS 64
+
+struct ostester_guarded_buffer
+{
+    char *mapping;
+    size_t length;
+    char *guard_before;
+    char *guard_after;
+    uint32_t argument;
+};
+
+struct ostester_guard_state
+{
+    const char *header;
+    const char *function;
+    uint32_t number;
+    size_t page;
+    size_t count;
+    struct ostester_guarded_buffer buffers[OSTESTER_GUARD_MAX_BUFFERS];
+};
+
+/* Defined in the generated main.c when the suites guard their buffers */
+extern struct ostester_guard_state ostester_guard;
+
+static inline char *ostester_guard_append(char *out, const char *text)
+{
+    while (*text)
+    {
+        *out++ = *text++;
+    }
+    return out;
+}
+
+static inline char *ostester_guard_append_number(char *out, unsigned long n)
+{
+    char digits[24];
+    size_t length = 0;
+    do
+    {
+        digits[length++] = (char)('0' + n % 10);
+        n /= 10;
+    } while (n);
+    while (length)
+    {
+        *out++ = digits[--length];
+    }
+    return out;
+}
+
+/* Only calls async-signal-safe functions */
+static inline void ostester_guard_fault(int signal_number, siginfo_t *info,
+                                        void *context)
+{
+    const char *address = info->si_addr;
+    (void)context;
+    for (size_t i = 0; i < ostester_guard.count; i++)
+    {
+        const struct ostester_guarded_buffer *buffer =
+            &ostester_guard.buffers[i];
+        const char *where = NULL;
+        if (address >= buffer->guard_after &&
+            address < buffer->guard_after + ostester_guard.page)
+        {
+            where = " past the end\n";
+        }
+        else if (buffer->guard_before != NULL &&
+                 address >= buffer->guard_before &&
+                 address < buffer->guard_before + ostester_guard.page)
+        {
+            where = " before the start\n";
+        }
+        if (where != NULL)
+        {
+            char line[512];
+            char *out = ostester_guard_append(line, "# guard page hit: ");
+            /* The names come from the generated code, so they fit */
+            out = ostester_guard_append(out, ostester_guard.header);
+            out = ostester_guard_append(out, " ");
+            out = ostester_guard_append(out, ostester_guard.function);
+            out = ostester_guard_append(out, " case ");
+            out = ostester_guard_append_number(out, ostester_guard.number);
+            out = ostester_guard_append(out, " argument ");
+            out = ostester_guard_append_number(out, buffer->argument);
+            out = ostester_guard_append(out, where);
+            ssize_t written = write(STDOUT_FILENO, line,
+                                    (size_t)(out - line));
+            (void)written;
+            break;
+        }
+    }
+    /* The faulting access runs again and kills the suite */
+    signal(signal_number, SIG_DFL);
+}
+
+/* Starts test case number of function, whose buffers take the place of
+   those of the previous one */
+static inline void ostester_guard_begin(const char *header,
+                                        const char *function, uint32_t number)
+{
+    if (ostester_guard.page == 0)
+    {
+        struct sigaction action;
+        memset(&action, 0, sizeof action);
+        action.sa_sigaction = ostester_guard_fault;
+        action.sa_flags = SA_SIGINFO;
+        sigemptyset(&action.sa_mask);
+        sigaction(SIGSEGV, &action, NULL);
+        sigaction(SIGBUS, &action, NULL);
+        /* Keeps the lines printed before a fault from being lost */
+        setvbuf(stdout, NULL, _IOLBF, 0);
+        ostester_guard.page = (size_t)sysconf(_SC_PAGESIZE);
+    }
+    ostester_guard.count = 0;
+    ostester_guard.header = header;
+    ostester_guard.function = function;
+    ostester_guard.number = number;
+}
+
+/* Returns a buffer of size bytes holding a copy of data, or zeroed if data
+   is NULL, for argument of the current test case. The mapping of the
+   buffer in the same place in the previous case is reused if it has the
+   same size, so most cases only pay for the copy. */
+static inline void *ostester_guarded(const void *data, size_t size,
+                                     uint32_t argument, int before)
+{
+    size_t page = ostester_guard.page;
+    size_t span = (size + page - 1) / page * page;
+    size_t length = span + page * (before ? 2 : 1);
+    if (ostester_guard.count == OSTESTER_GUARD_MAX_BUFFERS)
+    {
+        fputs("ostester: too many guarded buffers in a test case\n", stderr);
+        abort();
+    }
+    struct ostester_guarded_buffer *buffer =
+        &ostester_guard.buffers[ostester_guard.count++];
+    if (buffer->mapping == NULL || buffer->length != length ||
+        (buffer->guard_before != NULL) != (before != 0))
+    {
+        if (buffer->mapping != NULL)
+        {
+            munmap(buffer->mapping, buffer->length);
+        }
+        char *mapping = mmap(NULL, length, PROT_READ | PROT_WRITE,
+                             MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+        if (mapping == MAP_FAILED)
+        {
+            perror("ostester: mmap");
+            abort();
+        }
+        buffer->mapping = mapping;
+        buffer->length = length;
+        buffer->guard_before = before ? mapping : NULL;
+        buffer->guard_after = mapping + length - page;
+        mprotect(buffer->guard_after, page, PROT_NONE);
+        if (before)
+        {
+            mprotect(mapping, page, PROT_NONE);
+        }
+    }
+    buffer->argument = argument;
+    char *result = before ? buffer->mapping + page
+                          : buffer->guard_after - size;
+    if (data != NULL)
+    {
+        memcpy(result, data, size);
+    }
+    else
+    {
+        memset(result, 0, size);
+    }
+    return result;
+}
+
+#endif
@@ -0,0 +1,30 @@
+{% from 'suite.jinja2.c' import suite %}
+#include <stdint.h>
+#include "{{ header_suite_header_name }}"
+
+{% for function in functions %}
+uint32_t {{ function.name|function_test_case_name }}(void);
+{% if options.report and function.benchmark %}
+uint32_t {{ function.name|function_benchmark_name }}(void);
+{% endif %}
+{% endfor %}
+
+{% if options.report %}
+{{ suite(test_header_name|header_to_function_name,
+         functions|map(attribute='name')|map('function_test_case_name')|list +
+         functions|selectattr('benchmark')|map(attribute='name')|map('function_benchmark_name')|list,
+         True) }}
+{% else %}
+uint32_t {{ test_header_name|header_to_function_name }}(void)
+{
+    uint32_t success = 0;
+    {% for function in functions %}
+    success = {{ function.name|function_test_case_name }}();
+    if (success != 0)
+    {
+        return {{ function.base }} + success;
+    }
+    {% endfor %}
+    return success;
+}
+{% endif %}
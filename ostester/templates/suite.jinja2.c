@@ -1,6 +1,13 @@
-{% macro suite(function, sub_functions) %}
+{% macro suite(function, sub_functions, accumulate=False) %}
 uint32_t {{ function }}(void)
 {
+    {% if accumulate %}
+    uint32_t failures = 0;
+    {% for f in sub_functions %}
+    failures += {{ f }}();
+    {% endfor %}
+    return failures;
+    {% else %}
     uint32_t success = 0;
     {% for f in sub_functions %}
     success = {{ f }}();
@@ -10,5 +17,6 @@ uint32_t {{ function }}(void)
     }
     {% endfor %}
     return success;
+    {% endif %}
 }
 {% endmacro %}
@@ -0,0 +1,56 @@
+{% macro sweep_test_case(fn, test) %}
+{
+{% if options.report %}
+uint32_t {{ test.result }}_failed = 0;
+uint64_t {{ test.result }}_start = ostester_now_ns();
+{% endif %}
+{% for generated in test.generators %}
+{% set g = generated.value %}
+{% set i = generated.name ~ '_i' %}
+{% if g.yaml_tag == '!range' %}
+for (int64_t {{ i }} = {{ g.first }}; {{ i }} {{ '<=' if g.step > 0 else '>=' }} {{ g.last }}; {{ i }} += {{ g.step }})
+{% else %}
+for (uint32_t {{ i }} = 0; {{ i }} < {{ g.count }}u; {{ i }}++)
+{% endif %}
+{
+{% endfor %}
+{% for generated in test.generators %}
+{% set g = generated.value %}
+{% set i = generated.name ~ '_i' %}
+{% if g.yaml_tag == '!range' %}
+{{ generated.type.declare(generated.name) }} = ({{ generated.type.unqualified }}){{ i }};
+{% else %}
+{# The same hash as yamlreader.Random.hash #}
+uint32_t {{ generated.name }}_h = {{ g.seed }}u + {{ i }} * 0x9e3779b9u;
+{{ generated.name }}_h = ({{ generated.name }}_h ^ ({{ generated.name }}_h >> 16)) * 0x85ebca6bu;
+{{ generated.name }}_h = ({{ generated.name }}_h ^ ({{ generated.name }}_h >> 13)) * 0xc2b2ae35u;
+{{ generated.name }}_h ^= {{ generated.name }}_h >> 16;
+{{ generated.type.declare(generated.name) }} = ({{ generated.type.unqualified }})((int64_t){{ g.min }} + (int64_t)({{ generated.name }}_h % {{ g.max - g.min + 1 }}ull));
+{% endif %}
+{% endfor %}
+{% if options.guard %}
+ostester_guard_begin("{{ test_header_name }}", "{{ fn.name }}", {{ test.number }});
+{% endif %}
+{% for declaration in test.declarations if declaration.value is not generated %}
+{{ data_pool.initialize(declaration, test.argument_index(declaration), options.guard) }};
+{% endfor %}
+{{ fn.type.output.declare(test.result) }} = {{ fn.name }}({{ test.arguments|map(attribute='name')|join(', ') }});
+{% for declaration in test.comparison.declarations %}
+{{ data_pool.initialize(declaration) }};
+{% endfor %}
+{% if options.report %}
+{{ test.result }}_failed += !({{ test.comparison.compare_with(test.result) }});
+{% else %}
+if (!({{ test.comparison.compare_with(test.result) }}))
+{
+    return {{ test.number }};
+}
+{% endif %}
+{% for generated in test.generators %}
+}
+{% endfor %}
+{% if options.report %}
+failures += ostester_report_{{ options.report }}("{{ test_header_name }}", "{{ fn.name }}", {{ test.number }}, {{ test.result }}_failed == 0, ostester_now_ns() - {{ test.result }}_start);
+{% endif %}
+}
+{% endmacro %}
@@ -0,0 +1,45 @@
+{% macro table_test_case(fn) %}
+{% set ops = fn.test_cases|map(attribute='comparison.f')|unique|list %}
+static const struct
+{
+{% for type in fn.type.inputs %}
+    {{ type.declare('arg' ~ loop.index0) }};
+{% endfor %}
+    {{ fn.type.output.declare('expected') }};
+{% if ops|length > 1 %}
+    uint8_t op;
+{% endif %}
+} cases[] = {
+{% for test in fn.test_cases %}
+    {{ '{' }}{% for argument in test.arguments %}{{ argument.type.literal(argument.value) }}, {% endfor %}{{ fn.type.output.literal(test.comparison.arg) }}{% if ops|length > 1 %}, {{ ops.index(test.comparison.f) }}{% endif %}{{ '},' }}
+{% endfor %}
+};
+for (uint32_t i = 0; i < sizeof cases / sizeof cases[0]; i++)
+{
+{% if options.report %}
+    uint64_t start = ostester_now_ns();
+{% endif %}
+    {{ fn.type.output.declare('result') }} = {{ fn.name }}({% for type in fn.type.inputs %}cases[i].arg{{ loop.index0 }}{{ ', ' if not loop.last }}{% endfor %});
+{% if ops|length > 1 %}
+    int passed = 0;
+    switch (cases[i].op)
+    {
+{% for op in ops %}
+    case {{ loop.index0 }}:
+        passed = result {{ op }} cases[i].expected;
+        break;
+{% endfor %}
+    }
+{% else %}
+    int passed = result {{ ops[0] }} cases[i].expected;
+{% endif %}
+{% if options.report %}
+    failures += ostester_report_{{ options.report }}("{{ test_header_name }}", "{{ fn.name }}", {{ fn.test_cases[0].number }} + i, passed, ostester_now_ns() - start);
+{% else %}
+    if (!passed)
+    {
+        return {{ fn.test_cases[0].number }} + i;
+    }
+{% endif %}
+}
+{% endmacro %}
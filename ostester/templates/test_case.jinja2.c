@@ -1,11 +1,28 @@
+{% from 'sweep_test_case.jinja2.c' import sweep_test_case with context %}
 {% macro test_case(fn, test) %}
+{% if test.generators %}
+{{ sweep_test_case(fn, test) -}}
+{% else %}
+{% if options.guard %}
+ostester_guard_begin("{{ test_header_name }}", "{{ fn.name }}", {{ test.number }});
+{% endif %}
 {% for declaration in test.declarations %}
-{{ declaration.initialize() }};
+{{ data_pool.initialize(declaration, test.argument_index(declaration), options.guard) }};
 {% endfor %}
-{% set result = new_name() %}
-{{ fn.type.output.declare(result) }} = {{ fn.name }}({{ test.arguments|map(attribute='name')|join(', ') }});
-if (!({{ test.comparison.compare_with(result) }}))
+{% if options.report %}
+uint64_t {{ test.result }}_start = ostester_now_ns();
+{% endif %}
+{{ fn.type.output.declare(test.result) }} = {{ fn.name }}({{ test.arguments|map(attribute='name')|join(', ') }});
+{% for declaration in test.comparison.declarations %}
+{{ data_pool.initialize(declaration) }};
+{% endfor %}
+{% if options.report %}
+failures += ostester_report_{{ options.report }}("{{ test_header_name }}", "{{ fn.name }}", {{ test.number }}, {{ test.comparison.compare_with(test.result) }}, ostester_now_ns() - {{ test.result }}_start);
+{% else %}
+if (!({{ test.comparison.compare_with(test.result) }}))
 {
     return {{ test.number }};
 }
+{% endif %}
+{% endif %}
 {% endmacro %}
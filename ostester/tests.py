@@ -1,13 +1,33 @@
 from pathlib import Path
 import logging
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import threading
 import unittest
 from doctest import DocTestSuite, REPORT_ONLY_FIRST_FAILURE, ELLIPSIS
-from subprocess import call
+from subprocess import CalledProcessError, call
 from tempfile import TemporaryDirectory
+from unittest import mock
 
 import yaml
 
-from . import ast, ccodegen, types, values, yamlreader, arguments
+from . import (api, ast, batch, benchmarks, ccodegen, client, incremental,
+               inprocess, profiling, results, runner, server, store,
+               synthetic, types, values, watch, yamlreader, arguments,
+               utils)
+
+
+# The main of the code under test of the generated suites
+MAIN_SOURCE = '''
+#include "test_main.h"
+
+int main(void) {
+    return test_main();
+}
+'''
 
 
 class YAMLParseTestCase(unittest.TestCase):
@@ -15,6 +35,27 @@ class YAMLParseTestCase(unittest.TestCase):
         with open("ostester/tests/test-compare.yaml", 'r') as f:
             yml = yamlreader.parse(f)
 
+    @unittest.skipUnless(len(yamlreader.LOADERS) > 1, 'libyaml unavailable')
+    def test_loaders_agree(self):
+        with open("ostester/tests/test-compare.yaml", 'r') as f:
+            spec = f.read()
+        for text in (spec,
+                     synthetic.spec(10, 50, arguments=3, pointer_depth=3,
+                                    zeroed_size=4),
+                     synthetic.spec(10, 50, arguments=3, zeroed_size=1)):
+            trees = [yamlreader.parse(text, loader)
+                     for loader in yamlreader.LOADERS]
+            self.assertEqual(trees[0], trees[1])
+        self.assertIsInstance(trees[1][1]['type'], yamlreader.Signature)
+        self.assertEqual(trees[1][1]['tests'][0]['args'][1],
+                         yamlreader.Zeroed(1))
+
+    def test_iter_parse_anchors(self):
+        items = yamlreader.iter_parse('[{a: &x 1, b: *x}, {c: 2}]')
+        self.assertEqual(list(items), [{'a': 1, 'b': 1}, {'c': 2}])
+        with self.assertRaises(yaml.YAMLError):
+            list(yamlreader.iter_parse('[{a: &x 1}, {b: *x}]'))
+
     def test_zeroed(self):
         Zeroed = yamlreader.Zeroed
         self.assertEqual(yaml.safe_load("!zeroed 5"), Zeroed(5))
@@ -90,6 +131,67 @@ class ASTTestCase(unittest.TestCase):
         self.assertEqual(args[0].name, decls[0].name)
         self.assertEqual(args[0].value, 3)
 
+    def test_structs(self):
+        tree = ast.transform([
+            {'header': 'geometry.h',
+             'structs': {'ast_point': {'x': 'int', 'y': 'int'}}},
+            {'function': 'norm',
+             'type': yamlreader.Signature(inputs=['struct ast_point'],
+                                          output='int'),
+             'tests': [{'args': [{'x': 3, 'y': 4}], 'equals': 5}]}])
+        declaration, = tree.tests[0].test_cases[0].declarations
+        self.assertEqual(declaration.initialize(), 'struct ast_point {} = '
+                         '{{.x = 3, .y = 4}}'.format(declaration.name))
+        # Another spec may define the struct differently
+        tree = ast.transform([
+            {'header': 'geometry.h',
+             'structs': {'ast_point': {'x': 'int', 'y': 'int', 'z': 'int'}}},
+            {'function': 'norm',
+             'type': yamlreader.Signature(inputs=['struct ast_point'],
+                                          output='int'),
+             'tests': [{'args': [[1, 2, 3]], 'equals': 5}]}])
+        declaration, = tree.tests[0].test_cases[0].declarations
+        self.assertEqual(declaration.initialize(), 'struct ast_point {} = '
+                         '{{1, 2, 3}}'.format(declaration.name))
+
+    def test_nodes(self):
+        tree = ast.transform([
+            {'header': 'compare.h'},
+            {'function': 'compare',
+             'type': yamlreader.Signature(inputs=['char', 'char*'],
+                                          output='int'),
+             'tests': [{'args': ['a', ['b']], 'equals': 1}]}])
+        self.assertEqual(tree.header, 'compare.h')
+        function, = tree.tests
+        self.assertEqual(function.name, 'compare')
+        test, = function.test_cases
+        self.assertEqual(test.comparison, ast.comparisons['equals'](1))
+        self.assertEqual(test.arguments, test.declarations)
+        self.assertFalse(hasattr(test.declarations[0], '__dict__'))
+
+    def test_benchmark(self):
+        signature = yamlreader.Signature(inputs=['int'], output='int')
+        function = ast.function_test({
+            'function': 'f', 'type': signature,
+            'tests': [{'args': [1], 'equals': 1}],
+            'benchmark': None})
+        self.assertEqual(function.benchmark.iterations, 1000)
+        self.assertEqual(function.benchmark.inputs, function.test_cases)
+        function = ast.function_test({
+            'function': 'f', 'type': signature,
+            'benchmark': {'iterations': 10, 'warmup': 0, 'batch': 4,
+                          'inputs': [{'args': [5]}]}})
+        self.assertEqual(function.test_cases, [])
+        bench = function.benchmark
+        self.assertEqual((bench.iterations, bench.warmup, bench.batch),
+                         (10, 0, 4))
+        self.assertEqual(bench.inputs[0].arguments[0].value, 5)
+        self.assertIsNone(ast.function_test({
+            'function': 'f', 'type': signature, 'tests': []}).benchmark)
+        with self.assertRaises(ValueError):
+            ast.function_test({'function': 'f', 'type': signature,
+                               'benchmark': {'iterations': 0}})
+
 
 class TypeTestCase(unittest.TestCase):
     def test_functional(self):
@@ -128,6 +230,71 @@ class TypeTestCase(unittest.TestCase):
         self.assertEqual(string.initialize(
             'ptr', ['a', 'b', 'c']), 'char*ptr = "abc"')
 
+    def test_const(self):
+        const_char = types.c_type('const char')
+        self.assertIs(types.c_type('const char*').inner_type, const_char)
+        self.assertIs(const_char.unqualified, types.c_type('char'))
+        self.assertTrue(const_char.scalar)
+        self.assertEqual(types.c_type('const char*').initialize('s', 'ab'),
+                         'const char*s = "ab"')
+
+    def test_interned(self):
+        self.assertIs(types.c_type('int**'),
+                      types.Pointer(types.Pointer(types.Int())))
+        self.assertIs(types.c_type('int *'), types.c_type('int*'))
+        self.assertEqual({types.c_type('char*'): 1}[types.c_type('char *')],
+                         1)
+        self.assertIs(pickle.loads(pickle.dumps(types.c_type('char*[2]'))),
+                      types.c_type('char*[2]'))
+        self.assertIsNot(types.c_type('int*'), types.c_type('char*'))
+        with self.assertRaises(ValueError):
+            types.c_type('float')
+        with self.assertRaises(ValueError):
+            types.c_type('int[x]')
+
+    def test_array_type(self):
+        array = types.c_type('int[3]')
+        self.assertEqual(array, types.Array(types.Int(), 3))
+        self.assertEqual(array.declare('a'), 'int a[3]')
+        self.assertEqual(array.initialize('a', [1, 2, 3]),
+                         'int a[3] = {1, 2, 3}')
+        self.assertEqual(types.c_type('char[2]').initialize('s', 'ab'),
+                         "char s[2] = {'a', 'b'}")
+        matrix = types.c_type('int[2][3]')
+        self.assertEqual(matrix.element_type, types.c_type('int[3]'))
+        self.assertEqual(repr(matrix), 'int[2][3]')
+        self.assertEqual(matrix.initialize('m', [[1, 2, 3], [4]]),
+                         'int m[2][3] = {{1, 2, 3}, {4}}')
+        self.assertEqual(types.c_type('char*[2]').declare('p'), 'char*p[2]')
+        with self.assertRaises(ValueError):
+            array.initialize('a', [1, 2, 3, 4])
+
+    def test_struct_type(self):
+        point = types.c_type('struct test_point')
+        self.assertIs(point, types.Struct('test_point'))
+        self.assertEqual(point.declare('p'), 'struct test_point p')
+        with self.assertRaises(ValueError):
+            point.initialize('p', [1, 2])
+        defined = point.define([('x', 'int'), ('tag', 'char')])
+        self.assertEqual(defined.initialize('p', [1, 'a']),
+                         "struct test_point p = {1, 'a'}")
+        self.assertEqual(defined.initialize('p', {'tag': 'b', 'x': 2}),
+                         "struct test_point p = {.tag = 'b', .x = 2}")
+        pointer = types.c_type('struct test_point*')
+        self.assertIs(pointer.inner_type, point)
+        self.assertIs(types.c_type('struct  test_point'), point)
+        for invalid in ('structure', 'struct_t', 'struct', 'structpoint*'):
+            with self.assertRaisesRegex(ValueError, 'Unsupported base type'):
+                types.c_type(invalid)
+        self.assertIs(pointer.resolve({'test_point': defined}).inner_type,
+                      defined)
+        self.assertIs(point.define([('x', 'int'), ('tag', 'char')]),
+                      defined)
+        self.assertIsNot(point.define([('x', 'int')]), defined)
+        with self.assertRaises(ValueError):
+            defined.initialize('p', {'y': 1})
+        self.assertIs(pickle.loads(pickle.dumps(point)), point)
+
 
 class ValueTestCase(unittest.TestCase):
     def test_value(self):
@@ -157,14 +324,12 @@ class CodegenTestCase(unittest.TestCase):
     def setUp(self):
         self.parse_tree = [
             {'header': 'compare.h'},
-            [{'name': 'compare',
-             'type': yamlreader.Signature(inputs=['char', 'char*'],
-                                          output='int'),
-             'test_cases': [
-                 {'args': ['a', ['a', 'b']],
-                  'comparison': ast.comparisons['less_than'](0),
-                  'number': 1}],
-            }]]
+            [ast.function_test({
+                'function': 'compare',
+                'type': yamlreader.Signature(inputs=['char', 'char*'],
+                                             output='int'),
+                'tests': [{'args': ['a', ['a', 'b']], 'less_than': 0}],
+            })]]
 
     def test_main_codegen(self):
         main = ccodegen.render_main((self.parse_tree[0]['header'],))
@@ -178,6 +343,45 @@ class CodegenTestCase(unittest.TestCase):
         self.assertTrue(header)
         logging.getLogger('tests').info(header)
 
+    def test_bytecode_cache(self):
+        environ = os.environ.copy()
+        with TemporaryDirectory() as temp_dir:
+            # Keeps render_header_suite's environment out of ~/.cache
+            os.environ['OSTESTER_CACHE_DIR'] = os.path.join(temp_dir, 'env')
+            ccodegen.get_env.cache_clear()
+            try:
+                env = ccodegen.create_env(temp_dir)
+                env.get_template('header_suite.jinja2.c')
+                self.assertTrue(os.listdir(temp_dir))
+                cached_env = ccodegen.create_env(temp_dir)
+                template = cached_env.get_template('header_suite.jinja2.c')
+                cached = template.render(
+                    test_header_name='compare.h',
+                    header_suite_header_name='test_compare.h',
+                    functions=self.parse_tree[1],
+                    new_name=utils.GenerationContext().new_name,
+                    data_pool=values.DataPool())
+                self.assertEqual(cached, ccodegen.render_header_suite(
+                    'compare.h', 'test_compare.h', self.parse_tree[1]))
+            finally:
+                os.environ.clear()
+                os.environ.update(environ)
+                ccodegen.get_env.cache_clear()
+
+    def test_cache_dir(self):
+        environ = os.environ.copy()
+        try:
+            os.environ['OSTESTER_CACHE_DIR'] = '/tmp/cache'
+            self.assertEqual(ccodegen.cache_dir(), '/tmp/cache')
+            os.environ['OSTESTER_CACHE_DIR'] = ''
+            self.assertIsNone(ccodegen.cache_dir())
+            del os.environ['OSTESTER_CACHE_DIR']
+            os.environ['XDG_CACHE_HOME'] = '/tmp/xdg'
+            self.assertEqual(ccodegen.cache_dir(), '/tmp/xdg/ostester/jinja2')
+        finally:
+            os.environ.clear()
+            os.environ.update(environ)
+
     def test_header_suite_codegen(self):
         suite = ccodegen.render_header_suite(
             self.parse_tree[0]['header'],
@@ -187,6 +391,572 @@ class CodegenTestCase(unittest.TestCase):
         self.assertTrue(suite)
         logging.getLogger('tests').info(suite)
 
+    def test_deterministic(self):
+        with open("ostester/tests/test-compare.yaml", 'r') as f:
+            yml = yamlreader.parse(f)
+
+        def render():
+            context = utils.GenerationContext()
+            ast_ = ast.transform(yml, context)
+            return ccodegen.render_header_suite(
+                ast_.header, 'test_compare.h', ast_.tests, context)
+        first = render()
+        utils.new_name()
+        self.assertEqual(render(), first)
+        self.assertIn('return 1;', first)
+        self.assertIn('_id_1 ', first)
+
+
+class TableTestCase(unittest.TestCase):
+    spec = '''
+- header: sub.h
+
+- function: sub
+  type: int, char -> int
+  tests:
+    - args: [100, a]
+      equals: 3
+    - data:
+        c: b
+      args: [1, !decl c]
+      less_than: 0
+    - args: [99, a]
+      greater_than: {}
+
+- function: compare
+  type: char, char* -> int
+  tests:
+    - args: [a, [b]]
+      less_than: 0
+'''
+    source = MAIN_SOURCE + '''
+int sub(int a, char b) {
+    return a - b;
+}
+
+int compare(char chr, char* str) {
+    return chr - str[0];
+}
+'''
+
+    def run_suite(self, table, expected):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            (gen_dir/'sub.h').write_text(
+                'int sub(int, char);\nint compare(char, char*);\n')
+            (gen_dir/'sub.c').write_text(self.source)
+            context = utils.GenerationContext()
+            ast_ = ast.transform(
+                yamlreader.parse(self.spec.format(expected)), context)
+            options = ccodegen.Options(table=table)
+            ccodegen.generate_files(ast_, gen_dir, context, options)
+            suite = (gen_dir/'test_sub.c').read_text()
+            self.assertEqual('cases[]' in suite, table)
+            self.assertEqual(call(['gcc', '-I', str(gen_dir),
+                                   '-o', str(gen_dir/'test.out'),
+                                   str(gen_dir/'main.c'),
+                                   str(gen_dir/'test_sub.c'),
+                                   str(gen_dir/'sub.c')]), 0)
+            return call([str(gen_dir/'test.out')])
+
+    def test_table(self):
+        self.assertEqual(self.run_suite(True, 0), 0)
+        self.assertEqual(self.run_suite(True, 2), 3)
+
+    def test_same_result_as_unrolled(self):
+        self.assertEqual(self.run_suite(False, 2), 3)
+
+    def test_table_eligible(self):
+        tree = ast.transform(yamlreader.parse(self.spec.format(0)))
+        self.assertEqual(list(map(ccodegen.table_eligible, tree.tests)),
+                         [True, False])
+
+
+class GeneratorTestCase(unittest.TestCase):
+    spec = '''
+- header: sweep.h
+
+- function: add
+  type: int, char -> int
+  tests:
+    - args: [!range [0, 255], !range [0, 127]]
+      less_than: {}
+
+- function: record
+  type: int -> int
+  tests:
+    - args: [!random {{count: 100, min: -50, max: 50, seed: 9}}]
+      equals: 0
+
+- function: total
+  type: int -> int
+  tests:
+    - args: [0]
+      equals: {}
+'''
+    source = MAIN_SOURCE + '''
+int add(int a, char b) {
+    return a + b;
+}
+
+static int sum;
+
+int record(int value) {
+    sum += value;
+    return 0;
+}
+
+int total(int ignored) {
+    return sum;
+}
+'''
+
+    def run_suite(self, bound, total, report=None):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            (gen_dir/'sweep.h').write_text(
+                'int add(int, char);\nint record(int);\nint total(int);\n')
+            (gen_dir/'sweep.c').write_text(self.source)
+            context = utils.GenerationContext()
+            ast_ = ast.transform(
+                yamlreader.parse(self.spec.format(bound, total)), context)
+            ccodegen.generate_files(ast_, gen_dir, context,
+                                    ccodegen.Options(report=report))
+            self.assertEqual(call(['gcc', '-I', str(gen_dir),
+                                   '-o', str(gen_dir/'test.out'),
+                                   str(gen_dir/'main.c'),
+                                   str(gen_dir/'test_sweep.c'),
+                                   str(gen_dir/'sweep.c')]), 0)
+            return subprocess.run([str(gen_dir/'test.out')],
+                                  stdout=subprocess.PIPE,
+                                  universal_newlines=True)
+
+    def test_sweep(self):
+        total = sum(yamlreader.Random(100, -50, 50, 9).values())
+        self.assertEqual(self.run_suite(255 + 127 + 1, total).returncode, 0)
+        self.assertEqual(self.run_suite(255 + 127, total).returncode, 1)
+        self.assertEqual(
+            self.run_suite(255 + 127 + 1, total + 1).returncode, 3)
+        process = self.run_suite(255 + 127, total, 'tap')
+        self.assertEqual(process.returncode, 1)
+        self.assertEqual(
+            [(r.function, r.case, r.passed) for r in
+             results.parse(process.stdout.splitlines())],
+            [('add', 1, False), ('record', 2, True), ('total', 3, True)])
+
+    def test_constant_size(self):
+        def suite(last):
+            spec = yamlreader.parse(self.spec.format(0, 0).replace(
+                '255', str(last)))
+            return ccodegen.render_header_suite(
+                'sweep.h', 'test_sweep.h', ast.transform(spec).tests)
+        self.assertEqual(len(suite(10000)), len(suite(99999)))
+
+    def test_invalid(self):
+        char_ptr = types.c_type('char*')
+        char = types.c_type('char')
+        with self.assertRaises(ValueError):
+            ast.generator(yamlreader.Range(0, 9), char_ptr)
+        with self.assertRaises(ValueError):
+            ast.generator(yamlreader.Range(0, 9, 0), char)
+        with self.assertRaises(ValueError):
+            ast.generator(yamlreader.Random(1, 9, 0), char)
+
+
+class DataPoolTestCase(unittest.TestCase):
+    spec = '''
+- header: data.h
+
+- function: sum
+  type: int*, int -> int
+  tests:
+    - args: [[1, 2, 3], 3]
+      equals: 6
+    - args: [[1, 2, 3], 2]
+      equals: 3
+
+- function: first
+  type: const char* -> int
+  tests:
+    - args: [abc]
+      equals: 97
+
+- function: consume
+  type: char* -> int
+  tests:
+    - args: [abc]
+      equals: 97
+    - args: [abc]
+      equals: 97
+'''
+    source = MAIN_SOURCE + '''
+int sum(int *values, int n) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        total += values[i];
+    }
+    return total;
+}
+
+int first(const char *text) {
+    return text[0];
+}
+
+int consume(char *text) {
+    int c = text[0];
+    text[0] = 0;
+    return c;
+}
+'''
+
+    def test_shared_data(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            (gen_dir/'data.h').write_text(
+                'int sum(int*, int);\nint first(const char*);\n'
+                'int consume(char*);\n')
+            (gen_dir/'data.c').write_text(self.source)
+            context = utils.GenerationContext()
+            ast_ = ast.transform(yamlreader.parse(self.spec), context)
+            ccodegen.generate_files(ast_, gen_dir, context)
+            suite = (gen_dir/'test_data.c').read_text()
+            # Every literal is emitted once, and copied out of line
+            self.assertEqual(suite.count('{1, 2, 3}'), 1)
+            self.assertEqual(suite.count('"abc"'), 1)
+            self.assertEqual(suite.count('memcpy('), 2)
+            self.assertEqual(suite.count('static char _id_'), 2)
+            self.assertIn('= ostester_data_2;', suite)
+            self.assertEqual(call(['gcc', '-Wall', '-Werror',
+                                   '-I', str(gen_dir),
+                                   '-o', str(gen_dir/'test.out'),
+                                   str(gen_dir/'main.c'),
+                                   str(gen_dir/'test_data.c'),
+                                   str(gen_dir/'data.c')]), 0)
+            self.assertEqual(call([str(gen_dir/'test.out')]), 0)
+
+
+class BinaryDataTestCase(unittest.TestCase):
+    spec = '''
+- header: binary.h
+
+- function: checksum
+  type: const char*, int -> int
+  tests:
+    - args: [!file fixture.bin, 3000000]
+      equals: 2999999
+    - args: [!bytes 01 02 ff, 3]
+      equals: 3
+    - args: [!zeroed 1048576, 1048575]
+      equals: 0
+
+- function: scrub
+  type: char*, int -> int
+  tests:
+    - args: [!zeroed 4, 3]
+      equals: 0
+    - args: [!zeroed 4, 3]
+      equals: 0
+    - args: [!file fixture.bin, 3000000]
+      equals: 2999999
+'''
+    source = MAIN_SOURCE + '''
+int checksum(const char *data, int n) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        total += data[i] != 0;
+    }
+    return total + (data[n] != 0);
+}
+
+int scrub(char *data, int n) {
+    int total = checksum(data, n);
+    data[0] = 1;
+    return total;
+}
+'''
+
+    def test_embedded(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            (gen_dir/'binary.h').write_text(
+                'int checksum(const char*, int);\nint scrub(char*, int);\n')
+            (gen_dir/'binary.c').write_text(self.source)
+            (gen_dir/'fixture.bin').write_bytes(b'\0' + b'\1' * 2999999)
+            spec = gen_dir/'binary.yaml'
+            spec.write_text(self.spec)
+            batch.generate([spec], gen_dir)
+            suite = (gen_dir/'test_binary.c').read_text()
+            self.assertLess(len(suite), 10000)
+            self.assertEqual(suite.count('.incbin'), 1)
+            self.assertIn('"\\x01\\x02\\xff"', suite)
+            self.assertEqual(call(['gcc', '-Wall', '-Werror',
+                                   '-I', str(gen_dir),
+                                   '-o', str(gen_dir/'test.out'),
+                                   str(gen_dir/'main.c'),
+                                   str(gen_dir/'test_binary.c'),
+                                   str(gen_dir/'binary.c')]), 0)
+            self.assertEqual(call([str(gen_dir/'test.out')]), 0)
+
+    def test_invalid(self):
+        pool = values.DataPool()
+        for value in (yamlreader.Bytes(b'\1'), yamlreader.File('x.bin')):
+            with self.assertRaises(ValueError):
+                pool.add([values.Declaration(value, types.c_type('int*'))])
+        with self.assertRaises(ValueError):
+            pool.add([values.Declaration(yamlreader.File('missing.bin'),
+                                         types.c_type('char*'))])
+
+
+class BufferComparisonTestCase(unittest.TestCase):
+    spec = '''
+- header: buffers.h
+  sources: [buffers.c]
+
+- function: fill
+  type: char*, int -> int
+  tests:
+    - args: [!zeroed 8, 3]
+      bytes_equal: {arg: 0, value: abc}
+    - args: [!zeroed 65536, 0]
+      all_zero: {arg: 0, count: 65536}
+    - args: [!zeroed 8, 4]
+      prefix: {arg: 0, value: abce}
+
+- function: greeting
+  type: int -> const char*
+  tests:
+    - args: [0]
+      prefix: hello
+    - args: [0]
+      bytes_equal: hello, world
+    - args: [0]
+      bytes_equal: hello
+
+- function: samples
+  type: int*, int -> int
+  tests:
+    - args: [!zeroed 4, 4]
+      within: {arg: 0, value: [0, 10, 20, 30], tolerance: 1}
+    - args: [!zeroed 4, 4]
+      within: {arg: 0, value: [0, 10, 20, 30], tolerance: 0}
+'''
+    source = MAIN_SOURCE + '''
+int fill(char *buffer, int n) {
+    for (int i = 0; i < n; i++) {
+        buffer[i] = 'a' + i;
+    }
+    return n;
+}
+
+const char *greeting(int unused) {
+    return "hello, world";
+}
+
+int samples(int *buffer, int n) {
+    for (int i = 0; i < n; i++) {
+        buffer[i] = 10 * i + i % 2;
+    }
+    return n;
+}
+'''
+
+    def test_comparisons(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'buffers.h').write_text(
+                'int fill(char*, int);\nconst char *greeting(int);\n'
+                'int samples(int*, int);\n')
+            (root/'buffers.c').write_text(self.source)
+            (root/'buffers.yaml').write_text(self.spec)
+            result, = runner.run(
+                [str(root/'buffers.yaml')], root/'build',
+                options=ccodegen.Options(report='tap'),
+                configuration=runner.DEFAULT_CONFIGURATION._replace(
+                    cflags=('-Wall', '-Werror')))
+            self.assertEqual([c.passed for c in result.cases],
+                             [True, True, False, True, True, False, True,
+                              False], result.output)
+            suite = (result.suite.build_dir/'gen'/'test_buffers.c').read_text()
+            self.assertLess(len(suite), 10000)
+            self.assertEqual(suite.count('static int ostester_within_int'),
+                             1)
+
+    def test_invalid(self):
+        signature = yamlreader.Signature(inputs=['int', 'char*'],
+                                         output='int')
+        for check in ({'all_zero': 4}, {'bytes_equal': {'arg': 0,
+                                                        'value': [1]}},
+                      {'prefix': {'arg': 2, 'value': 'a'}},
+                      {'within': {'arg': 1, 'value': 'a'}},
+                      {'within': {'arg': 1, 'value': 'a',
+                                  'tolerance': -1}}):
+            with self.assertRaises(ValueError):
+                ast.function_test({'function': 'f', 'type': signature,
+                                   'tests': [dict(args=[1, 'a'], **check)]})
+
+
+def write_guard_spec(root, count):
+    """
+    Writes the spec summing count values, and its sources, to root,
+    returning the path of the spec
+    """
+    (root/'guard.h').write_text(
+        'int length(const char *);\nint sum(const int *, int);\n'
+        'int last(int, int *);\n')
+    (root/'guard.c').write_text(GuardTestCase.source)
+    (root/'guard.yaml').write_text(GuardTestCase.spec.format(count))
+    return root/'guard.yaml'
+
+
+class GuardTestCase(unittest.TestCase):
+    spec = '''
+- header: guard.h
+  sources: [guard.c]
+
+- function: length
+  type: const char* -> int
+  tests:
+    - args: [abc]
+      equals: 3
+
+- function: sum
+  type: const int*, int -> int
+  tests:
+    - args: [[1, 2, 3], {}]
+      greater_than: 0
+
+- function: last
+  type: int, int* -> int
+  tests:
+    - args: [1, !zeroed 4]
+      equals: 0
+'''
+    source = MAIN_SOURCE + '''
+#include "guard.h"
+
+int length(const char *text) {
+    int n = 0;
+    while (text[n]) {
+        n++;
+    }
+    return n;
+}
+
+int sum(const int *values, int n) {
+    int total = 0;
+    for (int i = 0; i < n; i++) {
+        total += values[i];
+    }
+    return total;
+}
+
+int last(int offset, int *values) {
+    return values[-offset];
+}
+'''
+
+    def run_suite(self, count, guard, split=False):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            result, = runner.run(
+                [str(write_guard_spec(root, count))], root/'build',
+                split=split,
+                options=ccodegen.Options(report='tap', guard=guard),
+                configuration=runner.DEFAULT_CONFIGURATION._replace(
+                    cflags=('-Wall', '-Werror')))
+            return result
+
+    def test_overrun(self):
+        # Split suites number the cases of each function from 1
+        for split, case in ((False, 2), (True, 1)):
+            result = self.run_suite(4, 'after', split)
+            self.assertEqual(result.faults, (results.GuardFault(
+                'guard.h', 'sum', case, 0, True),), result.output)
+            self.assertEqual([c.passed for c in result.cases], [True])
+            self.assertIn('sum case {} accessed argument 0 past its end'
+                          .format(case), result.describe())
+        result = self.run_suite(3, 'after')
+        self.assertEqual((result.returncode, result.faults), (0, ()))
+
+    def test_underrun(self):
+        result = self.run_suite(3, 'before')
+        self.assertEqual(result.faults, (results.GuardFault(
+            'guard.h', 'last', 3, 1, False),), result.output)
+        self.assertEqual([c.passed for c in result.cases], [True, True])
+
+    def test_same_verdicts(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            expected = write_comparison_specs(root)
+            for guard in ccodegen.GUARDS:
+                for result in runner.run(
+                        list(map(str, expected)), root/guard,
+                        options=ccodegen.Options(report='tap', guard=guard)):
+                    self.assertEqual([c.passed for c in result.cases],
+                                     expected[result.suite.spec],
+                                     result.output)
+
+
+class WatchTestCase(unittest.TestCase):
+    def edit(self, path, text):
+        mtime = path.stat().st_mtime_ns if path.exists() else 0
+        path.write_text(text)
+        os.utime(path, ns=(mtime + 10**9, mtime + 10**9))
+
+    def test_generate(self):
+        with TemporaryDirectory() as temp_dir:
+            spec_dir = Path(temp_dir)/'specs'
+            gen_dir = Path(temp_dir)/'gen'
+            spec_dir.mkdir()
+            gen_dir.mkdir()
+            other = spec_dir/'other.yaml'
+            self.edit(other, BatchTestCase.other_spec)
+            watcher = watch.GenerateWatcher(
+                ['ostester/tests/test-compare.yaml', str(spec_dir)], gen_dir)
+            self.assertEqual(len(watcher.poll()), 3)
+            self.assertTrue((gen_dir/'test_compare.c').exists())
+            self.assertIn('test_other_h();', (gen_dir/'main.c').read_text())
+            self.assertEqual(watcher.poll(), [])
+
+            self.edit(other, BatchTestCase.other_spec.replace(
+                'equals: 1', 'equals: 2'))
+            lines = watcher.poll()
+            self.assertEqual(len(lines), 1)
+            self.assertIn('other.h', lines[0])
+            self.assertIn('== 2', (gen_dir/'test_other.c').read_text())
+
+            self.edit(other, '- header: [')
+            with self.assertLogs('tests', 'ERROR'):
+                self.assertEqual(watcher.poll(), [])
+            self.edit(other, BatchTestCase.other_spec.replace(
+                'args: [1]', 'args: 5'))
+            with self.assertLogs('tests', 'ERROR'):
+                self.assertEqual(watcher.poll(), [])
+            self.edit(other, BatchTestCase.other_spec)
+            self.assertEqual(len(watcher.poll()), 1)
+            other.unlink()
+            self.assertEqual(watcher.poll(), ['generated main.c'])
+            self.assertNotIn('test_other_h();',
+                             (gen_dir/'main.c').read_text())
+
+    def test_generator_error(self):
+        with TemporaryDirectory() as temp_dir:
+            # A bug of the generator, unlike a bad spec, stops the watcher
+            watcher = watch.GenerateWatcher(
+                ['ostester/tests/test-compare.yaml'], temp_dir)
+            with mock.patch.object(batch, 'generate_tree',
+                                   side_effect=AttributeError('bug')):
+                with self.assertRaises(AttributeError):
+                    watcher.poll()
+
+    def test_run(self):
+        with TemporaryDirectory() as temp_dir:
+            watcher = watch.RunWatcher(['ostester/tests/test-compare.yaml'],
+                                       temp_dir)
+            line, = watcher.poll()
+            self.assertTrue(line.startswith('compare.h: ok'), line)
+            self.assertEqual(watcher.poll(), [])
+
 
 class ArgumentsTestCase(unittest.TestCase):
     def test_tests_run(self):
@@ -203,9 +973,49 @@ class ArgumentsTestCase(unittest.TestCase):
             gen_dir = Path(temp_dir)
             namespace = parser.parse_args(
                 ['ostester/tests/test-compare.yaml', str(gen_dir)])
-            self.assertEqual(namespace.yaml_file,
-                             'ostester/tests/test-compare.yaml')
+            self.assertEqual(namespace.yaml_files,
+                             ['ostester/tests/test-compare.yaml'])
             self.assertEqual(namespace.output_dir, str(gen_dir))
+            self.assertEqual(namespace.jobs, None)
+            namespace = parser.parse_args(
+                ['-j', '4', 'a.yaml', 'specs/', str(gen_dir)])
+            self.assertEqual(namespace.yaml_files, ['a.yaml', 'specs/'])
+            self.assertEqual(namespace.output_dir, str(gen_dir))
+            self.assertEqual(namespace.jobs, 4)
+
+    def test_profile_before_specs(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            spec = root/'compare.yaml'
+            text = Path('ostester/tests/test-compare.yaml').read_text()
+            spec.write_text(text)
+            (root/'gen').mkdir()
+            process = subprocess.run(
+                [sys.executable, 'testgen', '--profile', str(spec),
+                 str(root/'gen')], stderr=subprocess.PIPE,
+                universal_newlines=True)
+            self.assertEqual(process.returncode, 0, process.stderr)
+            self.assertEqual(spec.read_text(), text)
+            self.assertIn('parse', process.stderr)
+            self.assertTrue((root/'gen'/'test_compare.c').exists())
+            dump = root/'testgen.prof'
+            process = subprocess.run(
+                [sys.executable, 'testgen', '--profile-output', str(dump),
+                 str(spec), str(root/'gen')], stderr=subprocess.PIPE)
+            self.assertEqual(process.returncode, 0)
+            self.assertEqual(spec.read_text(), text)
+            self.assertTrue(dump.exists())
+
+    def test_run_arguments(self):
+        parser = arguments.test_parser()
+        namespace = parser.parse_args(
+            ['run', '-j', '2', '--cflags', '-O2 -Wall', 'a.yaml', 'specs/'])
+        self.assertEqual(namespace.command, 'run')
+        self.assertEqual(namespace.yaml_files, ['a.yaml', 'specs/'])
+        self.assertEqual(namespace.jobs, 2)
+        self.assertEqual(namespace.cflags, ['-O2', '-Wall'])
+        self.assertEqual(namespace.build_dir, 'ostester-build')
+        self.assertEqual(parser.parse_args(['-t']).command, None)
 
 
 class IntegrationTestCase(unittest.TestCase):
@@ -222,11 +1032,823 @@ class IntegrationTestCase(unittest.TestCase):
             self.assertEqual(call([str(gen_dir/'test.out')]), 0)
 
 
+class BatchTestCase(unittest.TestCase):
+    other_spec = '''
+- header: other.h
+
+- function: other
+  type: int -> int
+  tests:
+    - args: [1]
+      equals: 1
+'''
+
+    def test_find_specs(self):
+        with TemporaryDirectory() as temp_dir:
+            spec_dir = Path(temp_dir)
+            (spec_dir/'nested').mkdir()
+            for name in ('b.yaml', 'a.yml', 'nested/c.yaml', 'notes.txt'):
+                (spec_dir/name).touch()
+            specs = list(batch.find_specs([str(spec_dir), 'x.yaml']))
+            self.assertEqual(specs, [spec_dir/'a.yml', spec_dir/'b.yaml',
+                                     spec_dir/'nested/c.yaml',
+                                     Path('x.yaml')])
+
+    def test_generate(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            spec_dir = gen_dir/'specs'
+            spec_dir.mkdir()
+            (spec_dir/'other.yaml').write_text(self.other_spec)
+            headers = batch.generate(
+                ['ostester/tests/test-compare.yaml', str(spec_dir)],
+                gen_dir, jobs=2)
+            self.assertEqual(headers, ['compare.h', 'other.h'])
+            for name in ('test_compare.h', 'test_compare.c',
+                         'test_other.h', 'test_other.c', 'test_main.h'):
+                self.assertTrue((gen_dir/name).exists(), name)
+            main = (gen_dir/'main.c').read_text()
+            self.assertIn('test_compare_h();', main)
+            self.assertIn('test_other_h();', main)
+
+    def test_profile(self):
+        for jobs in (1, 2):
+            with TemporaryDirectory() as temp_dir:
+                gen_dir = Path(temp_dir)
+                (gen_dir/'other.yaml').write_text(self.other_spec)
+                with profiling.activate(profiling.Profile()) as profile:
+                    batch.generate(['ostester/tests/test-compare.yaml',
+                                    str(gen_dir/'other.yaml')],
+                                   gen_dir, jobs=jobs)
+                self.assertEqual(len([phase for phase in profile.calls
+                                      if phase.startswith('spec ')]), 2)
+                self.assertIn('parse', profile.seconds)
+                self.assertIn('transform', profile.seconds)
+                self.assertIn('render header_suite.jinja2.c',
+                              profile.seconds)
+                self.assertGreater(profile.seconds['write'], 0)
+                # Nested phases are left out of the phases running them
+                totals = sum(seconds
+                             for phase, seconds in profile.seconds.items()
+                             if phase.startswith('spec '))
+                self.assertLessEqual(
+                    sum(profile.seconds[phase] for phase in (
+                        'parse', 'transform',
+                        'render header_suite.jinja2.c')), totals)
+                self.assertEqual(profile.counters['test cases'], 5)
+                self.assertEqual(profile.counters['files written'], 7)
+                self.assertEqual(
+                    profile.counters['bytes written'],
+                    sum(path.stat().st_size for path in gen_dir.iterdir()
+                        if path.suffix in ('.c', '.h')))
+                self.assertGreater(profile.counters['identifiers'], 0)
+        self.assertIsNone(profiling.active())
+
+    def test_worker_count_independent(self):
+        outputs = []
+        for jobs in (1, 2):
+            with TemporaryDirectory() as temp_dir:
+                gen_dir = Path(temp_dir)
+                (gen_dir/'other.yaml').write_text(self.other_spec)
+                batch.generate(['ostester/tests/test-compare.yaml',
+                                str(gen_dir/'other.yaml')], gen_dir,
+                               jobs=jobs)
+                outputs.append({path.name: path.read_text()
+                                for path in gen_dir.iterdir()})
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_duplicate_header(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            spec = gen_dir/'other.yaml'
+            spec.write_text(self.other_spec)
+            copy = gen_dir/'copy.yaml'
+            copy.write_text(self.other_spec)
+            for jobs in (1, 2):
+                with self.assertRaises(ValueError):
+                    batch.generate([str(spec), str(copy)], gen_dir,
+                                   jobs=jobs)
+            # Nothing is generated before the duplicate is found
+            self.assertFalse((gen_dir/'test_other.c').exists())
+            with self.assertRaises(ValueError):
+                runner.run([str(spec), str(copy)], gen_dir/'build')
+
+    def test_null_entry(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            spec = gen_dir/'other.yaml'
+            spec.write_text(self.other_spec.replace('\n- function',
+                                                    '\n- ~\n- function'))
+            for split in (False, True):
+                with self.assertRaises(ValueError):
+                    batch.generate([str(spec)], gen_dir, jobs=1, split=split)
+
+    def test_error_removes_temp_file(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            spec = gen_dir/'other.yaml'
+            spec.write_text(self.other_spec + '''
+- function: bad
+  type: int -> int
+  tests:
+    - args: 5
+      equals: 1
+''')
+            for split in (False, True):
+                with self.assertRaises(TypeError):
+                    batch.generate([str(spec)], gen_dir, jobs=1, split=split)
+                self.assertEqual([path.name for path in gen_dir.iterdir()
+                                  if path.suffix == '.tmp'], [])
+
+
+class IncrementalTestCase(unittest.TestCase):
+    spec = '''
+- header: compare.h
+
+- function: compare
+  type: char, char* -> int
+  tests:
+    - args: ['a', ['a', 'b']]
+      less_than: 0
+    - args: [0, !zeroed 3]
+      equals: 0
+
+- function: strlen
+  type: char* -> int
+  tests:
+    - args: [['a', 'b']]
+      equals: 2
+'''
+
+    def generate(self, spec, gen_dir):
+        return incremental.generate_header_files(
+            yamlreader.parse(spec), gen_dir)
+
+    def mtimes(self, gen_dir):
+        return {p.name: p.stat().st_mtime_ns for p in gen_dir.iterdir()}
+
+    def test_split_files(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            sources = self.generate(self.spec, gen_dir)
+            self.assertEqual([p.name for p in sources],
+                             ['test_compare.c', 'test_compare-compare.c',
+                              'test_compare-strlen.c'])
+            suite = (gen_dir/'test_compare.c').read_text()
+            self.assertIn('return 0 + success;', suite)
+            self.assertIn('return 2 + success;', suite)
+            strlen = (gen_dir/'test_compare-strlen.c').read_text()
+            self.assertIn('return 1;', strlen)
+            self.assertIn('_id_1', strlen)
+
+    def test_unchanged_files_untouched(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            self.generate(self.spec, gen_dir)
+            for path in gen_dir.iterdir():
+                os.utime(str(path), ns=(0, 0))
+            self.generate(self.spec.replace('equals: 2', 'equals: 3'),
+                          gen_dir)
+            changed = {name for name, mtime in self.mtimes(gen_dir).items()
+                       if mtime != 0}
+            self.assertEqual(changed, {'test_compare-strlen.c',
+                                       '.test_compare.c.manifest.json'})
+
+    def test_removed_function(self):
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            self.generate(self.spec, gen_dir)
+            self.generate(self.spec[:self.spec.index('- function: strlen')],
+                          gen_dir)
+            self.assertFalse((gen_dir/'test_compare-strlen.c').exists())
+
+    def test_front_to_back(self):
+        with open("ostester/tests/test-compare.yaml", 'r') as f:
+            yml = yamlreader.parse(f)
+        with TemporaryDirectory() as temp_dir:
+            gen_dir = Path(temp_dir)
+            sources = incremental.generate_header_files(yml, gen_dir)
+            ccodegen.generate_main(['compare.h'], gen_dir)
+            call(['gcc', '-I', str(gen_dir), '-I', 'ostester/tests/',
+                  '-o', str(gen_dir/'test.out'), str(gen_dir/'main.c'),
+                  'ostester/tests/compare.c'] + list(map(str, sources)))
+            self.assertEqual(call([str(gen_dir/'test.out')]), 0)
+
+
+class MatrixTestCase(unittest.TestCase):
+    def test_matrix(self):
+        configurations = runner.matrix(cflags=('-Wall', '-Werror'),
+                                       levels=('0', '2'))
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            # sum reads past the end of its values
+            spec = write_guard_spec(root, 4)
+            results = runner.run(
+                [str(spec)], root/'build',
+                options=ccodegen.Options(report='tap'),
+                configurations=configurations)
+            self.assertEqual([result.configuration for result in results],
+                             configurations)
+            for result in results:
+                sanitized = result.configuration.name.endswith('-sanitize')
+                self.assertEqual(result.sanitizer_error, sanitized,
+                                 result.output)
+                # The sanitizer stops the suite in the middle of case 2
+                self.assertEqual(len(result.cases), 1 if sanitized else 3)
+                self.assertTrue(result.cases[0].passed)
+                self.assertTrue((root/'build'/'test_guard_h'/'{}.out'.format(
+                    result.configuration.name)).exists())
+            lines = runner.grid(results)
+            self.assertEqual(lines[0].split(),
+                             ['O0', 'O0-sanitize', 'O2', 'O2-sanitize'])
+            self.assertEqual(lines[2].split(), ['length', '1'] + ['ok'] * 4)
+            self.assertEqual(lines[3].split()[3::2], ['-', '-'])
+            self.assertIn('[O2-sanitize]: sanitizer error',
+                          results[-1].describe())
+            history = runner.History(root/'build'/'timings.json')
+            self.assertEqual(history.times['test_guard_h'],
+                             sum(result.seconds for result in results))
+
+
+class RunnerTestCase(unittest.TestCase):
+    failing_spec = '''
+- header: sub.h
+  sources: [sub.c]
+
+- function: sub
+  type: int, int -> int
+  tests:
+    - args: [3, 1]
+      equals: 2
+    - args: [1, 1]
+      equals: 1
+'''
+    source = MAIN_SOURCE + '''
+int sub(int a, int b) {
+    return a - b;
+}
+'''
+
+    def test_run(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'sub.h').write_text('int sub(int, int);\n')
+            (root/'sub.c').write_text(self.source)
+            (root/'sub.yaml').write_text(self.failing_spec)
+            build_dir = root/'build'
+            results = runner.run(['ostester/tests/test-compare.yaml',
+                                  str(root/'sub.yaml')], build_dir, jobs=2)
+            verdicts = {r.suite.header: r.describe().split(' (')[0]
+                        for r in results}
+            self.assertEqual(verdicts, {'compare.h': 'compare.h: ok',
+                                        'sub.h': 'sub.h: failed test 2'})
+            history = runner.History(build_dir/'timings.json')
+            self.assertEqual(history.times.keys(),
+                             {'test_compare_h', 'test_sub_h'})
+
+    def test_build_failure(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'sub.h').write_text('int sub(int, int);\n')
+            (root/'sub.c').write_text('syntax error')
+            (root/'sub.yaml').write_text(self.failing_spec)
+            result, = runner.run([str(root/'sub.yaml')], root/'build')
+            self.assertIsNone(result.returncode)
+            self.assertIn('error', result.output)
+            self.assertIn('build failed', result.describe())
+
+    def test_timeout(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'sub.h').write_text('int sub(int, int);\n')
+            (root/'sub.c').write_text(self.source.replace(
+                'return a - b;',
+                'volatile int spin = a;\n    while (spin == 1) {}\n'
+                '    return a - b;'))
+            (root/'sub.yaml').write_text(self.failing_spec)
+            result, = runner.run([str(root/'sub.yaml')], root/'build',
+                                 options=ccodegen.Options(report='tap'),
+                                 timeout=1)
+            self.assertEqual(result.returncode, -9)
+            self.assertEqual([case.passed for case in result.cases], [True])
+            self.assertIn('killed by signal 9', result.describe())
+
+    def test_changed_since(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            for name in ('sub', 'neg'):
+                (root/'{}.h'.format(name)).write_text(
+                    '#include "common.h"\nint {}(int, int);\n'.format(name))
+                (root/'{}.c'.format(name)).write_text(
+                    self.source.replace('sub(', '{}('.format(name)))
+                (root/'{}.yaml'.format(name)).write_text(
+                    self.failing_spec.replace('sub', name))
+            (root/'common.h').write_text('#define COMMON 1\n')
+            (root/'unrelated.c').write_text('')
+            git = ['git', '-C', temp_dir, '-c', 'user.name=test',
+                   '-c', 'user.email=test@example.com']
+            call(git + ['init', '-q'])
+            call(git + ['add', '.'])
+            call(git + ['commit', '-qm', 'tests'])
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(temp_dir)
+
+            def run():
+                return sorted(result.suite.header for result in runner.run(
+                    [temp_dir], root/'build', changed_since='HEAD'))
+            self.assertEqual(run(), ['neg.h', 'sub.h'])
+            self.assertEqual(run(), [])
+            (root/'unrelated.c').write_text('int unrelated;\n')
+            self.assertEqual(run(), [])
+            (root/'sub.c').write_text(self.source + '\n')
+            self.assertEqual(run(), ['sub.h'])
+            (root/'common.h').write_text('#define COMMON 2\n')
+            self.assertEqual(run(), ['neg.h', 'sub.h'])
+            (root/'sub.yaml').write_text(self.failing_spec + '\n')
+            call(git + ['add', '.'])
+            call(git + ['commit', '-qm', 'tests'])
+            self.assertEqual(run(), [])
+            self.assertEqual(sorted(result.suite.header for result in
+                                    runner.run([temp_dir], root/'build',
+                                               changed_since='HEAD~1')),
+                             ['neg.h', 'sub.h'])
+            with self.assertRaises(ValueError):
+                runner.run([temp_dir], root/'build', changed_since='nope')
+            dependencies = runner.Dependencies(
+                root/'build'/'dependencies.json')
+            self.assertIn(str((root/'common.h').resolve()),
+                          dependencies.files['test_neg_h']['1_test_neg'])
+
+    def test_changed_fixture(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'first.h').write_text('int first(const char*);\n')
+            (root/'first.c').write_text(
+                MAIN_SOURCE + 'int first(const char *data) {\n'
+                '    return data[0];\n}\n')
+            (root/'first.yaml').write_text(
+                '- header: first.h\n  sources: [first.c]\n\n'
+                '- function: first\n  type: const char* -> int\n'
+                '  tests:\n    - args: [!file data/first.bin]\n'
+                '      equals: 1\n')
+            (root/'data').mkdir()
+            (root/'data'/'first.bin').write_bytes(b'\1')
+            git = ['git', '-C', temp_dir, '-c', 'user.name=test',
+                   '-c', 'user.email=test@example.com']
+            call(git + ['init', '-q'])
+            call(git + ['add', '.'])
+            call(git + ['commit', '-qm', 'tests'])
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(temp_dir)
+
+            def run():
+                return [result.returncode for result in runner.run(
+                    [str(root/'first.yaml')], root/'build',
+                    changed_since='HEAD')]
+            self.assertEqual(run(), [0])
+            self.assertEqual(run(), [])
+            (root/'data'/'first.bin').write_bytes(b'\2')
+            self.assertEqual(run(), [1])
+            dependencies = runner.Dependencies(
+                root/'build'/'dependencies.json')
+            self.assertIn(str((root/'data'/'first.bin').resolve()),
+                          dependencies.files['test_first_h']['spec'])
+
+    def test_schedule(self):
+        with TemporaryDirectory() as temp_dir:
+            history = runner.History(Path(temp_dir)/'timings.json')
+            suites = [runner.Suite(name, name, None, [], [])
+                      for name in ('fast', 'new', 'slow')]
+            history.record([runner.SuiteResult(suites[0], 0, 1, 0, ''),
+                            runner.SuiteResult(suites[2], 0, 5, 4, '')])
+            history.save()
+            history = runner.History(Path(temp_dir)/'timings.json')
+            self.assertEqual(
+                [suite.name for suite in history.schedule(suites)],
+                ['new', 'slow', 'fast'])
+
+
+class StoreTestCase(unittest.TestCase):
+    def record(self, results_store, slow, passed, revision='abc',
+               configuration=runner.DEFAULT_CONFIGURATION):
+        suite = runner.Suite('test_a_h', 'a.h', None, [], [])
+        cases = (results.CaseResult('a.h', 'f', 1, True, slow),
+                 results.CaseResult('a.h', 'f', 2, True, 100),
+                 results.CaseResult('a.h', 'f', 3, passed, 100))
+        benchmarks = (results.BenchmarkResult('a.h', 'f', 0, 10, slow,
+                                              slow, slow),)
+        return results_store.record(
+            [runner.SuiteResult(suite, 0, 1.0, 1.0, '', cases, benchmarks)],
+            configuration, revision)
+
+    def test_report(self):
+        with TemporaryDirectory() as temp_dir, \
+                store.Store(Path(temp_dir)/'results.sqlite') as results_store:
+            for run in range(20):
+                self.record(results_store, 100 + run % 3, True)
+            self.assertEqual(store.report(results_store), [])
+            for run in range(3):
+                self.record(results_store, 200 + run, run != 1)
+            findings = store.report(results_store)
+            self.assertEqual(
+                [(f.kind, f.subject) for f in findings],
+                [('slower', 'case 1'), ('flaky', 'case 3'),
+                 ('slower', 'benchmark input 0')])
+            self.assertIn('(1.99x', findings[0].describe())
+            self.assertIn('1 failed at abc', findings[1].describe())
+            self.assertEqual(store.report(results_store, slowdown=3), [
+                findings[1]])
+            # Runs built another way aren't compared with these
+            self.record(results_store, 300, False, 'abc-dirty',
+                        runner.DEFAULT_CONFIGURATION._replace(
+                            cflags=('-O2',)))
+            self.assertEqual(store.report(results_store), [])
+
+    def test_run(self):
+        with TemporaryDirectory() as temp_dir:
+            for _ in range(2):
+                runner.run(['ostester/tests/test-compare.yaml'], temp_dir,
+                           options=ccodegen.Options(report='tap'))
+            with store.Store(Path(temp_dir)/'results.sqlite') as results:
+                runs = results.runs(10)
+                self.assertEqual(len(runs), 2)
+                samples = list(results.samples([run for run, _ in runs]))
+            spec_hash = store.spec_hash('ostester/tests/test-compare.yaml')
+            self.assertEqual({sample[2] for sample in samples}, {spec_hash})
+            self.assertEqual(len(samples), 10)
+
+
+class ServerTestCase(unittest.TestCase):
+    spec = 'ostester/tests/test-compare.yaml'
+
+    def test_render(self):
+        for split in (False, True):
+            with TemporaryDirectory() as temp_dir, open(self.spec) as f:
+                gen_dir = Path(temp_dir)
+                batch.generate([self.spec], gen_dir, split=split)
+                files = api.render(f, split=split)
+                self.assertEqual(
+                    files, {name: (gen_dir/name).read_text()
+                            for name in files})
+                self.assertEqual(len(files), 3 if split else 2)
+                self.assertEqual(api.render_main(['compare.h']),
+                                 (gen_dir/'main.c').read_text())
+
+    def test_serve(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'gen').mkdir()
+            socket_path = str(root/'ostester.sock')
+            serving = server.Server(socket_path)
+            thread = threading.Thread(target=serving.serve_forever)
+            thread.start()
+            try:
+                spec = os.path.abspath(self.spec)
+                status, output = client.request([spec, 'gen'], socket_path,
+                                                temp_dir)
+                self.assertEqual((status, output), (0, ''))
+                self.assertTrue((root/'gen'/'test_compare.c').exists())
+                status, _ = client.request([spec, 'gen', '--split'],
+                                           socket_path, temp_dir)
+                self.assertEqual(status, 0)
+                self.assertTrue((root/'gen'/'test_compare-compare.c')
+                                .exists())
+                self.assertEqual(serving.generator.parses, 1)
+                status, output = client.request(['missing.yaml', 'gen'],
+                                                socket_path, temp_dir)
+                self.assertEqual(status, 1)
+                self.assertIn('missing.yaml', output)
+                status, output = client.request(['--bogus'], socket_path,
+                                                temp_dir)
+                self.assertEqual(status, 2)
+                self.assertIn('usage: testgen', output)
+                (root/'bad.yaml').write_text(
+                    '- header: bad.h\n- function: f\n  type: int -> int\n'
+                    '  tests:\n    - args: 5\n      equals: 1\n')
+                status, output = client.request(['bad.yaml', 'gen'],
+                                                socket_path, temp_dir)
+                self.assertEqual(status, 1)
+                self.assertIn('testgen: error:', output)
+            finally:
+                serving.shutdown()
+                thread.join()
+                serving.server_close()
+            self.assertFalse(os.path.exists(socket_path))
+
+    def test_struct_redefinition(self):
+        spec = '''
+- header: point.h
+  structs:
+    point: {{{}}}
+- function: norm
+  type: struct point -> int
+  tests:
+    - args: [[{}]]
+      equals: 0
+'''
+        generator = server.Generator()
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'gen').mkdir()
+            for fields, values in (('x: int', '1'),
+                                   ('x: int, y: int', '1, 2')):
+                (root/'point.yaml').write_text(spec.format(fields, values))
+                for split, name in (([], 'test_point.c'),
+                                    (['--split'], 'test_point-norm.c')):
+                    self.assertEqual(
+                        generator.run(['point.yaml', 'gen'] + split,
+                                      temp_dir), (0, ''))
+                    self.assertIn('{{{}}}'.format(values),
+                                  (root/'gen'/name).read_text())
+
+    def test_no_answer(self):
+        with TemporaryDirectory() as temp_dir, \
+                socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as listener:
+            socket_path = os.path.join(temp_dir, 'ostester.sock')
+            listener.bind(socket_path)
+            listener.listen()
+
+            def drop():
+                # Reads the request, like a handler that fails would
+                connection = listener.accept()[0]
+                with connection, connection.makefile('rb') as request:
+                    request.read()
+            thread = threading.Thread(target=drop)
+            thread.start()
+            status, output = client.request(['spec.yaml', 'gen'],
+                                            socket_path, temp_dir)
+            thread.join()
+            self.assertEqual(status, 1)
+            self.assertIn('without answering', output)
+
+    def test_client_without_server(self):
+        with TemporaryDirectory() as temp_dir:
+            environment = dict(os.environ,
+                               OSTESTER_SOCKET=os.path.join(temp_dir, 'none'))
+            subprocess.run([sys.executable, 'testgen-client', self.spec,
+                            temp_dir], check=True, env=environment)
+            self.assertTrue(os.path.exists(os.path.join(temp_dir,
+                                                        'test_compare.c')))
+
+
+def write_comparison_specs(root):
+    """
+    Writes to root the specs and sources of the suites that in-process
+    results are compared with, returning the paths of the specs and the
+    verdicts of their cases
+    """
+    (root/'points.h').write_text(
+        'struct inprocess_point { int x; int y; };\n'
+        'int manhattan(struct inprocess_point);\n'
+        'int sum_x(const struct inprocess_point *, int);\n'
+        'int scale(int *, int);\nchar grade(int);\n')
+    (root/'points.c').write_text(InProcessTestCase.source)
+    (root/'points.yaml').write_text(InProcessTestCase.spec)
+    (root/'buffers.h').write_text(
+        'int fill(char*, int);\nconst char *greeting(int);\n'
+        'int samples(int*, int);\n')
+    (root/'buffers.c').write_text(BufferComparisonTestCase.source)
+    (root/'buffers.yaml').write_text(BufferComparisonTestCase.spec)
+    (root/'sweep.h').write_text(
+        'int add(int, char);\nint record(int);\nint total(int);\n')
+    (root/'sweep.c').write_text(GeneratorTestCase.source)
+    total = sum(yamlreader.Random(100, -50, 50, 9).values())
+    (root/'sweep.yaml').write_text(GeneratorTestCase.spec.format(
+        255 + 127, total).replace('sweep.h', 'sweep.h\n  sources: '
+                                  '[sweep.c]'))
+    return {root/'points.yaml': [True, False, True, True, True, True,
+                                 False, True],
+            root/'buffers.yaml': [True, True, False, True, True, False,
+                                  True, False],
+            root/'sweep.yaml': [False, True, True]}
+
+
+class InProcessTestCase(unittest.TestCase):
+    spec = """
+- header: points.h
+  sources: [points.c]
+  structs:
+    inprocess_point: {x: int, y: int}
+
+- function: manhattan
+  type: struct inprocess_point -> int
+  tests:
+    - args: [{x: 3, y: -4}]
+      equals: 7
+    - args: [[1, 1]]
+      greater_than: 2
+
+- function: sum_x
+  type: const struct inprocess_point*, int -> int
+  tests:
+    - args: [[[1, 2], {x: 5}], 2]
+      equals: 6
+
+- function: scale
+  type: int*, int -> int
+  tests:
+    - data:
+        values: [1, 2, 3]
+      args: [!decl values, 3]
+      within: {arg: 0, value: [2, 4, 6], tolerance: 0}
+    - args: [!zeroed 2, !range [0, 2]]
+      all_zero: {arg: 0, count: 2}
+
+- function: grade
+  type: int -> char
+  tests:
+    - args: [95]
+      equals: "'A'"
+    - args: [50]
+      less_than: "'B'"
+    - args: [50]
+      equals: 66
+"""
+    source = MAIN_SOURCE + """
+#include "points.h"
+
+int manhattan(struct inprocess_point p) {
+    return (p.x < 0 ? -p.x : p.x) + (p.y < 0 ? -p.y : p.y);
+}
+
+int sum_x(const struct inprocess_point *points, int n) {
+    int sum = 0;
+    for (int i = 0; i < n; i++) {
+        sum += points[i].x;
+    }
+    return sum;
+}
+
+int scale(int *values, int n) {
+    for (int i = 0; i < n; i++) {
+        values[i] *= 2;
+    }
+    return n;
+}
+
+char grade(int score) {
+    return score >= 90 ? 'A' : 'B';
+}
+"""
+
+    def test_agrees_with_suites(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            expected = write_comparison_specs(root)
+            suites = runner.run(list(map(str, expected)), root/'build',
+                                options=ccodegen.Options(report='tap'))
+            for spec, verdicts in expected.items():
+                results, _ = inprocess.check(spec)
+                self.assertEqual([r.passed for r in results], verdicts,
+                                 spec)
+                suite, = [r for r in suites if r.suite.spec == spec]
+                self.assertEqual([c.passed for c in suite.cases], verdicts,
+                                 suite.output)
+            results, _ = inprocess.check(root/'points.yaml',
+                                         functions=['scale'])
+            self.assertEqual({r.function for r in results}, {'scale'})
+
+    def test_invalid(self):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            write_comparison_specs(root)
+            (root/'points.c').write_text(self.source.replace('sum_x',
+                                                             'sum_y'))
+            with self.assertRaises(ValueError):
+                inprocess.check(root/'points.yaml')
+            (root/'points.c').write_text(self.source)
+            (root/'points.yaml').write_text(self.spec.replace(
+                '''"'A'"''', 'GRADE_A'))
+            with self.assertRaises(ValueError):
+                inprocess.check(root/'points.yaml', functions=['grade'])
+            (root/'points.c').write_text('syntax error')
+            with self.assertRaises(CalledProcessError):
+                inprocess.check(root/'points.yaml')
+
+
+class ReportTestCase(unittest.TestCase):
+    def run_suite(self, **kwargs):
+        with TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir)
+            (root/'sub.h').write_text(
+                'int sub(int, char);\nint compare(char, char*);\n')
+            (root/'sub.c').write_text(TableTestCase.source)
+            (root/'sub.yaml').write_text(TableTestCase.spec.replace(
+                '- header: sub.h', '- header: sub.h\n  sources: [sub.c]'
+            ).format(2))
+            result, = runner.run([str(root/'sub.yaml')], root/'build',
+                                 **kwargs)
+            return result
+
+    def test_formats(self):
+        for report in ccodegen.REPORT_FORMATS:
+            for table in (False, True):
+                result = self.run_suite(
+                    options=ccodegen.Options(table=table, report=report))
+                self.assertEqual(result.returncode, 1)
+                self.assertEqual(
+                    [(c.function, c.case, c.passed) for c in result.cases],
+                    [('sub', 1, True), ('sub', 2, True), ('sub', 3, False),
+                     ('compare', 4, True)])
+                self.assertTrue(all(c.ns >= 0 for c in result.cases))
+                self.assertIn('1 of 4 cases failed', result.describe())
+        self.assertTrue(result.output.startswith('{"header": "sub.h"'))
+
+    def test_split(self):
+        result = self.run_suite(split=True,
+                                options=ccodegen.Options(report='tap'))
+        self.assertEqual(result.returncode, 1)
+        self.assertEqual(
+            [(c.function, c.case, c.passed) for c in result.cases],
+            [('sub', 1, True), ('sub', 2, True), ('sub', 3, False),
+             ('compare', 1, True)])
+        self.assertTrue(result.output.rstrip().endswith('1..4'))
+
+    def test_benchmarks(self):
+        for report in ccodegen.REPORT_FORMATS:
+            for split in (False, True):
+                with TemporaryDirectory() as temp_dir:
+                    result, = runner.run(
+                        ['ostester/tests/test-compare.yaml'], temp_dir,
+                        split=split, options=ccodegen.Options(report=report))
+                self.assertTrue(result.passed, result.output)
+                benchmark, = result.benchmarks
+                self.assertEqual((benchmark.function, benchmark.iterations),
+                                 ('compare', 200))
+                self.assertLessEqual(benchmark.min_ns, benchmark.median_ns)
+                self.assertLessEqual(benchmark.median_ns, benchmark.p99_ns)
+
+    def test_parse(self):
+        self.assertEqual(results.parse(['hello', 'ok 1 - a.h f 1 # 5 ns',
+                                        '1..1']),
+                         [results.CaseResult('a.h', 'f', 1, True, 5)])
+
+
+class BenchmarkTestCase(unittest.TestCase):
+    def test_startup(self):
+        results = dict(benchmarks.startup(runs=1))
+        self.assertIn('import ccodegen', results)
+        self.assertIn('first render, warm cache', results)
+        self.assertTrue(all(seconds > 0 for seconds in results.values()))
+
+    def test_unknown_benchmark(self):
+        with self.assertRaises(ValueError):
+            benchmarks.run('nonexistent')
+
+    def test_table(self):
+        results = dict(benchmarks.table(functions=1, cases=5))
+        self.assertGreater(results['table object bytes'], 0)
+        self.assertGreater(results['unrolled object bytes'], 0)
+
+    def test_pipeline(self):
+        results = dict(benchmarks.pipeline(functions=2, cases=6, repeat=1))
+        for phase in ('parse', 'transform', 'render_header_suite'):
+            self.assertGreater(results[phase + ' seconds'], 0)
+            self.assertGreater(results[phase + ' peak bytes'], 0)
+
+    def test_baseline(self):
+        with TemporaryDirectory() as temp_dir:
+            baseline = os.path.join(temp_dir, 'baseline.json')
+            _, regressions = benchmarks.run('memory', baseline,
+                                            update_baseline=True,
+                                            functions=2, cases=10)
+            self.assertEqual(regressions, [])
+            _, regressions = benchmarks.run('memory', baseline,
+                                            threshold=0.5,
+                                            functions=2, cases=10)
+            self.assertEqual(len(regressions), 2)
+
+    def test_pool(self):
+        results = dict(benchmarks.pool(functions=2, cases=200,
+                                       cflags=('-O0',)))
+        # Private copies don't repeat the data of every case
+        self.assertLess(results['char* source bytes'],
+                        results['const char* source bytes'] * 1.25)
+
+    def test_streaming(self):
+        small, large = (peak for _, peak in benchmarks.streaming(
+            functions=2, cases=20, scale=8))
+        self.assertLess(large, small * 1.5)
+
+    def test_memory(self):
+        results = dict(benchmarks.memory(functions=2, cases=10))
+        self.assertGreater(results['AST bytes per test case'], 0)
+
+
 def load_tests(loader, tests, ignore):
     from . import yamlreader, ccodegen, types, values, ast
     tests.addTests(DocTestSuite(yamlreader))
     tests.addTests(DocTestSuite(types))
     tests.addTests(DocTestSuite(ast))
+    tests.addTests(DocTestSuite(incremental))
+    tests.addTests(DocTestSuite(results))
+    tests.addTests(DocTestSuite(synthetic))
+    tests.addTests(DocTestSuite(profiling))
+    tests.addTests(DocTestSuite(benchmarks))
+    tests.addTests(DocTestSuite(store))
+    tests.addTests(DocTestSuite(api))
+    tests.addTests(DocTestSuite(inprocess))
+    tests.addTests(DocTestSuite(runner))
     tests.addTests(DocTestSuite(
         ccodegen, optionflags=REPORT_ONLY_FIRST_FAILURE))
     tests.addTests(DocTestSuite(
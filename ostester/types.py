@@ -1,25 +1,66 @@
 import abc
+import functools
 import re
 
 
+_TYPE_SPEC = re.compile(
+    r'\s*(const\s+)?(?:struct\s+(\w+)|(\w+))\s*(\**)\s*((?:\[\d+\]\s*)*)')
+_ARRAY_LENGTH = re.compile(r'\[(\d+)\]')
+
+
+@functools.lru_cache(maxsize=None)
 def c_type(type_decl):
     """
-    Returns a type for the given type declaration.
+    Returns the type for the given type declaration. Types are canonical,
+    so equal declarations give the same object.
+    >>> c_type('char*') is c_type('char *')
+    True
+    >>> c_type('int[2][3]')
+    int[2][3]
+    >>> c_type('struct point*')
+    struct point*
+    >>> c_type('const char *')
+    const char*
     """
-    type_spec = re.compile(r'(\w+)\s*(\**)\s*((\[\d+\])*)')
-    base_type, stars, arrays, _ = type_spec.match(
-        type_decl).groups()
-    if arrays != '':
-        raise NotImplementedError()
-    elif stars != '':
-        return Pointer(c_type(base_type + stars[1:]))
+    match = _TYPE_SPEC.fullmatch(type_decl)
+    if match is None:
+        raise ValueError('Invalid type declaration: {}'.format(type_decl))
+    const, struct_name, base_type, stars, arrays = match.groups()
+    if struct_name is not None:
+        type = Struct(struct_name)
     elif base_type not in type_map:
         raise ValueError('Unsupported base type: {}'.format(base_type))
     else:
-        return type_map[base_type]
+        type = type_map[base_type]
+    if const:
+        type = Const(type)
+    for _ in stars:
+        type = Pointer(type)
+    for length in reversed(_ARRAY_LENGTH.findall(arrays)):
+        type = Array(type, int(length))
+    return type
+
+
+_interned = {}
+
+
+class _InternedType(abc.ABCMeta):
+    """
+    Makes the instances of a class canonical: constructing an instance
+    with the same arguments as an existing one returns the existing one.
+    Instances can then be compared and hashed by identity.
+    """
+    def __call__(cls, *args):
+        key = (cls,) + args
+        try:
+            return _interned[key]
+        except KeyError:
+            instance = super().__call__(*args)
+            instance._args = args
+            return _interned.setdefault(key, instance)
 
 
-class _CType(metaclass=abc.ABCMeta):
+class _CType(metaclass=_InternedType):
     """
     An ABC representing a type in C. Subclasses need to be able to
     declare and instantiate variables.
@@ -36,11 +77,41 @@ class _CType(metaclass=abc.ABCMeta):
     def __repr__(self):
         pass
 
+    # Whether values of the type are single numbers or characters
+    scalar = False
+
+    @property
+    def unqualified(self):
+        """
+        The type without its const qualifier
+        """
+        return self
+
+    def literal(self, value):
+        """
+        Returns value written as a C expression of this type
+        """
+        return self._rhs_format(value)
+
+    def _rhs_format(self, value):
+        return str(value)
+
+    def resolve(self, structs):
+        """
+        Returns this type with the structs it names replaced by their
+        definitions in structs, a dict from names to defined Structs
+        """
+        return self
+
+    def __reduce__(self):
+        return (type(self), self._args)
+
 
 class _SimpleCType(_CType):
     """
     Represents a non-composite type in C.
     """
+    scalar = True
 
     def __init__(self, base_type):
         self.base_type = base_type
@@ -61,10 +132,6 @@ class _SimpleCType(_CType):
     def __repr__(self):
         return '{}'.format(self.base_type)
 
-    def __eq__(self, other):
-        return (isinstance(other, type(self)) and
-                self.base_type == other.base_type)
-
 
 class Int(_SimpleCType):
     def __init__(self):
@@ -97,6 +164,38 @@ type_map = {
 }
 
 
+class Const(_CType):
+    """
+    Represents a const qualified type in C.
+    """
+
+    def __init__(self, inner_type):
+        self.inner_type = inner_type
+        self.scalar = inner_type.scalar
+
+    @property
+    def unqualified(self):
+        return self.inner_type
+
+    def declare(self, name):
+        return 'const ' + self.inner_type.declare(name)
+
+    def initialize(self, name, value):
+        return 'const ' + self.inner_type.initialize(name, value)
+
+    def coerce(self, value):
+        return self.inner_type.coerce(value)
+
+    def _rhs_format(self, value):
+        return self.inner_type._rhs_format(value)
+
+    def resolve(self, structs):
+        return Const(self.inner_type.resolve(structs))
+
+    def __repr__(self):
+        return 'const {}'.format(self.inner_type)
+
+
 class Pointer(_CType):
     """
     Represents a pointer in C.
@@ -109,7 +208,7 @@ class Pointer(_CType):
         return '{}*{}'.format(self.inner_type, name)
 
     def initialize(self, name, value):
-        if isinstance(self.inner_type, Char):
+        if isinstance(self.inner_type.unqualified, Char):
             return '{}*{} = "{}"'.format(
                 self.inner_type, name, ''.join(map(str, value)))
         return '{}*{} = {}'.format(self.inner_type, name, value)
@@ -117,9 +216,135 @@ class Pointer(_CType):
     def coerce(self, value):
         return self.inner_type.coerce(value)
 
+    def resolve(self, structs):
+        return Pointer(self.inner_type.resolve(structs))
+
     def __repr__(self):
         return '{}*'.format(self.inner_type)
 
-    def __eq__(self, other):
-        return (isinstance(other, Pointer) and
-                self.inner_type == other.inner_type)
+
+class Array(_CType):
+    """
+    Represents a fixed length array in C. Multi-dimensional arrays are
+    arrays of arrays, outermost dimension first.
+    """
+
+    def __init__(self, element_type, length):
+        self.element_type = element_type
+        self.length = length
+
+    def declare(self, name):
+        return self.element_type.declare('{}[{}]'.format(name, self.length))
+
+    def initialize(self, name, value):
+        return '{} = {}'.format(self.declare(name), self._rhs_format(value))
+
+    def coerce(self, value):
+        if len(value) > self.length:
+            raise ValueError('{} values given for {}'.format(len(value),
+                                                             self))
+        return [self.element_type.coerce(v) for v in value]
+
+    def _rhs_format(self, value):
+        if len(value) > self.length:
+            raise ValueError('{} values given for {}'.format(len(value),
+                                                             self))
+        return '{{{}}}'.format(', '.join(
+            self.element_type._rhs_format(v) for v in value))
+
+    def resolve(self, structs):
+        return Array(self.element_type.resolve(structs), self.length)
+
+    def __repr__(self):
+        element_type, dimensions = self, ''
+        while isinstance(element_type, Array):
+            dimensions += '[{}]'.format(element_type.length)
+            element_type = element_type.element_type
+        return '{}{}'.format(element_type, dimensions)
+
+
+def define_structs(definitions):
+    """
+    Returns the Structs defined by definitions, a dict from struct names to
+    dicts from field names to their type declarations, by name. A field
+    can have the type of a struct defined before it.
+    >>> structs = define_structs({'point': {'x': 'int', 'y': 'int'},
+    ...                           'line': {'ends': 'struct point[2]'}})
+    >>> structs['line'].fields[0][1].element_type is structs['point']
+    True
+    >>> c_type('struct point').resolve(structs) is structs['point']
+    True
+    """
+    structs = {}
+    for name, fields in definitions.items():
+        structs[name] = Struct(name).define(
+            (field, c_type(type).resolve(structs))
+            for field, type in fields.items())
+    return structs
+
+
+class Struct(_CType):
+    """
+    Represents a struct in C. A struct is named by c_type before its
+    fields are known: the types of a spec name undefined structs, which
+    are resolved to the structs the spec defines, see define_structs.
+    Defining a struct gives a new type, so specs defining a struct
+    differently don't affect each other.
+    """
+
+    def __init__(self, name, fields=None):
+        self.name = name
+        self.fields = fields
+
+    def define(self, fields):
+        """
+        Returns the struct with the fields given as (name, type) pairs,
+        where the types are C types or their declarations
+        """
+        return Struct(self.name, tuple(
+            (name, c_type(type) if isinstance(type, str) else type)
+            for name, type in fields))
+
+    def resolve(self, structs):
+        if self.fields is not None:
+            return self
+        return structs.get(self.name, self)
+
+    def _field_types(self):
+        if self.fields is None:
+            raise ValueError('{} has no definition'.format(self))
+        return dict(self.fields)
+
+    def declare(self, name):
+        return '{} {}'.format(self, name)
+
+    def initialize(self, name, value):
+        return '{} = {}'.format(self.declare(name), self._rhs_format(value))
+
+    def coerce(self, value):
+        field_types = self._field_types()
+        if isinstance(value, dict):
+            return {field: field_types[field].coerce(v)
+                    for field, v in value.items()}
+        return [type.coerce(v) for (_, type), v in zip(self.fields, value)]
+
+    def _rhs_format(self, value):
+        field_types = self._field_types()
+        if isinstance(value, dict):
+            unknown = value.keys() - field_types.keys()
+            if unknown:
+                raise ValueError('{} has no field {}'.format(
+                    self, ', '.join(sorted(unknown))))
+            values = ('.{} = {}'.format(field,
+                                        field_types[field]._rhs_format(v))
+                      for field, v in value.items())
+        else:
+            if len(value) > len(self.fields):
+                raise ValueError('{} values given for {}'.format(len(value),
+                                                                 self))
+            values = (type._rhs_format(v)
+                      for (_, type), v in zip(self.fields, value))
+        return '{{{}}}'.format(', '.join(values))
+
+    def __repr__(self):
+        return 'struct {}'.format(self.name)
@@ -1,4 +1,9 @@
+import filecmp
+import os
 import re
+import time
+
+from . import profiling
 
 
 def header_to_function_name(header):
@@ -30,7 +35,8 @@ _num_names = 0
 def new_name():
     """
     Returns a new legal identifier in C each time it's called
-    Note: Not thread-safe in its current incarnation
+    Note: Not thread-safe, and its names depend on everything named before
+    in the process. Generation uses a GenerationContext instead.
     >>> name1 = new_name()
     >>> name2 = new_name()
     >>> name1 != name2
@@ -41,6 +47,115 @@ def new_name():
     return '_id_{}'.format(_num_names)
 
 
+class GenerationContext:
+    """
+    The state of generating one compilation: the identifiers allocated,
+    the test cases numbered so far and the structs defined by the spec, see
+    types.define_structs. Generating a spec in a fresh context
+    always gives the same output, whatever was generated before it.
+    >>> context = GenerationContext()
+    >>> context.new_name(), context.new_name()
+    ('_id_1', '_id_2')
+    >>> context.next_test_number()
+    1
+    """
+
+    def __init__(self, structs=None):
+        self.names = 0
+        self.test_number = 0
+        self.structs = {} if structs is None else structs
+
+    def new_name(self):
+        """
+        Returns a new legal identifier in C each time it's called
+        """
+        self.names += 1
+        return '_id_{}'.format(self.names)
+
+    def next_test_number(self):
+        """
+        Returns the number of the next test case
+        """
+        self.test_number += 1
+        return self.test_number
+
+
+def write_if_changed(path, text):
+    """
+    Writes text followed by a newline to path unless the file already has
+    exactly that content, leaving its mtime alone. Returns whether the file
+    was written.
+    """
+    text += '\n'
+    with profiling.phase('write'):
+        try:
+            if path.read_text() == text:
+                profiling.count('files unchanged')
+                return False
+        except OSError:
+            pass
+        profiling.count('bytes written', path.write_text(text))
+        profiling.count('files written')
+    return True
+
+
+def stream_if_changed(path, chunks):
+    """
+    Writes the strings in chunks followed by a newline to path, like
+    write_if_changed, without holding the whole text in memory: the
+    chunks go to a temporary file next to path, which replaces path only
+    if their contents differ. Returns whether path was written. The
+    temporary file is removed if chunks raises.
+    """
+    temp = path.with_name('.{}.tmp'.format(path.name))
+    seconds = 0.0
+    f = open(temp, 'w', buffering=1 << 16)
+    try:
+        with f:
+            if profiling.active() is None:
+                f.writelines(chunks)
+            else:
+                seconds = _write_timed(f, chunks)
+            start = time.perf_counter()
+            f.write('\n')
+    except BaseException:
+        temp.unlink()
+        raise
+    written = not (path.exists() and
+                   filecmp.cmp(temp, path, shallow=False))
+    if written:
+        profiling.count('bytes written', temp.stat().st_size)
+        profiling.count('files written')
+        os.replace(temp, path)
+    else:
+        temp.unlink()
+        profiling.count('files unchanged')
+    profiling.add_time('write', seconds + time.perf_counter() - start)
+    return written
+
+
+def _write_timed(f, chunks):
+    """
+    Writes the strings in chunks to the file f, returning the time spent
+    writing them, without the time spent producing them
+    """
+    seconds = 0.0
+    for chunk in chunks:
+        start = time.perf_counter()
+        f.write(chunk)
+        seconds += time.perf_counter() - start
+    return seconds
+
+
+def function_benchmark_name(function_name):
+    """
+    Returns the name of the function benchmarking a given function
+    >>> function_benchmark_name('compare')
+    'compare_benchmark'
+    """
+    return function_name + '_benchmark'
+
+
 def function_test_case_name(function_name):
     """
     Returns the name that a given function's test cases will be called
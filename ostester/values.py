@@ -1,12 +1,19 @@
 import abc
+from collections.abc import Sequence
+from itertools import chain
+import os
 
+from . import types
 from .utils import new_name
+from .yamlreader import Bytes, File, Zeroed
 
 
 class Value:
     """
     A type-inferred value.
     """
+    __slots__ = ('value', 'name', 'type')
+
     def __init__(self, value, name=None, type=None):
         self.value = value
         self.name = name if name is not None else new_name()
@@ -24,6 +31,8 @@ class Declaration(metaclass=abc.ABCMeta):
     """
     Represents a declaration - a type, a name, and a value
     """
+    __slots__ = ('value', 'type', 'name')
+
     def __init__(self, value, type, name=None):
         self.value = value
         self.type = type
@@ -38,3 +47,228 @@ class Declaration(metaclass=abc.ABCMeta):
 
     def initialize(self):
         return self.type.initialize(self.name, self.value)
+
+
+class DataPool:
+    """
+    The read-only data pointed to by the arguments of the test cases in
+    one translation unit. Each distinct array of a given element type is
+    defined once as a file-scope static const object, which arguments of
+    pointer to const type point to directly. Arguments of other pointer
+    types point to a private copy, so the function under test may write
+    to it: a static array filled by a function defined once per pooled
+    object, which keeps the copy out of line however many test cases make
+    it. Zeroed regions aren't pooled: they are static arrays, cleared
+    before every use unless they are const.
+    >>> pool = DataPool()
+    >>> text = Declaration('ab', types.c_type('char*'), 'text')
+    >>> for definition in pool.add([text, Declaration(['a', 'b'],
+    ...                                               types.c_type('char*'))]):
+    ...     print(definition)
+    static const char ostester_data_1[3] = "ab";
+    __attribute__((noinline)) static void ostester_copy_1(char *copy)
+    {
+        memcpy(copy, ostester_data_1, sizeof ostester_data_1);
+    }
+    >>> pool.initialize(text)
+    'static char text[3]; ostester_copy_1(text)'
+    >>> pool.initialize(Declaration('ab', types.c_type('const char*'), 'c'))
+    'const char*c = ostester_data_1'
+    >>> pool.initialize(Declaration(Zeroed(4096), types.c_type('int*'), 'z'))
+    'static int z[4096]; memset(z, 0, sizeof z)'
+    >>> zeroed = Declaration(Zeroed(2), types.c_type('int*'), 'z')
+    >>> pool.initialize(zeroed, 0, 'before')
+    'int*z = ostester_guarded(NULL, 2 * sizeof *z, 0, 1)'
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.copies = {}
+        self.helpers = set()
+
+    def add(self, declarations, guarded=()):
+        """
+        Adds the data of declarations to the pool, returning the
+        definitions of the objects, with their semicolons, and of the
+        functions copying them that weren't in it yet. The declarations
+        in guarded are copied into guarded buffers instead, see
+        initialize.
+        """
+        definitions = []
+        for declaration in declarations:
+            key = _data_key(declaration)
+            if key is None:
+                continue
+            element_type, literal, length = key
+            if key not in self.data:
+                name = 'ostester_data_{}'.format(len(self.data) + 1)
+                self.data[key] = name
+                if isinstance(literal, File):
+                    definitions.append(_embed_file(name, element_type,
+                                                   literal, length))
+                else:
+                    definitions.append('static const {} = {};'.format(
+                        element_type.declare('{}[{}]'.format(name, length)),
+                        literal))
+            pointee = declaration.type.inner_type
+            if (pointee is not pointee.unqualified or key in self.copies or
+                    declaration in guarded):
+                continue
+            data = self.data[key]
+            copy = data.replace('_data_', '_copy_')
+            self.copies[key] = copy
+            # Inlined, gcc would expand the memcpy of every copy
+            definitions.append(_COPY.format(
+                name=copy, parameter=element_type.declare('*copy'),
+                data=data))
+        return definitions
+
+    def add_function(self, function, benchmark=False, guard=None):
+        """
+        Adds the data the test cases of function, and its benchmark inputs
+        if benchmark is true, are initialized from, like add, along with
+        the expected data and helper functions of its comparisons. guard
+        is as for initialize.
+        """
+        declarations = [declaration for test in function.test_cases
+                        for declaration in test.declarations]
+        guarded = set()
+        if guard is not None:
+            guarded.update(
+                declaration for test in function.test_cases
+                for declaration in test.declarations
+                if test.argument_index(declaration) is not None)
+        if benchmark and function.benchmark:
+            declarations += [declaration
+                             for input in function.benchmark.inputs
+                             for declaration in input.declarations]
+        definitions = self.add(declarations, guarded)
+        definitions += self.add(chain.from_iterable(
+            test.comparison.declarations for test in function.test_cases))
+        for test in function.test_cases:
+            helper = test.comparison.helper
+            if helper is not None and helper[0] not in self.helpers:
+                self.helpers.add(helper[0])
+                definitions.append(helper[1])
+        return definitions
+
+    def initialize(self, declaration, argument=None, guard=None):
+        """
+        Returns the statement declaring and initializing declaration, in
+        terms of the pooled object holding its data if there is one. If
+        guard is one of ccodegen.GUARDS and declaration is the argument
+        numbered argument of its test case, the data is copied into a
+        guarded buffer, see ostester_guarded in ostester_runtime.h.
+        """
+        if guard is not None and argument is not None:
+            guarded = self._guarded(declaration, argument, guard)
+            if guarded is not None:
+                return guarded
+        if (isinstance(declaration.type, types.Pointer) and
+                isinstance(declaration.value, Zeroed)):
+            pointee = declaration.type.inner_type
+            array = 'static {}'.format(pointee.declare('{}[{}]'.format(
+                declaration.name, max(len(declaration.value), 1))))
+            if pointee is not pointee.unqualified:
+                return array
+            return '{}; memset({}, 0, sizeof {})'.format(
+                array, declaration.name, declaration.name)
+        key = _data_key(declaration)
+        if key is None:
+            return declaration.initialize()
+        pointee = declaration.type.inner_type
+        if pointee is not pointee.unqualified:
+            return '{} = {}'.format(declaration.type.declare(declaration.name),
+                                    self.data[key])
+        return 'static {}; {}({})'.format(
+            pointee.declare('{}[{}]'.format(declaration.name, key[2])),
+            self.copies[key], declaration.name)
+
+    def _guarded(self, declaration, argument, guard):
+        if not isinstance(declaration.type, types.Pointer):
+            return None
+        if isinstance(declaration.value, Zeroed):
+            # Unlike an array, the buffer may be empty
+            data, size = 'NULL', '{} * sizeof *{}'.format(
+                len(declaration.value), declaration.name)
+        else:
+            key = _data_key(declaration)
+            if key is None:
+                return None
+            data = self.data[key]
+            size = 'sizeof ' + data
+        return '{} = ostester_guarded({}, {}, {}, {})'.format(
+            declaration.type.declare(declaration.name), data, size, argument,
+            int(guard == 'before'))
+
+
+_COPY = """__attribute__((noinline)) static void {name}({parameter})
+{{
+    memcpy(copy, {data}, sizeof {data});
+}}"""
+
+
+def _data_key(declaration):
+    """
+    Returns the element type, literal and length of the array pointed to
+    by declaration, or None if it doesn't point to an array literal. The
+    literal of a !file is the File itself.
+    """
+    if not isinstance(declaration.type, types.Pointer):
+        return None
+    element_type = declaration.type.inner_type.unqualified
+    value = declaration.value
+    if isinstance(value, Zeroed):
+        return None
+    if isinstance(value, (Bytes, File)):
+        if not isinstance(element_type, types.Char):
+            raise ValueError('{} needs a char pointer, not {}'.format(
+                value.yaml_tag, declaration.type))
+        if isinstance(value, File):
+            return (element_type, File(os.path.realpath(value.path)),
+                    len(value) + 1)
+        return element_type, _hex_literal(value.data), len(value) + 1
+    if isinstance(element_type, types.Char) and isinstance(value, Sequence):
+        text = ''.join(map(str, value))
+        return element_type, '"{}"'.format(text), len(text) + 1
+    if (isinstance(value, Sequence) and not isinstance(value, str) and value
+            and (element_type.scalar or
+                 isinstance(element_type, types.Struct))):
+        literal = '{{{}}}'.format(', '.join(
+            element_type._rhs_format(v) for v in value))
+        return element_type, literal, len(value)
+    return None
+
+
+def _hex_literal(data):
+    """
+    Returns data as a C string literal of hex escapes
+    >>> print(_hex_literal(b'\\x00ab'))
+    "\\x00\\x61\\x62"
+    """
+    if not data:
+        return '""'
+    return '"\\x{}"'.format(data.hex('x').replace('x', '\\x'))
+
+
+def _c_string(text):
+    return '"{}"'.format(text.replace('\\', '\\\\').replace('"', '\\"')
+                         .replace('\n', '\\n'))
+
+
+def _embed_file(name, element_type, file, length):
+    """
+    Returns the definition of name as the contents of file followed by a
+    NUL, which the assembler reads in with .incbin when the test is
+    compiled
+    """
+    assembly = ''.join(line + '\n' for line in (
+        '.pushsection .rodata',
+        '.balign 16',
+        '{}:'.format(name),
+        '.incbin {}'.format(_c_string(file.path)),
+        '.byte 0',
+        '.popsection'))
+    return '__asm__({});\nextern const {};'.format(
+        _c_string(assembly),
+        element_type.declare('{}[{}]'.format(name, length)))
@@ -0,0 +1,185 @@
+"""
+Regenerates test suites as their specs and the templates are edited, for
+testgen --watch and ostester run --watch.
+
+A Watcher polls the modification times of the specs and templates, and
+keeps the parse trees of the specs and the compiled templates between
+polls, so an edit only costs parsing the edited spec and rendering the
+outputs it affects. A change to a spec regenerates its suite, a change to
+a template regenerates every suite, or only main.c for the templates
+main.c is made of.
+"""
+
+import abc
+import logging
+from pathlib import Path
+import time
+
+import yaml
+
+from . import batch, ccodegen, runner, yamlreader
+
+
+MAIN_TEMPLATES = frozenset(('main.jinja2.c', 'test_main.h',
+                            'ostester_runtime.h'))
+
+
+def _stat(path):
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Watcher(metaclass=abc.ABCMeta):
+    """
+    Tracks the specs in paths, calling update with the ones to regenerate
+    whenever poll finds changes. Subclasses define update.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.specs = []
+        self.stats = {}
+        self.trees = {}
+        self.template_stats = {}
+
+    def poll(self):
+        """
+        Regenerates what changed since the last poll, everything on the
+        first one. Returns the lines describing what was done.
+        """
+        templates = {path.name: _stat(path)
+                     for path in Path(ccodegen.TEMPLATE_DIR).iterdir()}
+        changed_templates = {name for name, stat in templates.items()
+                             if self.template_stats.get(name) != stat}
+        self.template_stats = templates
+
+        specs = list(batch.find_specs(self.paths))
+        changed = []
+        for spec in specs:
+            stat = _stat(spec)
+            if stat != self.stats.get(spec):
+                self.stats[spec] = stat
+                try:
+                    with spec.open('r') as f:
+                        self.trees[spec] = yamlreader.parse(f)
+                except (OSError, yaml.YAMLError) as error:
+                    logging.getLogger('tests').error('%s: %s', spec, error)
+                    self.trees.pop(spec, None)
+                    continue
+                changed.append(spec)
+        for removed in set(self.specs) - set(specs):
+            self.stats.pop(removed, None)
+            self.trees.pop(removed, None)
+        main_changed = (set(self.specs) != set(specs) or
+                        bool(changed_templates & MAIN_TEMPLATES))
+        self.specs = specs
+        if changed_templates - MAIN_TEMPLATES:
+            changed = [spec for spec in specs if spec in self.trees]
+        if not changed and not main_changed:
+            return []
+        return self.update(changed, main_changed)
+
+    @abc.abstractmethod
+    def update(self, changed, main_changed):
+        """
+        Regenerates the suites of the specs in changed, and whatever
+        depends on the set of specs if main_changed, returning the lines
+        describing what was done
+        """
+
+    def watch(self, interval=0.2):
+        """
+        Polls every interval seconds, printing what was done, until
+        interrupted
+        """
+        try:
+            while True:
+                for line in self.poll():
+                    print(line, flush=True)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+
+def _spec_error(spec, error):
+    logging.getLogger('tests').error('%s: %r', spec, error)
+
+
+class GenerateWatcher(Watcher):
+    """
+    Keeps the suites of the specs in paths generated in gen_dir, like
+    batch.generate
+    """
+
+    def __init__(self, paths, gen_dir, split=False,
+                 options=ccodegen.Options()):
+        super().__init__(paths)
+        self.gen_dir = Path(gen_dir)
+        self.split = split
+        self.options = options
+        self.headers = {}
+
+    def update(self, changed, main_changed):
+        lines = []
+        for spec in changed:
+            start = time.perf_counter()
+            try:
+                batch.generate_tree(self.trees[spec], self.gen_dir,
+                                    self.split, self.options)
+            except batch.spec_errors() as error:
+                _spec_error(spec, error)
+                continue
+            header = self.trees[spec][0]['header']
+            main_changed |= self.headers.get(spec) != header
+            self.headers[spec] = header
+            lines.append('{}: generated {} in {:.0f} ms'.format(
+                spec, header, (time.perf_counter() - start) * 1000))
+        if main_changed:
+            headers = [self.headers[spec] for spec in self.specs
+                       if spec in self.headers]
+            if len(set(headers)) < len(headers):
+                lines.append('header tested by more than one file')
+            else:
+                ccodegen.generate_main(headers, self.gen_dir, self.options)
+                lines.append('generated main.c')
+        return lines
+
+
+class RunWatcher(Watcher):
+    """
+    Rebuilds and reruns the suites of the specs in paths in build_root
+    whenever they change, like runner.run
+    """
+
+    def __init__(self, paths, build_root, split=False,
+                 options=ccodegen.Options(),
+                 configuration=runner.DEFAULT_CONFIGURATION, timeout=None):
+        super().__init__(paths)
+        self.build_root = Path(build_root)
+        self.split = split
+        self.options = options
+        self.configuration = configuration
+        self.timeout = timeout
+
+    def update(self, changed, main_changed):
+        # Every suite has its own main.c
+        if main_changed:
+            changed = [spec for spec in self.specs if spec in self.trees]
+        lines = []
+        for spec in changed:
+            try:
+                suite = runner.prepare_tree(spec, self.trees[spec],
+                                            self.build_root, self.split,
+                                            self.options)
+            except batch.spec_errors() as error:
+                _spec_error(spec, error)
+                continue
+            result = runner.build_and_run(suite, self.configuration,
+                                          self.timeout)
+            lines.append(result.describe())
+            if result.returncode is None:
+                lines.append(result.output)
+        return lines
@@ -3,18 +3,81 @@ Reads in a yaml file representing a set of tests
 """
 
 import collections.abc
+import copy
 from abc import ABCMeta
-from io import StringIO
+import os
 import re
 
 import yaml
+from yaml.composer import Composer
+from yaml.events import SequenceEndEvent, SequenceStartEvent
 
-import ast
 from .types import c_type
 
 
-def parse(file):
-    return yaml.safe_load(file)
+# The loaders the custom tags are registered on, fastest last. libyaml's
+# CSafeLoader is only there if PyYAML was built against libyaml.
+LOADERS = [yaml.SafeLoader]
+if getattr(yaml, '__with_libyaml__', False):
+    LOADERS.append(yaml.CSafeLoader)
+
+
+def parse(file, loader=None):
+    """
+    Parses a YAML test file with loader, by default the fastest loader
+    available
+    """
+    loader = _with_directory((loader or LOADERS[-1])(file), file)
+    try:
+        return loader.get_single_data()
+    finally:
+        loader.dispose()
+
+
+def iter_parse(file, loader=None):
+    """
+    Parses a YAML test file like parse, but yields the items of its top
+    level sequence one at a time, so only the item being used is held in
+    memory. Anchors are local to the item defining them.
+    >>> items = iter_parse('[{header: a.h}, {function: f}]')
+    >>> next(items), next(items)
+    ({'header': 'a.h'}, {'function': 'f'})
+    """
+    # libyaml composes whole documents in C, so the items are composed in
+    # Python from the events of the loader's parser
+    loader = _with_directory(_streaming_loaders[loader or LOADERS[-1]](file),
+                             file)
+    try:
+        loader.get_event()
+        loader.get_event()
+        if not loader.check_event(SequenceStartEvent):
+            raise ValueError('a test file must be a sequence')
+        loader.get_event()
+        while not loader.check_event(SequenceEndEvent):
+            # The nodes of earlier items would be kept alive by their anchors
+            loader.anchors = {}
+            yield loader.construct_document(loader.compose_node(None, None))
+    finally:
+        loader.dispose()
+
+
+def _with_directory(loader, file):
+    # Paths in !file tags are relative to the directory of the spec
+    loader.directory = os.path.dirname(getattr(file, 'name', ''))
+    return loader
+
+
+def _streaming_loader(loader):
+    class StreamingLoader(loader):
+        def __init__(self, stream):
+            super().__init__(stream)
+            self.anchors = {}
+
+        compose_node = Composer.compose_node
+        compose_scalar_node = Composer.compose_scalar_node
+        compose_sequence_node = Composer.compose_sequence_node
+        compose_mapping_node = Composer.compose_mapping_node
+    return StreamingLoader
 
 
 class ABCYAMLMeta(ABCMeta, type(yaml.YAMLObject)): pass
@@ -56,6 +119,94 @@ class Zeroed(collections.abc.Sequence, yaml.YAMLObject, metaclass=ABCYAMLMeta):
         return isinstance(other, Zeroed) and other.len == self.len
 
 
+class Bytes(yaml.YAMLObject):
+    """
+    Represents binary data, written in hex, that a char pointer points to
+    >>> parse('!bytes 00ff 7f')
+    Bytes(b'\\x00\\xff\\x7f')
+    """
+    yaml_loader = yaml.SafeLoader
+    yaml_tag = '!bytes'
+
+    def __init__(self, data):
+        self.data = data
+
+    @classmethod
+    def from_yaml(cls, loader, node):
+        return Bytes(bytes.fromhex(node.value))
+
+    @classmethod
+    def to_yaml(cls, dumper, data):
+        return dumper.represent_scalar(Bytes.yaml_tag, data.data.hex())
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return 'Bytes({!r})'.format(self.data)
+
+    def __eq__(self, other):
+        return isinstance(other, Bytes) and other.data == self.data
+
+
+class File(yaml.YAMLObject):
+    """
+    Represents the contents of a binary file that a char pointer points
+    to. The file is embedded into the test binary when it is compiled, so
+    its contents never go through the generator. A relative path is
+    relative to the directory of the spec.
+    """
+    yaml_loader = yaml.SafeLoader
+    yaml_tag = '!file'
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def from_yaml(cls, loader, node):
+        directory = getattr(loader, 'directory', '')
+        return File(os.path.join(directory, node.value.strip()))
+
+    @classmethod
+    def to_yaml(cls, dumper, data):
+        return dumper.represent_scalar(File.yaml_tag, data.path)
+
+    def __len__(self):
+        """
+        The size of the file in bytes
+        """
+        try:
+            return os.stat(self.path).st_size
+        except OSError as error:
+            raise ValueError('!file {}: {}'.format(self.path,
+                                                   error.strerror))
+
+    def __repr__(self):
+        return 'File({!r})'.format(self.path)
+
+    def __eq__(self, other):
+        return isinstance(other, File) and other.path == self.path
+
+    def __hash__(self):
+        return hash(self.path)
+
+
+def find_files(tree):
+    """
+    Yields every File in tree, an item of a parsed spec or any part of one
+    >>> list(find_files({'tests': [{'args': [File('a.bin'), [1]]}]}))
+    [File('a.bin')]
+    """
+    if isinstance(tree, File):
+        yield tree
+    elif isinstance(tree, dict):
+        for value in tree.values():
+            yield from find_files(value)
+    elif isinstance(tree, (list, tuple)):
+        for value in tree:
+            yield from find_files(value)
+
+
 class Pointer(yaml.YAMLObject):
     """
     Represents a pointer into an array.
@@ -108,6 +259,108 @@ class Declaration(yaml.YAMLObject):
                 self.name == other.name)
 
 
+class Range(yaml.YAMLObject):
+    """
+    Represents the values from first to last inclusive, step apart, that
+    a test case is run with
+    >>> parse('!range [a, e, 2]')
+    Range('a', 'e', 2)
+    >>> list(Range(0, 6, 3).values())
+    [0, 3, 6]
+    """
+    yaml_loader = yaml.SafeLoader
+    yaml_tag = '!range'
+
+    def __init__(self, first, last, step=1):
+        self.first = first
+        self.last = last
+        self.step = step
+
+    @classmethod
+    def from_yaml(cls, loader, node):
+        return Range(*loader.construct_sequence(node))
+
+    @classmethod
+    def to_yaml(cls, dumper, data):
+        return dumper.represent_sequence(
+            Range.yaml_tag, [data.first, data.last, data.step])
+
+    def values(self):
+        """
+        Yields the values of the range, which must be numbers
+        """
+        stop = self.last + (1 if self.step > 0 else -1)
+        return iter(range(self.first, stop, self.step))
+
+    def __repr__(self):
+        return 'Range({!r}, {!r}, {!r})'.format(self.first, self.last,
+                                                self.step)
+
+    def __eq__(self, other):
+        return (isinstance(other, Range) and
+                (other.first, other.last, other.step) ==
+                (self.first, self.last, self.step))
+
+
+class Random(yaml.YAMLObject):
+    """
+    Represents count pseudo-random values from min to max inclusive, the
+    same ones for the same seed, that a test case is run with
+    >>> parse('!random {count: 3, min: 0, max: 9, seed: 7}')
+    Random(count=3, min=0, max=9, seed=7)
+    """
+    yaml_loader = yaml.SafeLoader
+    yaml_tag = '!random'
+
+    def __init__(self, count, min, max, seed=0):
+        self.count = count
+        self.min = min
+        self.max = max
+        self.seed = seed
+
+    @classmethod
+    def from_yaml(cls, loader, node):
+        return Random(**loader.construct_mapping(node))
+
+    @classmethod
+    def to_yaml(cls, dumper, data):
+        return dumper.represent_mapping(Random.yaml_tag, {
+            'count': data.count, 'min': data.min, 'max': data.max,
+            'seed': data.seed})
+
+    @staticmethod
+    def hash(seed, index):
+        """
+        Returns the index-th pseudo-random 32-bit number for seed, the
+        same as the generated C code computes
+        """
+        mask = 0xffffffff
+        h = (seed + index * 0x9e3779b9) & mask
+        h = ((h ^ (h >> 16)) * 0x85ebca6b) & mask
+        h = ((h ^ (h >> 13)) * 0xc2b2ae35) & mask
+        return h ^ (h >> 16)
+
+    def values(self):
+        """
+        Yields the values, whose bounds must be numbers
+        """
+        span = self.max - self.min + 1
+        return (self.min + self.hash(self.seed, index) % span
+                for index in range(self.count))
+
+    def __repr__(self):
+        return 'Random(count={!r}, min={!r}, max={!r}, seed={!r})'.format(
+            self.count, self.min, self.max, self.seed)
+
+    def __eq__(self, other):
+        return (isinstance(other, Random) and
+                (other.count, other.min, other.max, other.seed) ==
+                (self.count, self.min, self.max, self.seed))
+
+
+GENERATORS = (Range, Random)
+
+
 class Signature(yaml.YAMLObject):
     """
     Represents the signature of the function under test.
@@ -120,6 +373,16 @@ class Signature(yaml.YAMLObject):
         self.inputs = list(map(c_type, inputs))
         self.output = c_type(output)
 
+    def resolve(self, structs):
+        """
+        Returns the signature with the structs its types name replaced by
+        their definitions in structs
+        """
+        signature = copy.copy(self)
+        signature.inputs = [type.resolve(structs) for type in self.inputs]
+        signature.output = self.output.resolve(structs)
+        return signature
+
     @classmethod
     def from_yaml(cls, loader, node):
         inputs, output = node.value.split('->')
@@ -149,4 +412,11 @@ class Signature(yaml.YAMLObject):
                 self.inputs == other.inputs and
                 self.output == other.output)
 
-yaml.SafeLoader.add_implicit_resolver('!signature', Signature.yaml_resolver, None)
+
+for loader in LOADERS:
+    for tag_type in (Zeroed, Bytes, File, Pointer, Declaration, Signature,
+                     Range, Random):
+        loader.add_constructor(tag_type.yaml_tag, tag_type.from_yaml)
+    loader.add_implicit_resolver('!signature', Signature.yaml_resolver, None)
+
+_streaming_loaders = {loader: _streaming_loader(loader) for loader in LOADERS}